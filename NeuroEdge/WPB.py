@@ -1,27 +1,56 @@
 import os
 import re
+import time
 import json
 import uuid
 import redis
 import openai
 import sqlite3
 import hashlib
-from functools import wraps
+import hmac
+import fcntl
+import threading
+from functools import wraps, partial
 from property_database import PropertyDatabase
+from fragment_cache import FragmentCache
+from autocomplete import PrefixIndex
+from semantic_index import SemanticIndex
+from saved_searches import SavedSearchStore, NUMERIC_FILTERS
+from http_cache import etag_for, conditional, init_compression
+from context_packer import build_document_context
+from job_queue import JobQueue, QUEUED, RUNNING, DONE
+from llm_cache import ResponseCache
+from chunk_store import ChunkStore
+from document_store import DocumentStore
+from text_extraction import TextExtractor, SUPPORTED_EXTENSIONS
+from conversation_store import ConversationStore, STATE_KEYS
+from llm_client import ResilientClient, CircuitBreaker
+from singleflight import SingleFlight
+from rate_limit import RateLimiter, RateLimited, ConcurrencyGate, parse_limit
+from metrics import Metrics
+from agent_tools import TOOLS, TOOL_INSTRUCTIONS, run_tool, is_listings_export
+from intent_router import (IntentRouter, LISTING, FAQ, GREETING, CONTACT,
+                           listing_query, apply_listing_filters)
+from conversation_memory import (TAIL_MESSAGES, FOLD_AFTER, HARD_LIMIT, summarise,
+                                 extractive_summary, fold, prompt_messages)
 from pathlib import Path
 from datetime import datetime
-from flask import Flask, render_template, request, session, redirect, url_for, flash, jsonify, abort
+from flask import Flask, render_template, request, session, redirect, url_for, flash, jsonify, abort, g
 from flask_login import LoginManager, login_user, logout_user, login_required, UserMixin, current_user
 from flask_session import Session
 from werkzeug.utils import secure_filename
+from werkzeug.middleware.proxy_fix import ProxyFix
 from dotenv import load_dotenv
-from flask import make_response
+from flask import make_response, Response, stream_with_context
 from openai import OpenAI
 import requests
 from markupsafe import escape
 from functools import wraps
 
 app = Flask(__name__)
+# request.remote_addr is the address the trusted proxy saw (the right-most X-Forwarded-For
+# hop it appended), not the left-most one, which the client can set to anything
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=int(os.getenv('TRUSTED_PROXY_HOPS', '1')))
 app.jinja_env.globals['now'] = datetime.now
 app.config['SESSION_COOKIE_SECURE'] = True
 
@@ -29,7 +58,7 @@ app.config['SESSION_COOKIE_SECURE'] = True
 load_dotenv()
 
 # ─── Paths & Uploads ─────────────────────────────────────────────────────────
-BASE_DIR = '/var/data'  # all agent data stored here
+BASE_DIR = os.getenv('PERSISTENT_DISK_PATH', '/var/data')  # all agent data stored here
 UPLOAD_FOLDER = BASE_DIR  # same as /var/data, each agent gets a subfolder
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)  # ensure folder exists
 
@@ -38,13 +67,14 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)  # ensure folder exists
 app.secret_key = 'super-secret-key'  # or replace with a stronger one
 # ─── Paths & Uploads ─────────────────────────────────────────────────────────
 
-# Persistent Disk base path (mounted at /var/data in Render)
-PERSISTENT_DISK_PATH = "/var/data"
+# Persistent Disk base path (mounted at /var/data in Render; benchmarks point it elsewhere)
+PERSISTENT_DISK_PATH = UPLOAD_FOLDER
 os.makedirs(PERSISTENT_DISK_PATH, exist_ok=True)
 db = PropertyDatabase('neuroedge_properties.db', 'NeuroEdge Properties')
 
 # Flask configuration
 app.config['UPLOAD_FOLDER'] = PERSISTENT_DISK_PATH  # base folder for all agent data
+init_compression(app)  # gzip/brotli for large JSON and HTML responses
 app.config['ALLOWED_EXTENSIONS'] = {'pdf', 'docx', 'txt', 'md'}
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16 MB max per file
 
@@ -70,6 +100,45 @@ Session(app)
 
 # ─── OpenAI API Key ─────────────────────────────────────────────────────────
 openai.api_key = os.getenv('OPENAI_API_KEY')
+openai.max_retries = 0  # retried by llm_client.ResilientClient instead
+
+# ─── Rate Limiting ───────────────────────────────────────────────────────────
+# Token buckets shared through Redis when it is up, per worker otherwise (like sessions)
+rate_limiter = RateLimiter(app.config.get('SESSION_REDIS'))
+RATE_LIMITS = {
+    'chat': parse_limit(os.getenv('RATE_LIMIT_CHAT', '20/60')),
+    'search': parse_limit(os.getenv('RATE_LIMIT_SEARCH', '60/60')),
+    'autocomplete': parse_limit(os.getenv('RATE_LIMIT_AUTOCOMPLETE', '300/60')),
+}
+# Many visitors can share one address (mobile carriers, offices), so the IP bucket is looser
+RATE_LIMIT_IP_FACTOR = float(os.getenv('RATE_LIMIT_IP_FACTOR', '5'))
+
+def client_ip():
+    """Address of the visitor as seen by the trusted proxy (see ProxyFix above)"""
+    return request.remote_addr or 'unknown'
+
+def check_rate_limit(route, cost=1):
+    """Charge ``cost`` to the visitor's session and IP buckets for ``route``; raises RateLimited"""
+    rate, burst = RATE_LIMITS[route]
+    buckets = [(f"{route}:ip:{client_ip()}", rate * RATE_LIMIT_IP_FACTOR, burst * RATE_LIMIT_IP_FACTOR)]
+    sid = getattr(session, 'sid', None)
+    if sid:
+        buckets.append((f"{route}:session:{sid}", rate, burst))
+    for key, bucket_rate, bucket_burst in buckets:
+        allowed, wait = rate_limiter.allow(key, bucket_rate, bucket_burst, min(cost, bucket_burst))
+        if not allowed:
+            raise RateLimited("Too many requests, please slow down.", wait)
+
+def rate_limited(route, methods=None):
+    """Route decorator: apply ``check_rate_limit(route)`` (only to ``methods``, if given)"""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if methods is None or request.method in methods:
+                check_rate_limit(route)
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
 
 # ─── Login ───────────────────────────────────────────────────────────────────
 ADMIN_USERNAME = os.getenv("ADMIN_USERNAME")
@@ -88,7 +157,7 @@ def load_user(uid):
 
 # ─── Utilities ───────────────────────────────────────────────────────────────
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DOC_JSON_PATH = '/var/data/global_docs.json'
+DOC_JSON_PATH = os.path.join(PERSISTENT_DISK_PATH, 'global_docs.json')
 
 # ─── Helper Functions ────────────────────────────────────────────────────────
 
@@ -105,9 +174,8 @@ def load_prompt(name):
     return ""
 
 def allowed_file(filename):
-    """Check if the file type is allowed."""
-    ALLOWED_EXTENSIONS = {'txt', 'pdf', 'md', 'csv'}  # adjust as needed
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    """Check if the file type is allowed (one we can extract text from)."""
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in SUPPORTED_EXTENSIONS
 
 def get_user_upload_dir(agent_id):
     """Return the agent-specific folder under /var/data and ensure it exists."""
@@ -129,120 +197,191 @@ def load_global_docs():
     return {}
 
 def save_global_docs(docs):
-    """Save the JSON registry."""
-    with open(DOC_JSON_PATH, 'w', encoding='utf-8') as f:
+    """Save the JSON registry (atomically, so readers never see half a file)."""
+    tmp_path = f"{DOC_JSON_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
         json.dump(docs, f, indent=2)
+    os.replace(tmp_path, DOC_JSON_PATH)
 
-def preload_documents():
-    """
-    Loads all agent documents from disk (deprecated; use load_agent_documents()).
-    Returns a dict of {agent_id: [file_contents]}.
-    """
-    all_docs = {}
-    if not os.path.exists(UPLOAD_FOLDER):
-        return all_docs
-
-    for agent_id in os.listdir(UPLOAD_FOLDER):
-        agent_dir = os.path.join(UPLOAD_FOLDER, agent_id)
-        if not os.path.isdir(agent_dir):
-            continue
+def register_document(agent_id, filename):
+    """Add one file to the registry; an exclusive file lock keeps concurrent ingests from losing entries"""
+    with open(f"{DOC_JSON_PATH}.lock", 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        global_docs = load_global_docs()
+        registered = global_docs.setdefault(agent_id, [])
+        if filename not in registered:
+            registered.append(filename)
+            save_global_docs(global_docs)
 
-        for filename in os.listdir(agent_dir):
-            if not allowed_file(filename):
-                continue
-            file_path = os.path.join(agent_dir, filename)
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                all_docs.setdefault(agent_id, []).append(content)
-            except Exception as e:
-                print(f"Error reading {file_path}: {e}")
+# Uploaded PDF/DOCX/text files are read through plaintext sidecars extracted once per version
+text_extractor = TextExtractor()
 
-    return all_docs
+# Decoded text of uploaded documents, shared by chat turns, chunking and the semantic index
+document_store = DocumentStore(UPLOAD_FOLDER, allowed=allowed_file, reader=text_extractor.read)
 
-# Global dictionary to hold loaded docs content
-AGENT_DOCUMENTS = {}
+# Uploads are registered, extracted and indexed on a background pool, not in the request
+document_jobs = JobQueue('neuroedge_properties.db', max_workers=int(os.getenv('DOCUMENT_WORKERS', '2')),
+                         stale_after=1800)
 
-def load_agent_documents():
-    """
-    Load all agent documents from /var/data/<agent_id>/ into AGENT_DOCUMENTS.
-    Works with files manually placed or uploaded via the app.
-    """
-    global AGENT_DOCUMENTS
-    AGENT_DOCUMENTS = {}
+# Rendered property cards / API entries, keyed by property id and row version
+fragment_cache = FragmentCache(max_entries=5000)
 
-    base_dir = '/var/data'
-    global_docs = load_global_docs()
+# Search-as-you-type suggestions, built lazily from the properties table
+autocomplete_index = PrefixIndex()
 
-    if not os.path.exists(base_dir):
-        print("Persistent disk not found at /var/data")
-        return
+# Local embedding index over listings and agent documents (files under /var/data)
+semantic_index = SemanticIndex(os.path.join(PERSISTENT_DISK_PATH, 'semantic_index'))
 
-    for agent_id in os.listdir(base_dir):
-        agent_folder = os.path.join(base_dir, agent_id)
-        if not os.path.isdir(agent_folder):
-            continue
+def iter_agent_document_texts():
+    """Yield (agent_id, filename, text) for every readable uploaded document"""
+    for agent_id, filename, path in document_store.iter_files():
+        try:
+            yield agent_id, filename, document_store.read(path)
+        except (UnicodeDecodeError, OSError) as e:
+            print(f"Skipping {agent_id}/{filename} for semantic index: {e}")
+
+# Overlapping document chunks for per-message retrieval (SQLite FTS5 under /var/data)
+chunk_store = ChunkStore(os.path.join(PERSISTENT_DISK_PATH, 'document_chunks.db'))
+
+def get_chunk_store(agent_id):
+    """Chunk store with the agent's documents re-chunked if they changed on disk"""
+    ingested = chunk_store.sync(document_store.iter_files(agent_id), document_store.read,
+                                document_store.stamp, agent_id=agent_id)
+    if ingested:
+        print(f"✅ Chunked {ingested} new or changed documents for {agent_id}")
+    return chunk_store
+
+# At most one build and one pending save per worker; other workers' saves are merged, not lost
+semantic_build_lock = threading.Lock()
+semantic_save_lock = threading.Lock()
+
+def build_semantic_index():
+    """Background job: fit and index everything, then save (or load what another worker just built)"""
+    try:
+        with semantic_index.exclusive_build() as building:
+            if building:
+                semantic_index.build(db.iter_all_properties(), iter_agent_document_texts())
+                semantic_index.save()
+            else:
+                semantic_index.load()
+    finally:
+        semantic_build_lock.release()
 
-        contents = []
+def save_semantic_index():
+    """Background job: persist the semantic index after incremental updates"""
+    semantic_save_lock.release()  # changes from here on need another save
+    semantic_index.save()
 
-        # First, load all files in the agent folder
-        for filename in os.listdir(agent_folder):
-            file_path = os.path.join(agent_folder, filename)
-            if not allowed_file(filename):
-                continue
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    contents.append(f.read())
-            except UnicodeDecodeError:
-                print(f"Skipping non-text file for agent '{agent_id}': {file_path}")
-            except Exception as e:
-                print(f"Failed to load document for agent '{agent_id}' at {file_path}: {e}")
+def save_semantic_index_soon():
+    if semantic_save_lock.acquire(blocking=False):
+        try:
+            document_jobs.submit('semantic_save', save_semantic_index)
+        except Exception:
+            semantic_save_lock.release()
+            raise
 
-        # Update the global JSON registry if missing
-        existing_files = global_docs.get(agent_id, [])
-        for filename in os.listdir(agent_folder):
-            if filename not in existing_files:
-                global_docs.setdefault(agent_id, []).append(filename)
-        save_global_docs(global_docs)
+def get_semantic_index():
+    """The semantic index as last loaded; building and refitting run as background jobs.
 
-        AGENT_DOCUMENTS[agent_id] = contents
+    Until the first build finishes the index is not ready and searches return
+    nothing, so callers fall back to keyword results.
+    """
+    if not semantic_index.ready and not semantic_index.load():
+        start = True
+    else:
+        start = semantic_index.needs_refit()
+        semantic_index.refresh()
+    if start and semantic_build_lock.acquire(blocking=False):
+        try:
+            document_jobs.submit('semantic_build', build_semantic_index)
+        except Exception:
+            semantic_build_lock.release()
+            raise
+    return semantic_index
 
-    print("All agent documents loaded from /var/data")
+def shared_search(query, max_results, agent=None, hybrid=False, caller=None):
+    """Listing search that identical concurrent requests (any worker) run only once.
 
-def format_search_results(properties, query):
-    """Format database search results for GPT context"""
-    if not properties:
-        return "No properties found matching your search criteria."
-    
-    result_text = f"Found {len(properties)} properties matching: '{query}'\n\n"
-    
-    for i, prop in enumerate(properties, 1):
-        result_text += f"🏠 PROPERTY {i}: {prop['title']}\n"
-        result_text += f"💰 PRICE: N$ {prop['price']:,.2f}\n"
-        result_text += f"📍 LOCATION: {prop['location']}\n"
-        result_text += f"🛏️ BEDROOMS: {prop['bedrooms']} | 🚿 BATHROOMS: {prop['bathrooms']}\n"
-        result_text += f"📏 SIZE: {prop.get('size_sqft', 'N/A')} sqft\n"
-        result_text += f"🏢 TYPE: {prop['property_type']}\n"
-        
-        # Add features if available
-        if prop.get('features'):
+    Timings are recorded against ``caller`` (default: ``agent``).
+    """
+    normalised = " ".join((query or "").lower().split())
+    key = f"search:{'hybrid' if hybrid else 'like'}:{db.get_data_version()}:{agent or '*'}:{max_results}:{normalised}"
+    with metrics.timed('db_search', caller or agent):
+        if hybrid:
+            return single_flight.do(key, hybrid_search, db, query, max_results)
+        return single_flight.do(key, db.search_properties, query, max_results, agent=agent)
+
+def hybrid_search(database, query, max_results=10):
+    """LIKE search fused with semantic nearest neighbours (reciprocal rank fusion)"""
+    keyword_hits = database.search_properties(query, max_results)
+    try:
+        semantic_hits = get_semantic_index().search(query, k=max_results, kind='property')
+    except Exception as e:
+        print(f"⚠️ Semantic search unavailable: {e}")
+        return keyword_hits
+
+    rows = {prop['id']: prop for prop in keyword_hits}
+    scores = {}
+    for rank, prop in enumerate(keyword_hits):
+        scores[prop['id']] = scores.get(prop['id'], 0) + 1.0 / (60 + rank)
+    for rank, hit in enumerate(semantic_hits):
+        scores[hit['ref']] = scores.get(hit['ref'], 0) + 1.0 / (60 + rank)
+
+    results = []
+    for property_id in sorted(scores, key=scores.get, reverse=True):
+        prop = rows.get(property_id) or database.get_property_by_id(property_id)
+        if prop and prop.get('status') in (None, 'available'):
+            results.append(prop)
+        if len(results) >= max_results:
+            break
+    return results
+
+# Saved searches; new and updated listings are percolated against them
+saved_search_store = SavedSearchStore('neuroedge_properties.db')
+
+def property_changed(property_id=None, agent_id=None, previous=None):
+    """Refresh cached state derived from a property (or every property of an agent).
+
+    ``previous`` is the row as it was before the change; pass it when the
+    row is being deleted, so the agent whose replies quoted it is still known.
+    """
+    if property_id:
+        fragment_cache.invalidate(property_id)
+        prop = db.get_property_by_id(property_id)
+        if prop:
+            autocomplete_index.index_property(prop)
+        else:
+            autocomplete_index.remove_property(property_id)
+        autocomplete_index.mark_synced(db)
+        # Cached agent replies may quote this listing (looked up with the property tools)
+        for agent_name in {row['agent_name'] for row in (previous, prop) if row}:
+            response_cache.invalidate_agent(agent_name)
+        if prop:
             try:
-                features = json.loads(prop['features']) if isinstance(prop['features'], str) else prop['features']
-                if features:
-                    result_text += f"⭐ FEATURES: {', '.join(features[:5])}\n"
-            except:
-                pass
-        
-        # Add agent info
-        result_text += f"🤝 AGENT: {prop.get('agent_name', 'N/A')}\n"
-        
-        # Add external link if available
-        if prop.get('listing_url'):
-            result_text += f"🔗 LISTING: {prop['listing_url']}\n"
-        
-        result_text += "─" * 50 + "\n\n"
-    
-    return result_text
+                saved_search_store.percolate(prop)
+            except Exception as e:
+                print(f"⚠️ Saved search alerts failed for {property_id}: {e}")
+        if semantic_index.ready:
+            if prop:
+                semantic_index.upsert_property(prop)
+            else:
+                semantic_index.remove_property(property_id)
+            save_semantic_index_soon()
+    if agent_id:
+        fragment_cache.invalidate_agent(agent_id)
+
+def sync_document_registry():
+    """Add files found under /var/data/<agent_id>/ (e.g. copied in by hand) to the JSON registry"""
+    global_docs = load_global_docs()
+    changed = False
+    for agent_id in document_store.agent_ids():
+        registered = global_docs.setdefault(agent_id, [])
+        for filename in document_store.agent_files(agent_id):
+            if filename not in registered:
+                registered.append(filename)
+                changed = True
+    if changed:
+        save_global_docs(global_docs)
 
 def convert_urls_to_buttons(text):
     """Convert actual https URLs into clickable 'View Property' buttons."""
@@ -273,7 +412,6 @@ AGENT_CONFIG = {
     'Christopher Grant Van Wyk-AI': {'system_prompt': load_prompt('Christopher')},
 }
 global_docs = load_global_docs()
-AGENT_DOCUMENTS = preload_documents()
 
 # Mapping agents to their Tally form links
 TALLY_FORMS = {
@@ -286,41 +424,161 @@ TALLY_FORMS = {
 
 # ─── Chat Handling ───────────────────────────────────────────────────────────
 # ─── User Agent Data ─────────────────────────────────────────────────────────
+# Chat history lives in SQLite; the session only maps agent ids to conversation ids
+conversation_store = ConversationStore(os.path.join(PERSISTENT_DISK_PATH, 'conversations.db'))
+
 def user_agent_data(agent_id):
-    session.setdefault('agent_data', {})
-    session['agent_data'].setdefault(agent_id, {
-        'history': [], 'rag_file': None, 'document_name': []
-    })
+    """The visitor's conversation with an agent (stored from its first message)"""
+    loaded = g.setdefault('conversations', {})
+    if agent_id in loaded:
+        return loaded[agent_id]
+    if 'agent_data' in session:
+        migrate_session_agent_data()
+
+    conversation_id = session.get('conversations', {}).get(agent_id)
+    data = None
+    if conversation_id:
+        data = conversation_store.load(conversation_id, agent_id)
+        if data is None and not conversation_store.exists(conversation_id):
+            data = conversation_store.create(agent_id, conversation_id)  # nothing sent yet
+    if data is None:
+        data = new_conversation(agent_id)
+    loaded[agent_id] = data
+    return data
+
+def migrate_session_agent_data():
+    """Move chats kept in the session before the conversation store into it, once per visitor"""
+    for agent_id, old in (session.get('agent_data') or {}).items():
+        if agent_id not in AGENT_CONFIG or not isinstance(old, dict) or session.get('conversations', {}).get(agent_id):
+            continue
+        data = new_conversation(agent_id)
+        for message in old.get('history') or []:
+            if isinstance(message, dict) and message.get('role') and isinstance(message.get('content'), str):
+                data['history'].append({'role': message['role'], 'content': message['content'],
+                                        'timestamp': message.get('timestamp')})
+        for key in STATE_KEYS:
+            if key != 'window_start' and old.get(key) is not None:
+                data[key] = old[key]
+        data.save()
+    session.pop('agent_data', None)
+
+def new_conversation(agent_id):
+    data = conversation_store.create(agent_id)
+    session['conversations'] = {**session.get('conversations', {}), agent_id: data.id}
+    g.setdefault('conversations', {})[agent_id] = data
+    return data
+
+@app.after_request
+def save_conversations(response):
+    """Persist summary/pending-job state of every conversation this request touched"""
+    for data in g.get('conversations', {}).values():
+        data.save()
+    return response
+
+
+# ─── Intent Routing ──────────────────────────────────────────────────────────
+# Listing lookups, FAQs, greetings and form requests are answered without GPT
+intent_router = IntentRouter()
+FAQ_PATH = os.getenv('FAQ_PATH', os.path.join(PERSISTENT_DISK_PATH, 'faq_answers.json'))
+
+def load_faq_answers():
+    """Cached answers: each agent's contact details and specialty, plus the editable FAQ file"""
+    intent_router.clear_faqs()
+    for agent in db.get_agents():
+        name = agent['name']
+        if name not in AGENT_CONFIG:
+            continue
+        intent_router.add_faq(
+            ["what is your phone number", "how can I contact you", "what is your email address", "what is your email",
+             "how do I reach you", "what is your contact number"],
+            f"You can reach {name} on {agent['phone']} or at {agent['email']}.", name)
+        if agent.get('specialty'):
+            intent_router.add_faq(
+                ["what do you specialise in", "what is your specialty", "what is your area of expertise"],
+                f"{name} specialises in {agent['specialty']}. {agent.get('bio') or ''}".strip(), name)
+    intent_router.load_faqs(FAQ_PATH)
+
+load_faq_answers()
+
+def agent_listings_reply(agent_id, user_text):
+    """Listing cards from the agent's own rows in the properties table; None if there are none"""
+    query, filters = listing_query(user_text)
+    try:
+        properties = shared_search(query, 50 if filters else 15, agent=agent_id)
+    except Exception as e:
+        print(f"⚠️ Listing search failed for {agent_id}: {e}")
+        return None
+    properties = apply_listing_filters(properties, filters)[:15]
+    if not properties:
+        return None  # the model may still answer from the agent's documents
+    return generate_database_response(properties, user_text)
 
-    if not session['agent_data'][agent_id]['rag_file'] and agent_id in global_docs:
-        docs = global_docs[agent_id]
+def local_reply(agent_id, user_text):
+    """Answer a turn without GPT when the intent router can; None sends it to the model"""
+    if agent_id == 'Search-AI':
+        return None  # already answered from the database
+    intent, _, answer = intent_router.route(agent_id, user_text)
+    if intent == CONTACT:
+        return contact_form_reply(agent_id)
+    if intent == GREETING:
+        return f"Hello! 👋 I'm {agent_id}. Ask me about my listings, or anything else property-related."
+    if intent == FAQ:
+        return answer
+    if intent == LISTING:
+        return agent_listings_reply(agent_id, user_text)
+    return None
 
-        if isinstance(docs, list):
-            full_paths = [os.path.join(app.config['UPLOAD_FOLDER'], d) for d in docs]
-            existing_full_paths = [fp for fp in full_paths if os.path.isfile(fp)]
-            if existing_full_paths:
-                existing_relative_paths = [os.path.relpath(fp, app.config['UPLOAD_FOLDER']) for fp in existing_full_paths]
-                session['agent_data'][agent_id]['rag_file'] = existing_relative_paths
-                session['agent_data'][agent_id]['document_name'] = [os.path.basename(fp) for fp in existing_full_paths]
-            else:
-                session['agent_data'][agent_id]['rag_file'] = None
-                session['agent_data'][agent_id]['document_name'] = []
-        elif isinstance(docs, str):
-            full_path = os.path.join(app.config['UPLOAD_FOLDER'], docs)
-            if os.path.isfile(full_path):
-                session['agent_data'][agent_id]['rag_file'] = [docs]
-                session['agent_data'][agent_id]['document_name'] = [os.path.basename(docs)]
-            else:
-                session['agent_data'][agent_id]['rag_file'] = None
-                session['agent_data'][agent_id]['document_name'] = []
-        else:
-            session['agent_data'][agent_id]['rag_file'] = None
-            session['agent_data'][agent_id]['document_name'] = []
 
-    return session['agent_data'][agent_id]
+# ─── Agent Ask ───────────────────────────────────────────────────────────────
+RAG_TOKEN_BUDGET = 900  # uploaded-document context per turn (estimated tokens)
+RAG_TOP_K = 8  # chunks retrieved per turn before packing
+CHAT_MODEL = 'gpt-4-turbo'
+MAX_TOOL_ROUNDS = 3  # property lookups GPT may chain before it must answer
+
+# GPT calls run on a background pool so web workers are not held for the round trip; the
+# queue's heartbeat keeps a job alive through timeouts and retries, however long they take
+chat_jobs = JobQueue('neuroedge_properties.db', max_workers=int(os.getenv('LLM_WORKERS', '8')))
+
+# Chat completions go through retries, a circuit breaker and (optionally) hedging
+llm = ResilientClient(
+    max_retries=int(os.getenv('LLM_MAX_RETRIES', '2')),
+    breaker=CircuitBreaker(int(os.getenv('LLM_BREAKER_FAILURES', '5')), float(os.getenv('LLM_BREAKER_RESET', '30'))),
+    hedge_percentile=float(os.getenv('LLM_HEDGE_PERCENTILE', '0')) or None
+)
+
+# Identical GPT calls and listing searches already in flight are joined, not repeated
+single_flight = SingleFlight(app.config.get('SESSION_REDIS'))
+
+# GPT calls in flight per worker; past the cap visitors get a 429 rather than an endless wait
+llm_gate = ConcurrencyGate(int(os.getenv('LLM_MAX_IN_FLIGHT', '32')))
+
+def admit_llm_call():
+    """A slot for one GPT call, to be released when it ends; raises RateLimited when all are taken"""
+    slot = llm_gate.try_acquire()
+    if slot is None:
+        raise RateLimited("Our agents are busy right now, please try again shortly.",
+                          llm.latency.percentile(50) or 5)
+    return slot
+
+def admitted(slot, fn, *args):
+    """Run an admitted GPT call on the job pool, then free its slot"""
+    try:
+        return fn(*args)
+    finally:
+        slot.release()
 
+# Identical prompts (same agent, prompt, documents and recent turns) reuse the reply
+response_cache = ResponseCache(app.config.get('SESSION_REDIS'), ttl=int(os.getenv('LLM_CACHE_TTL', str(6 * 3600))))
+
+# Per-agent latency, tokens, cost and cache hits; summed across workers in Redis unless METRICS_REDIS=0
+metrics = Metrics(app.config.get('SESSION_REDIS') if os.getenv('METRICS_REDIS', '1') != '0' else None)
+
+def cached_reply(agent_id, cache_key):
+    """The cached reply for ``cache_key`` or None, counted as a cache hit or miss for the agent"""
+    cached = response_cache.get(cache_key)
+    metrics.inc('llm_cache_hits' if cached is not None else 'llm_cache_misses', agent_id)
+    return cached
 
-# ─── Agent Ask ───────────────────────────────────────────────────────────────
 def agent_ask(agent_id, user_text, data):
     ts = datetime.now()
     data['history'].append({'role': 'user', 'content': user_text, 'timestamp': ts})
@@ -329,7 +587,7 @@ def agent_ask(agent_id, user_text, data):
     if agent_id == 'Search-AI':
         try:
             db = PropertyDatabase(db_path='neuroedge_properties.db', agency_name='NeuroEdge Properties')
-            properties = db.search_properties(user_text, max_results=15)  # Increased limit
+            properties = shared_search(user_text, 15, hybrid=True, caller=agent_id)  # Increased limit
             
             # Create response directly from database (no GPT involved)
             answer = generate_database_response(properties, user_text)
@@ -339,50 +597,266 @@ def agent_ask(agent_id, user_text, data):
             answer = "⚠️ Search temporarily unavailable. Please try again in a moment."
         
         data['history'].append({'role': 'assistant', 'content': answer, 'timestamp': ts})
-        session.modified = True
+        remember_turn(agent_id, data)
         return answer
 
-    # --- REGULAR AGENTS: USE EXISTING GPT CODE ---
-    # Standard GPT messages
+    # --- REGULAR AGENTS: LOCAL ANSWER IF POSSIBLE, GPT OTHERWISE ---
+    answer = local_reply(agent_id, user_text)
+    if answer is None:
+        messages = build_agent_messages(agent_id, user_text, data)
+        cache_key = response_cache.key(agent_id, messages)
+        answer = cached_reply(agent_id, cache_key)
+        if answer is None:
+            answer = complete_chat(messages, cache_key, agent_id)
+
+    data['history'].append({'role': 'assistant', 'content': answer, 'timestamp': ts})
+    remember_turn(agent_id, data)
+    return answer
+
+def summary_completion(messages, agent_id=None):
+    """Session-free GPT call used by background summary jobs; raises on API errors"""
+    with metrics.timed('llm', agent_id):
+        response = llm.complete(
+            model=CHAT_MODEL,
+            messages=messages,
+            temperature=0.2,
+            timeout=60
+        )
+    metrics.record_usage(agent_id, CHAT_MODEL, response.usage)
+    return response.choices[0].message.content.strip()
+
+def apply_summary(data):
+    """Fold older turns into the running summary once its background job has finished"""
+    job_ref = data.get('summary_job')
+    if not job_ref:
+        return
+    job = chat_jobs.get(job_ref['id'])
+    if job and job['status'] in (QUEUED, RUNNING):
+        return
+    if job and job['status'] == DONE:
+        summary = job['result']
+    else:
+        summary = extractive_summary(data.get('summary'), data['history'][:job_ref['count']])
+    fold(data, job_ref['count'], summary)
+    data.pop('summary_job', None)
+
+def remember_turn(agent_id, data):
+    """Keep the prompt window bounded after a completed turn.
+
+    Once it reaches FOLD_AFTER messages, everything but the verbatim tail is
+    summarised by a background job and folded in on a later turn. If the job
+    lags and the history hits HARD_LIMIT, the local extractive summary is
+    used straight away.
+    """
+    apply_summary(data)
+    history = data['history']
+    if agent_id == 'Search-AI':
+        # Search results are never fed back to a model; keep only the recent ones
+        del history[:-TAIL_MESSAGES]
+    elif len(history) > HARD_LIMIT:
+        count = len(history) - TAIL_MESSAGES
+        fold(data, count, extractive_summary(data.get('summary'), history[:count]))
+        data.pop('summary_job', None)
+    elif len(history) >= FOLD_AFTER and not data.get('summary_job'):
+        count = len(history) - TAIL_MESSAGES
+        turns = [{'role': m['role'], 'content': m['content']} for m in history[:count]]
+        job_id = chat_jobs.submit('summary', summarise, data.get('summary'), turns,
+                                 partial(summary_completion, agent_id=agent_id), owner=agent_id)
+        data['summary_job'] = {'id': job_id, 'count': count}
+
+def tool_agents():
+    """Agents with rows in the agents table look their listings up with tools"""
+    return {agent['name'] for agent in db.get_agents()}
+
+def build_agent_messages(agent_id, user_text, data):
+    """System prompt, recent history and packed document context for a GPT agent"""
+    # Standard GPT messages: running summary of older turns plus the recent ones verbatim
+    apply_summary(data)
+    uses_tools = agent_id in tool_agents()
     messages = [
         {'role': 'system', 'content': AGENT_CONFIG[agent_id]['system_prompt']},
-        *data['history'][-6:]  # last 6 messages
+        *prompt_messages(data)
     ]
+    if uses_tools:
+        messages.insert(1, {'role': 'system', 'content': TOOL_INSTRUCTIONS})
 
-    # Handle RAG context for other agents
-    rag_files = data.get('rag_file')
-    if rag_files:
-        if isinstance(rag_files, str):
-            rag_files = [rag_files]
-        context_parts = []
-        for rel_path in rag_files:
-            full_path = os.path.join(app.config['UPLOAD_FOLDER'], rel_path)
-            if os.path.exists(full_path):
-                try:
-                    with open(full_path, 'r', encoding='utf-8') as f:
-                        context_parts.append(f.read())
-                except Exception as e:
-                    print(f"⚠️ Error reading {full_path}: {e}")
-        if context_parts:
-            context_text = "\n\n".join(context_parts)[:3000]
-            messages.insert(1, {'role': 'system', 'content': f"You may use this uploaded context:\n\n{context_text}"})
-
-    # Standard GPT call for regular agents
+    # Handle RAG context for other agents: best chunks of their uploaded documents
+    snippets = []
     try:
-        response = openai.chat.completions.create(
-            model='gpt-4-turbo',
-            messages=[{'role': m['role'], 'content': m['content']} for m in messages],
-            temperature=0.7,
-            timeout=120
-        )
-        answer = response.choices[0].message.content.strip()
+        chunks = get_chunk_store(agent_id).search(agent_id, user_text, k=RAG_TOP_K)
+        if uses_tools:
+            # Listing exports duplicate (and drift from) the properties table the tools read
+            chunks = [c for c in chunks if not is_listings_export(c['filename'])]
+        # Packed chunks are shown in document order
+        reading_order = sorted(range(len(chunks)), key=lambda i: (chunks[i]['filename'], chunks[i]['position']))
+        for order, i in enumerate(reading_order):
+            chunk = chunks[i]
+            snippets.append({
+                'text': chunk['text'], 'source': f"{chunk['filename']}@{chunk['start']}",
+                'boost': chunk['score'], 'order': order
+            })
     except Exception as e:
-        answer = f"⚠️ API error: {e}"
+        print(f"⚠️ Document chunk search unavailable: {e}")
 
-    data['history'].append({'role': 'assistant', 'content': answer, 'timestamp': ts})
-    session.modified = True
+    # Semantic neighbours compete with keyword-ranked chunks for the budget
+    try:
+        for hit in get_semantic_index().search(user_text, k=3, kind='document', agent_id=agent_id):
+            if uses_tools and is_listings_export(hit['ref'].rsplit('#', 1)[0]):
+                continue
+            snippets.append({'text': hit['text'], 'source': hit['ref'], 'boost': 2.0 * hit['score']})
+    except Exception as e:
+        print(f"⚠️ Semantic document search unavailable: {e}")
+
+    context_text, _ = build_document_context(user_text, snippets, RAG_TOKEN_BUDGET)
+    if context_text:
+        messages.insert(1, {'role': 'system', 'content': f"You may use this uploaded context:\n\n{context_text}"})
+
+    return [{'role': m['role'], 'content': m['content']} for m in messages]
+
+def tool_options(agent_id, round_):
+    """Tool arguments for one GPT call; the last round may no longer call tools"""
+    if agent_id not in tool_agents():
+        return {}
+    return {'tools': TOOLS, 'tool_choice': 'auto' if round_ < MAX_TOOL_ROUNDS else 'none'}
+
+def tool_messages(agent_id, calls):
+    """The assistant's tool calls plus one result message per call, run against the agent's listings"""
+    messages = [{
+        'role': 'assistant', 'content': None,
+        'tool_calls': [{'id': c['id'], 'type': 'function',
+                        'function': {'name': c['name'], 'arguments': c['arguments']}} for c in calls]
+    }]
+    for call in calls:
+        with metrics.timed('db_search', agent_id):
+            result = run_tool(db, agent_id, call['name'], call['arguments'])
+        messages.append({'role': 'tool', 'tool_call_id': call['id'], 'content': result})
+    return messages
+
+def run_chat(messages, agent_id=None):
+    """One GPT reply; raises on API errors.
+
+    With ``agent_id`` set, GPT may look up that agent's listings with the
+    property tools; calls are executed locally and fed back until it answers.
+    """
+    messages = list(messages)
+    for round_ in range(MAX_TOOL_ROUNDS + 1):
+        with metrics.timed('llm', agent_id):
+            response = llm.complete(
+                model=CHAT_MODEL,
+                messages=messages,
+                temperature=0.7,
+                timeout=120,
+                **tool_options(agent_id, round_)
+            )
+        metrics.record_usage(agent_id, CHAT_MODEL, response.usage)
+        message = response.choices[0].message
+        if not message.tool_calls:
+            break
+        calls = [{'id': c.id, 'name': c.function.name, 'arguments': c.function.arguments}
+                 for c in message.tool_calls]
+        messages.extend(tool_messages(agent_id, calls))
+    return (message.content or "").strip()
+
+def complete_chat(messages, cache_key=None, agent_id=None):
+    """Standard (blocking) GPT call for regular agents, served from the cache when possible.
+
+    Concurrent calls with the same cache key share one GPT request.
+    """
+    if cache_key:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+    try:
+        if cache_key:
+            answer = single_flight.do(f"chat:{cache_key}", run_chat, messages, agent_id)
+        else:
+            answer = run_chat(messages, agent_id)
+    except Exception as e:
+        return f"⚠️ API error: {e}"
+    if cache_key and answer:
+        response_cache.set(cache_key, answer)
     return answer
 
+def submit_chat_job(agent_id, user_text, data, slot):
+    """Queue the GPT reply to a message already in the history; returns the job id.
+
+    ``slot`` (from ``admit_llm_call``) is held until the job ends. A cached
+    reply is appended straight away instead, the slot freed and None returned.
+    """
+    messages = build_agent_messages(agent_id, user_text, data)
+    cache_key = response_cache.key(agent_id, messages)
+    cached = cached_reply(agent_id, cache_key)
+    if cached is not None:
+        slot.release()
+        data['history'].append({'role': 'assistant', 'content': cached, 'timestamp': datetime.now()})
+        remember_turn(agent_id, data)
+        return None
+    job_id = chat_jobs.submit('chat', admitted, slot, complete_chat, messages, cache_key, agent_id, owner=agent_id)
+    data.setdefault('pending_jobs', []).append(job_id)
+    return job_id
+
+def job_reply(job):
+    if job['status'] == DONE:
+        return job['result']
+    return f"⚠️ API error: {job['error']}"
+
+def collect_chat_jobs(agent_id, data):
+    """Move finished job replies into the history; returns the ids still pending"""
+    pending, collected = [], False
+    for job_id in data.get('pending_jobs', []):
+        job = chat_jobs.get(job_id)
+        if job is None:
+            continue
+        if job['status'] in (QUEUED, RUNNING):
+            pending.append(job_id)
+        elif chat_jobs.claim(job_id):
+            data['history'].append({
+                'role': 'assistant', 'content': job_reply(job),
+                'timestamp': datetime.fromtimestamp(job['updated_at'])
+            })
+            collected = True
+    if collected:
+        remember_turn(agent_id, data)
+    if pending != data.get('pending_jobs', []):
+        data['pending_jobs'] = pending
+    return pending
+
+def stream_chat(messages, agent_id=None):
+    """Yield reply text deltas as GPT produces them, running any tool calls in between"""
+    messages = list(messages)
+    for round_ in range(MAX_TOOL_ROUNDS + 1):
+        calls = {}  # index -> streamed call, its name and arguments arrive in pieces
+        started, first_token = time.monotonic(), True
+        with metrics.timed('llm', agent_id):
+            stream = llm.stream(
+                model=CHAT_MODEL,
+                messages=messages,
+                temperature=0.7,
+                timeout=120,
+                stream_options={'include_usage': True},  # usage arrives in a final, choice-less chunk
+                **tool_options(agent_id, round_)
+            )
+            for chunk in stream:
+                if getattr(chunk, 'usage', None):
+                    metrics.record_usage(agent_id, CHAT_MODEL, chunk.usage)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    if first_token:
+                        metrics.observe('llm_first_token_seconds', agent_id, time.monotonic() - started)
+                        first_token = False
+                    yield delta.content
+                for piece in delta.tool_calls or []:
+                    call = calls.setdefault(piece.index, {'id': None, 'name': '', 'arguments': ''})
+                    call['id'] = piece.id or call['id']
+                    if piece.function:
+                        call['name'] += piece.function.name or ''
+                        call['arguments'] += piece.function.arguments or ''
+        if not calls:
+            return
+        messages.extend(tool_messages(agent_id, [calls[i] for i in sorted(calls)]))
+
 def generate_database_response(properties, query):
     """Generate responsive property search results for all devices"""
     
@@ -448,154 +922,9 @@ def generate_database_response(properties, query):
         </div>
     """
     
-    # Process each property
+    # Each card is rendered once per property version and then reused
     for prop in properties:
-        formatted_price = "{:,.2f}".format(prop['price'])
-        
-        # Get features
-        features = []
-        if prop.get('features'):
-            try:
-                features = json.loads(prop['features']) if isinstance(prop['features'], str) else prop['features']
-            except:
-                features = []
-        
-        status_color = {
-            'available': '#38a169', 
-            'sold': '#e53e3e', 
-            'deleted': '#718096', 
-            'archived': '#ed8936'
-        }.get(prop.get('status', 'available'), '#38a169')
-        
-        agent_name = prop.get('agent_name', 'Unknown Agent')
-        
-        # Add property card to html_response
-        html_response += f"""
-        <div style="
-            background: #ffffff;
-            border-radius: 12px;
-            padding: clamp(12px, 3vw, 20px);
-            margin-bottom: clamp(12px, 3vw, 20px);
-            border: 1px solid #e2e8f0;
-            box-shadow: 0 2px 12px rgba(0,0,0,0.08);
-            color: #2d3748;
-        ">
-            <!-- Header -->
-            <div style="display: flex; justify-content: space-between; align-items: flex-start; gap: clamp(8px, 2vw, 15px); margin-bottom: clamp(8px, 2vw, 12px); flex-wrap: wrap;">
-                <h4 style="
-                    margin: 0; 
-                    color: #2d3748; 
-                    font-size: clamp(1rem, 3.5vw, 1.2rem);
-                    line-height: 1.4;
-                    flex: 1;
-                    min-width: min(200px, 60vw);
-                    font-weight: 600;
-                ">{escape(prop['title'])}</h4>
-                <span style="
-                    background: {status_color};
-                    color: white;
-                    padding: clamp(4px, 1vw, 6px) clamp(10px, 2vw, 12px);
-                    border-radius: 10px;
-                    font-size: clamp(0.7rem, 2vw, 0.8rem);
-                    white-space: nowrap;
-                    font-weight: 600;
-                ">{prop.get('status', 'available').upper()}</span>
-            </div>
-            
-            <!-- Price -->
-            <div style="color: #2d3748; font-size: clamp(1.1rem, 4vw, 1.4rem); font-weight: bold; margin-bottom: clamp(8px, 2vw, 12px);">
-                N$ {formatted_price}
-            </div>
-            
-            <!-- Property Details -->
-            <div style="
-                display: grid;
-                grid-template-columns: repeat(auto-fit, minmax(min(120px, 45vw), 1fr));
-                gap: clamp(8px, 2vw, 12px);
-                margin-bottom: clamp(8px, 2vw, 12px);
-                font-size: clamp(0.8rem, 2.5vw, 0.9rem);
-            ">
-                <div style="text-align: center; color: #4a5568;">
-                    <div style="font-size: clamp(1.2rem, 4vw, 1.5rem);">🛏️</div>
-                    <div style="font-weight: 500;">{prop['bedrooms']} bed</div>
-                </div>
-                <div style="text-align: center; color: #4a5568;">
-                    <div style="font-size: clamp(1.2rem, 4vw, 1.5rem);">🚿</div>
-                    <div style="font-weight: 500;">{prop['bathrooms']} bath</div>
-                </div>
-                <div style="text-align: center; color: #4a5568;">
-                    <div style="font-size: clamp(1.2rem, 4vw, 1.5rem);">📏</div>
-                    <div style="font-weight: 500;">{prop.get('size_sqft', 'N/A')} sqft</div>
-                </div>
-                <div style="text-align: center; color: #4a5568;">
-                    <div style="font-size: clamp(1.2rem, 4vw, 1.5rem);">🏢</div>
-                    <div style="font-weight: 500;">{escape(prop['property_type'])}</div>
-                </div>
-            </div>
-            
-            <!-- Location -->
-            <div style="color: #4a5568; margin-bottom: clamp(8px, 2vw, 12px); font-size: clamp(0.8rem, 2.5vw, 0.9rem); font-weight: 500;">
-                📍 {escape(prop['location'])}
-            </div>
-            
-            <!-- Features -->
-            {f'''<div style="margin-bottom: clamp(8px, 2vw, 12px); font-size: clamp(0.8rem, 2.5vw, 0.85rem); color: #4a5568;">
-                <strong style="color: #2d3748;">Features:</strong> {escape(", ".join(features[:4]))}
-            </div>''' if features else ""}
-            
-            <!-- Agent -->
-            <div style="
-                background: #f7fafc;
-                padding: clamp(8px, 2vw, 12px);
-                border-radius: 6px;
-                margin-bottom: clamp(10px, 2.5vw, 15px);
-                font-size: clamp(0.8rem, 2.5vw, 0.9rem);
-                border: 1px solid #e2e8f0;
-                color: #4a5568;
-            ">
-                <strong style="color: #2d3748;">Agent:</strong> {escape(agent_name)}
-            </div>
-            
-            <!-- Action Buttons -->
-            <div style="
-                display: flex;
-                gap: clamp(6px, 1.5vw, 10px);
-                flex-wrap: wrap;
-            ">
-        """
-        
-        # Buttons with responsive sizing and better colors
-        buttons = []
-        button_style = """
-            color: white;
-            padding: clamp(8px, 1.5vw, 12px) clamp(12px, 2.5vw, 16px);
-            text-decoration: none;
-            border-radius: 6px;
-            font-size: clamp(0.75rem, 2.2vw, 0.85rem);
-            white-space: nowrap;
-            flex: 1;
-            min-width: fit-content;
-            text-align: center;
-            font-weight: 600;
-            border: none;
-            cursor: pointer;
-            transition: all 0.2s ease;
-        """
-        
-        if prop.get('listing_url'):
-            buttons.append(f'<a href="{prop["listing_url"]}" target="_blank" style="background:#4a5568;{button_style}" onmouseover="this.style.background=\'#2d3748\'" onmouseout="this.style.background=\'#4a5568\'">🌐 View Listing</a>')
-        else:
-            buttons.append(f'<a href="/admin/properties/{prop["id"]}" target="_blank" style="background:#718096;{button_style}" onmouseover="this.style.background=\'#4a5568\'" onmouseout="this.style.background=\'#718096\'">👁️ View Details</a>')
-        
-        agent_encoded = agent_name.replace(' ','%20')
-        buttons.append(f'<a href="/chat/{agent_encoded}" target="_blank" style="background:#38a169;{button_style}" onmouseover="this.style.background=\'#2f855a\'" onmouseout="this.style.background=\'#38a169\'">💬 Chat with Agent</a>')
-        
-        tally_url = TALLY_FORMS.get(agent_name)
-        if tally_url:
-            buttons.append(f'<a href="{tally_url}" target="_blank" style="background:#ed8936;{button_style}" onmouseover="this.style.background=\'#dd6b20\'" onmouseout="this.style.background=\'#ed8936\'">📋 Contact Form</a>')
-        
-        html_response += "".join(buttons)
-        html_response += "</div></div>"
+        html_response += fragment_cache.get_or_render('card', prop, render_property_card)
     
     # Add final tips section
     html_response += """
@@ -615,6 +944,202 @@ def generate_database_response(properties, query):
     """
     return html_response
 
+def render_property_card(prop):
+    """Render the HTML card for a single property search result"""
+    formatted_price = "{:,.2f}".format(prop['price'])
+    
+    # Get features
+    features = []
+    if prop.get('features'):
+        try:
+            features = json.loads(prop['features']) if isinstance(prop['features'], str) else prop['features']
+        except:
+            features = []
+    
+    status_color = {
+        'available': '#38a169', 
+        'sold': '#e53e3e', 
+        'deleted': '#718096', 
+        'archived': '#ed8936'
+    }.get(prop.get('status', 'available'), '#38a169')
+    
+    agent_name = prop.get('agent_name', 'Unknown Agent')
+    
+    # Build property card
+    card_html = f"""
+    <div style="
+        background: #ffffff;
+        border-radius: 12px;
+        padding: clamp(12px, 3vw, 20px);
+        margin-bottom: clamp(12px, 3vw, 20px);
+        border: 1px solid #e2e8f0;
+        box-shadow: 0 2px 12px rgba(0,0,0,0.08);
+        color: #2d3748;
+    ">
+        <!-- Header -->
+        <div style="display: flex; justify-content: space-between; align-items: flex-start; gap: clamp(8px, 2vw, 15px); margin-bottom: clamp(8px, 2vw, 12px); flex-wrap: wrap;">
+            <h4 style="
+                margin: 0; 
+                color: #2d3748; 
+                font-size: clamp(1rem, 3.5vw, 1.2rem);
+                line-height: 1.4;
+                flex: 1;
+                min-width: min(200px, 60vw);
+                font-weight: 600;
+            ">{escape(prop['title'])}</h4>
+            <span style="
+                background: {status_color};
+                color: white;
+                padding: clamp(4px, 1vw, 6px) clamp(10px, 2vw, 12px);
+                border-radius: 10px;
+                font-size: clamp(0.7rem, 2vw, 0.8rem);
+                white-space: nowrap;
+                font-weight: 600;
+            ">{prop.get('status', 'available').upper()}</span>
+        </div>
+        
+        <!-- Price -->
+        <div style="color: #2d3748; font-size: clamp(1.1rem, 4vw, 1.4rem); font-weight: bold; margin-bottom: clamp(8px, 2vw, 12px);">
+            N$ {formatted_price}
+        </div>
+        
+        <!-- Property Details -->
+        <div style="
+            display: grid;
+            grid-template-columns: repeat(auto-fit, minmax(min(120px, 45vw), 1fr));
+            gap: clamp(8px, 2vw, 12px);
+            margin-bottom: clamp(8px, 2vw, 12px);
+            font-size: clamp(0.8rem, 2.5vw, 0.9rem);
+        ">
+            <div style="text-align: center; color: #4a5568;">
+                <div style="font-size: clamp(1.2rem, 4vw, 1.5rem);">🛏️</div>
+                <div style="font-weight: 500;">{prop['bedrooms']} bed</div>
+            </div>
+            <div style="text-align: center; color: #4a5568;">
+                <div style="font-size: clamp(1.2rem, 4vw, 1.5rem);">🚿</div>
+                <div style="font-weight: 500;">{prop['bathrooms']} bath</div>
+            </div>
+            <div style="text-align: center; color: #4a5568;">
+                <div style="font-size: clamp(1.2rem, 4vw, 1.5rem);">📏</div>
+                <div style="font-weight: 500;">{prop.get('size_sqft', 'N/A')} sqft</div>
+            </div>
+            <div style="text-align: center; color: #4a5568;">
+                <div style="font-size: clamp(1.2rem, 4vw, 1.5rem);">🏢</div>
+                <div style="font-weight: 500;">{escape(prop['property_type'])}</div>
+            </div>
+        </div>
+        
+        <!-- Location -->
+        <div style="color: #4a5568; margin-bottom: clamp(8px, 2vw, 12px); font-size: clamp(0.8rem, 2.5vw, 0.9rem); font-weight: 500;">
+            📍 {escape(prop['location'])}
+        </div>
+        
+        <!-- Features -->
+        {f'''<div style="margin-bottom: clamp(8px, 2vw, 12px); font-size: clamp(0.8rem, 2.5vw, 0.85rem); color: #4a5568;">
+            <strong style="color: #2d3748;">Features:</strong> {escape(", ".join(features[:4]))}
+        </div>''' if features else ""}
+        
+        <!-- Agent -->
+        <div style="
+            background: #f7fafc;
+            padding: clamp(8px, 2vw, 12px);
+            border-radius: 6px;
+            margin-bottom: clamp(10px, 2.5vw, 15px);
+            font-size: clamp(0.8rem, 2.5vw, 0.9rem);
+            border: 1px solid #e2e8f0;
+            color: #4a5568;
+        ">
+            <strong style="color: #2d3748;">Agent:</strong> {escape(agent_name)}
+        </div>
+        
+        <!-- Action Buttons -->
+        <div style="
+            display: flex;
+            gap: clamp(6px, 1.5vw, 10px);
+            flex-wrap: wrap;
+        ">
+    """
+    
+    # Buttons with responsive sizing and better colors
+    buttons = []
+    button_style = """
+        color: white;
+        padding: clamp(8px, 1.5vw, 12px) clamp(12px, 2.5vw, 16px);
+        text-decoration: none;
+        border-radius: 6px;
+        font-size: clamp(0.75rem, 2.2vw, 0.85rem);
+        white-space: nowrap;
+        flex: 1;
+        min-width: fit-content;
+        text-align: center;
+        font-weight: 600;
+        border: none;
+        cursor: pointer;
+        transition: all 0.2s ease;
+    """
+    
+    if prop.get('listing_url'):
+        buttons.append(f'<a href="{prop["listing_url"]}" target="_blank" style="background:#4a5568;{button_style}" onmouseover="this.style.background=\'#2d3748\'" onmouseout="this.style.background=\'#4a5568\'">🌐 View Listing</a>')
+    else:
+        buttons.append(f'<a href="/admin/properties/{prop["id"]}" target="_blank" style="background:#718096;{button_style}" onmouseover="this.style.background=\'#4a5568\'" onmouseout="this.style.background=\'#718096\'">👁️ View Details</a>')
+    
+    agent_encoded = agent_name.replace(' ','%20')
+    buttons.append(f'<a href="/chat/{agent_encoded}" target="_blank" style="background:#38a169;{button_style}" onmouseover="this.style.background=\'#2f855a\'" onmouseout="this.style.background=\'#38a169\'">💬 Chat with Agent</a>')
+    
+    tally_url = TALLY_FORMS.get(agent_name)
+    if tally_url:
+        buttons.append(f'<a href="{tally_url}" target="_blank" style="background:#ed8936;{button_style}" onmouseover="this.style.background=\'#dd6b20\'" onmouseout="this.style.background=\'#ed8936\'">📋 Contact Form</a>')
+    
+    card_html += "".join(buttons)
+    card_html += "</div></div>"
+    return card_html
+
+def format_api_property(prop):
+    """Shape a property row for the public search API"""
+    return {
+        "property_id": prop['id'],
+        "title": prop['title'],
+        "price": f"N$ {prop['price']:,.2f}",
+        "bedrooms": prop['bedrooms'],
+        "bathrooms": prop['bathrooms'],
+        "location": prop['location'],
+        "type": prop['property_type'],
+        "size": f"{prop.get('size_sqft', 0)} sqft",
+        "agent_name": prop['agent_name'],
+        "agent_contact": prop['agent_phone'],
+        "agent_specialty": prop.get('agent_specialty', ''),
+        "description": prop.get('description', ''),
+        "features": json.loads(prop['features']) if prop['features'] else [],
+        "listing_url": prop.get('listing_url', ''),
+        "chat_link": f"/chat/{prop['agent_name'].replace(' ', '%20')}",
+        "view_link": f"/admin/properties/{prop['id']}"
+    }
+
+def render_api_property(prop):
+    """Serialised JSON fragment for one property, as cached by fragment_cache"""
+    return json.dumps(format_api_property(prop), ensure_ascii=False)
+
+def wants_stream():
+    """True when the client asked for NDJSON (Accept header or ?stream=1)"""
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return request.accept_mimetypes.best == 'application/x-ndjson'
+
+def ndjson_response(lines):
+    """Stream an iterable of JSON strings as newline-delimited JSON (chunked)"""
+    def generate():
+        for line in lines:
+            yield line + "\n"
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def assemble_json(envelope, key, fragments):
+    """Splice pre-serialised JSON fragments into an envelope as a list under `key`"""
+    head = json.dumps(envelope, ensure_ascii=False)
+    items = ",".join(fragments)
+    if head == "{}":
+        return f'{{"{key}": [{items}]}}'
+    return f'{head[:-1]}, "{key}": [{items}]}}'
+
 def format_listing(agent_name, listing_text):
     """Attach agent chat link cleanly, without breaking URLs."""
     chat_link = chat_url_for(agent_name)
@@ -658,13 +1183,14 @@ def home():
 
 
 @app.route('/chat/<agent_id>', methods=['GET', 'POST'])
+@rate_limited('chat', methods=('POST',))
 def chat(agent_id):
     if agent_id not in AGENT_CONFIG:
         flash('Unknown agent', 'error')
         return redirect(url_for('home'))
 
     data = user_agent_data(agent_id)
-    messages = data.get('history', [])
+    pending_jobs = collect_chat_jobs(agent_id, data)
     tally_form_url = TALLY_FORMS.get(agent_id)
     global_docs = load_global_docs()
     doc_list = global_docs.get(agent_id, [])
@@ -676,34 +1202,34 @@ def chat(agent_id):
     else:
         data['document_name'] = []
 
-    # Format timestamps for display
-    for msg in messages:
-        ts = msg.get('timestamp')
-        if ts and not isinstance(ts, str):
-            msg['timestamp'] = ts.strftime("%Y-%m-%d %H:%M:%S")
-
     lang = session.get('language', 'en')
 
     if request.method == 'POST':
         user_text = request.form.get('user_input', '').strip()
         if user_text:
             ts = datetime.now()
-            data['history'].append({'role': 'user', 'content': user_text, 'timestamp': ts})
 
-            # Handle Tally form requests for any agent
-            if any(phrase in user_text.lower() for phrase in ['leave my details', 'contact form', '📋']):
-                if tally_form_url:
-                    response = f"📋 Please <a href='{tally_form_url}' target='_blank'>fill out this short form</a> so your agent can get in touch with you."
-                    data['history'].append({'role': 'assistant', 'content': response, 'timestamp': ts})
-                    session.modified = True
-                    return redirect(url_for('chat', agent_id=agent_id))
-            
-            # For ALL agents including Search-AI, use agent_ask
-            # Search-AI will now use pure database results, others use GPT
-            agent_ask(agent_id, user_text, data)
+            # Form requests, greetings, FAQs and listing lookups are answered locally
+            response = local_reply(agent_id, user_text)
+            if response:
+                data['history'].append({'role': 'user', 'content': user_text, 'timestamp': ts})
+                data['history'].append({'role': 'assistant', 'content': response, 'timestamp': ts})
+                remember_turn(agent_id, data)
+                return redirect(url_for('chat', agent_id=agent_id))
+
+            # Search-AI answers from the database right away (agent_ask records the turn);
+            # GPT agents reply from a background job that the page polls for
+            if agent_id == 'Search-AI':
+                agent_ask(agent_id, user_text, data)
+            else:
+                slot = admit_llm_call()
+                data['history'].append({'role': 'user', 'content': user_text, 'timestamp': ts})
+                submit_chat_job(agent_id, user_text, data, slot)
             return redirect(url_for('chat', agent_id=agent_id))
 
-    # GET: render chat page
+    # GET: render chat page, one page of the stored conversation at a time
+    messages, more = conversation_store.page(data.id, request.args.get('before', type=int))
+    older_url = url_for('chat', agent_id=agent_id, before=messages[0]['id']) if more else None
     return render_template(
         'index.html',
         agent_id=agent_id,
@@ -712,11 +1238,180 @@ def chat(agent_id):
         AGENT_CONFIG=AGENT_CONFIG,
         TALLY_FORMS=TALLY_FORMS,
         document_name=data.get('document_name', []),
+        older_url=older_url,
         lang=lang,
         datetime=datetime,
-        tally_form=tally_form_url
+        tally_form=tally_form_url,
+        pending_jobs=[url_for('chat_job_status', agent_id=agent_id, job_id=j) for j in pending_jobs]
     )
 
+@app.route('/chat/<agent_id>/jobs', methods=['POST'])
+@rate_limited('chat')
+def chat_job_submit(agent_id):
+    """Queue a chat message and return 202 with the job id to poll"""
+    if agent_id not in AGENT_CONFIG or agent_id == 'Search-AI':
+        return jsonify({'error': 'Unknown agent'}), 404
+    payload = request.get_json(silent=True) or request.form
+    user_text = (payload.get('user_input') or '').strip()
+    if not user_text:
+        return jsonify({'error': 'Message is required'}), 400
+
+    data = user_agent_data(agent_id)
+    answer = local_reply(agent_id, user_text)
+    if answer:
+        data['history'].append({'role': 'user', 'content': user_text, 'timestamp': datetime.now()})
+        data['history'].append({'role': 'assistant', 'content': answer, 'timestamp': datetime.now()})
+        remember_turn(agent_id, data)
+        return jsonify({'job_id': None, 'status': DONE, 'content': answer})
+    slot = admit_llm_call()  # before the message is stored, so a refusal leaves no unanswered turn
+    data['history'].append({'role': 'user', 'content': user_text, 'timestamp': datetime.now()})
+    job_id = submit_chat_job(agent_id, user_text, data, slot)
+    if job_id is None:
+        return jsonify({'job_id': None, 'status': DONE, 'content': data['history'][-1]['content']})
+    status_url = url_for('chat_job_status', agent_id=agent_id, job_id=job_id)
+    return jsonify({'job_id': job_id, 'status': QUEUED, 'status_url': status_url}), 202, {'Location': status_url}
+
+@app.route('/chat/<agent_id>/jobs/<job_id>', methods=['GET'])
+def chat_job_status(agent_id, job_id):
+    """Poll a chat job; a finished reply is moved into the conversation"""
+    if agent_id not in AGENT_CONFIG:
+        return jsonify({'error': 'Unknown agent'}), 404
+    data = user_agent_data(agent_id)
+    if job_id not in data.get('pending_jobs', []):
+        return jsonify({'error': 'Unknown job'}), 404
+
+    job = chat_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if job['status'] in (QUEUED, RUNNING):
+        return jsonify({'job_id': job_id, 'status': job['status']}), 200, {'Retry-After': '1'}
+
+    collect_chat_jobs(agent_id, data)
+    return jsonify({
+        'job_id': job_id, 'status': job['status'], 'content': job_reply(job),
+        'timestamp': datetime.fromtimestamp(job['updated_at']).strftime("%Y-%m-%d %H:%M:%S")
+    })
+
+def contact_form_reply(agent_id):
+    """Canned reply pointing to the agent's Tally form, if it has one"""
+    tally_form_url = TALLY_FORMS.get(agent_id)
+    if tally_form_url:
+        return f"📋 Please <a href='{tally_form_url}' target='_blank'>fill out this short form</a> so your agent can get in touch with you."
+    return None
+
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@app.route('/chat/<agent_id>/stream', methods=['POST'])
+@rate_limited('chat')
+def chat_stream(agent_id):
+    """Relay an agent reply as Server-Sent Events.
+
+    Events: ``token`` ({delta}) as text arrives, then ``done`` ({content,
+    timestamp}) once the reply is stored in the conversation, or ``error``.
+    """
+    if agent_id not in AGENT_CONFIG:
+        return jsonify({'error': 'Unknown agent'}), 404
+    payload = request.get_json(silent=True) or request.form
+    user_text = (payload.get('user_input') or '').strip()
+    if not user_text:
+        return jsonify({'error': 'Message is required'}), 400
+
+    data = user_agent_data(agent_id)
+    ts = datetime.now()
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+    # Replies that never reach GPT are sent whole, as a single event
+    canned = local_reply(agent_id, user_text)
+    if canned or agent_id == 'Search-AI':
+        if canned:
+            data['history'].append({'role': 'user', 'content': user_text, 'timestamp': ts})
+            data['history'].append({'role': 'assistant', 'content': canned, 'timestamp': ts})
+            remember_turn(agent_id, data)
+        answer = canned or agent_ask(agent_id, user_text, data)
+        done = sse_event('done', {'content': answer, 'timestamp': ts.strftime("%Y-%m-%d %H:%M:%S")})
+        return Response(done, mimetype='text/event-stream', headers=headers)
+
+    slot = admit_llm_call()
+    data['history'].append({'role': 'user', 'content': user_text, 'timestamp': ts})
+    messages = build_agent_messages(agent_id, user_text, data)
+    cache_key = response_cache.key(agent_id, messages)
+    cached = cached_reply(agent_id, cache_key)
+    if cached is not None:
+        slot.release()
+        data['history'].append({'role': 'assistant', 'content': cached, 'timestamp': ts})
+        remember_turn(agent_id, data)
+        done = sse_event('done', {'content': cached, 'timestamp': ts.strftime("%Y-%m-%d %H:%M:%S")})
+        return Response(done, mimetype='text/event-stream', headers=headers)
+
+    def generate():
+        # The same reply already being generated (by a stream or a job) is joined, not repeated
+        flight_key = f"chat:{cache_key}"
+        flight, leader = single_flight.begin(flight_key)
+        parts = []
+        failed = None
+        complete = False
+        try:
+            if leader:
+                for delta in stream_chat(messages, agent_id):
+                    parts.append(delta)
+                    yield sse_event('token', {'delta': delta})
+                complete = True
+                # Only complete replies are cached, never ones cut short by a disconnect
+                if parts:
+                    response_cache.set(cache_key, "".join(parts).strip())
+            else:
+                parts.append(single_flight.wait(flight, timeout=150))
+        except Exception as e:
+            print(f"⚠️ Streaming error for {agent_id}: {e}")
+            failed = f"⚠️ API error: {e}"
+        finally:
+            # Runs on normal completion, API errors and client disconnects alike
+            if leader:
+                if complete:
+                    single_flight.finish(flight_key, flight, "".join(parts).strip())
+                else:
+                    single_flight.finish(flight_key, flight, error=RuntimeError(failed or "reply was interrupted"))
+            answer = "".join(parts).strip()
+            if failed:
+                # A reply cut short says so, in the page and in the stored history
+                answer = f"{answer}\n\n{failed}" if answer else failed
+            if answer:
+                data['history'].append({'role': 'assistant', 'content': answer, 'timestamp': datetime.now()})
+                remember_turn(agent_id, data)
+                data.save()  # after_request has already run for this response
+        if failed and not parts:
+            yield sse_event('error', {'message': failed})
+        else:
+            yield sse_event('done', {'content': answer, 'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream', headers=headers)
+    response.call_on_close(slot.release)  # held for as long as the reply streams
+    return response
+
+def ingest_document(agent_id, filename, path):
+    """Register one uploaded document, extract its text, chunk it and add it to the semantic index.
+
+    Only this document is touched, so the cost does not grow with the corpus
+    (apart from the semantic index save, queued as its own job). Runs as a background job;
+    returns the extraction metadata as its result.
+    """
+    register_document(agent_id, filename)
+    meta = text_extractor.extract(path)
+    document_store.invalidate(path)
+    if meta['status'] == 'ok':
+        text = document_store.read(path)
+        chunk_store.ingest(agent_id, filename, text, document_store.stamp(path))
+        if semantic_index.ready:
+            semantic_index.upsert_document(agent_id, filename, text)
+            save_semantic_index_soon()
+    else:
+        # Recorded so chat turns don't retry it until the file changes
+        chunk_store.mark_failed(agent_id, filename, document_store.stamp(path), meta.get('error'))
+    # Cached replies were based on the old document set
+    response_cache.invalidate_agent(agent_id)
+    return meta
+
 @app.route('/upload/<agent_id>', methods=['GET', 'POST'])
 @login_required
 def upload(agent_id):
@@ -745,26 +1440,33 @@ def upload(agent_id):
             flash(f"Error saving file: {e}", 'error')
             return redirect(url_for('upload', agent_id=agent_id))
 
-        # Update JSON registry with filename only
-        global_docs = load_global_docs()
-        global_docs.setdefault(agent_id, [])
-        global_docs[agent_id].append(filename)
-        save_global_docs(global_docs)
-
-        # Refresh in-memory documents
-        load_agent_documents()
-
-        flash('File uploaded successfully.', 'success')
+        # Registry, text extraction and indexes are updated for this file in the background
+        text_extractor.mark_pending(file_path)
+        job_id = document_jobs.submit('ingest', ingest_document, agent_id, filename, file_path, owner=agent_id)
+        status_url = url_for('upload_status', agent_id=agent_id, job_id=job_id)
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({'job_id': job_id, 'status': QUEUED, 'status_url': status_url}), 202, {'Location': status_url}
+        flash('File uploaded. It will be available to the agent in a moment.', 'success')
         return redirect(url_for('chat', agent_id=agent_id))
 
     return render_template('upload.html', agent_id=agent_id)
 
 
+@app.route('/upload/<agent_id>/jobs/<job_id>', methods=['GET'])
+@login_required
+def upload_status(agent_id, job_id):
+    """Progress of a document ingest; once done, its extraction metadata"""
+    job = document_jobs.get(job_id)
+    if job is None or job['owner'] != agent_id:
+        return jsonify({'error': 'Unknown job'}), 404
+    if job['status'] in (QUEUED, RUNNING):
+        return jsonify({'job_id': job_id, 'status': job['status']}), 200, {'Retry-After': '1'}
+    return jsonify({'job_id': job_id, 'status': job['status'], 'document': job['result'], 'error': job['error']})
+
 @app.route('/reset/<agent_id>', methods=['POST'])
 def reset(agent_id):
-    if 'agent_data' in session and agent_id in session['agent_data']:
-        session['agent_data'][agent_id]['history'] = []  # Only clears chat
-        session.modified = True
+    if agent_id in session.get('conversations', {}):
+        new_conversation(agent_id)  # Only clears chat; the old one stays in the store
     flash("Chat has been reset.", "success")
     return redirect(url_for('chat', agent_id=agent_id))
 
@@ -848,14 +1550,16 @@ def admin_dashboard():
                              agency=session.get('admin_agency', 'Agency'),
                              username=session.get('admin_username', 'Admin'),
                              total_properties=total_properties,
-                             agents=agents)
+                             agents=agents,
+                             cache_stats=fragment_cache.stats())
     except Exception as e:
         print(f"Error in admin dashboard: {e}")
         return render_template('admin_dashboard.html',
                              agency=session.get('admin_agency', 'Agency'),
                              username=session.get('admin_username', 'Admin'),
                              total_properties=0,
-                             agents=[])
+                             agents=[],
+                             cache_stats=fragment_cache.stats())
 
 @app.route('/admin/properties', methods=['GET', 'POST'])
 @login_required
@@ -879,6 +1583,7 @@ def admin_properties():
                         return redirect(url_for('admin_properties', error=f"Property with ID '{property_id}' not found"))
                     
                     success, message = db.permanently_delete_property(property_id)
+                    property_changed(property_id, previous=property_data)
                     print(f"DEBUG: Delete result - Success: {success}, Message: {message}")  # Debug line
                     
                     if success:
@@ -903,6 +1608,7 @@ def admin_properties():
                         return redirect(url_for('admin_properties', error=f"Property with ID '{property_id}' not found"))
                     
                     success, message = db.soft_delete_property(property_id)
+                    property_changed(property_id)
                     print(f"DEBUG: Archive result - Success: {success}, Message: {message}")  # Debug line
                     
                     if success:
@@ -944,16 +1650,21 @@ def property_details(property_id):
     
     if not property_data:
         return redirect(url_for('admin_properties', error="Property not found"))
-    
-    # Convert JSON fields
-    if property_data.get('features'):
-        property_data['features'] = json.loads(property_data['features'])
-    if property_data.get('images'):
-        property_data['images'] = json.loads(property_data['images'])
-    
-    return render_template('admin_property_details.html',
-                         property=property_data,
-                         agency=session['admin_agency'])
+
+    def build():
+        # Convert JSON fields
+        if property_data.get('features'):
+            property_data['features'] = json.loads(property_data['features'])
+        if property_data.get('images'):
+            property_data['images'] = json.loads(property_data['images'])
+        
+        return render_template('admin_property_details.html',
+                             property=property_data,
+                             agency=session['admin_agency'])
+
+    etag = etag_for('property_details', property_id, property_data.get('version'),
+                    property_data.get('updated_at'), session.get('admin_agency'))
+    return conditional(etag, build, cache_control='private, no-cache')
 
 @app.route('/admin/properties/add', methods=['GET', 'POST'])
 @login_required
@@ -978,6 +1689,7 @@ def admin_add_property():
             }
             
             if db.add_property(property_data):
+                property_changed(property_data['id'])
                 return redirect(url_for('admin_properties'))
             else:
                 return render_template('admin_add_property.html',
@@ -1017,6 +1729,7 @@ def admin_edit_property(property_id):
             }
             
             db.update_property(property_id, updates)
+            property_changed(property_id)
             return redirect(url_for('admin_properties'))
             
         except Exception as e:
@@ -1063,6 +1776,7 @@ def admin_agents():
             success, message = db.add_agent(agent_data)
             
             if success:
+                load_faq_answers()
                 return redirect(url_for('admin_agents', success=message))
             else:
                 return redirect(url_for('admin_agents', error=message))
@@ -1088,6 +1802,7 @@ def admin_trash():
         if action == 'restore_property':
             property_id = request.form.get('property_id')
             success, message = db.restore_property(property_id)
+            property_changed(property_id)
             
             if success:
                 return redirect(url_for('admin_trash', success=message))
@@ -1096,7 +1811,9 @@ def admin_trash():
         
         elif action == 'permanently_delete_property':
             property_id = request.form.get('property_id')
+            previous = db.get_property_by_id(property_id)
             success, message = db.permanently_delete_property(property_id)
+            property_changed(property_id, previous=previous)
             
             if success:
                 return redirect(url_for('admin_trash', success=message))
@@ -1154,69 +1871,68 @@ def admin_users():
 
 # ─── API ROUTES (also need database initialization) ──────────────────────────
 
+def search_response(query, max_results):
+    """Build the /api/search response body (JSON, or NDJSON when streaming was asked for)"""
+    print(f"🔍 WPB Search Request: '{query}'")
+    
+    # Initialize database for API route
+    db = PropertyDatabase(db_path='neuroedge_properties.db', agency_name='NeuroEdge Properties')
+
+    if wants_stream():
+        # One JSON property per line, sent as soon as each row is fetched
+        return ndjson_response(
+            fragment_cache.get_or_render('json', prop, render_api_property)
+            for prop in db.iter_search_properties(query, max_results)
+        )
+
+    properties = shared_search(query, max_results, caller='api')
+    
+    # Each entry is serialised once per property version and then reused
+    fragments = [fragment_cache.get_or_render('json', prop, render_api_property) for prop in properties]
+    
+    response = {
+        "agency": "NeuroEdge Properties",
+        "query": query,
+        "count": len(fragments),
+        "response_time": datetime.now().isoformat(),
+        "success": True
+    }
+    
+    print(f"✅ WPB Found {len(fragments)} properties for: '{query}'")
+    return app.response_class(assemble_json(response, 'properties', fragments), mimetype='application/json')
+
 @app.route('/api/search', methods=['POST', 'GET'])
+@rate_limited('search')
 def api_search():
     """
-    Endpoint for PropertyFinder to search Windhoek Property Brokers listings
+    Endpoint for PropertyFinder to search Windhoek Property Brokers listings.
+    GET with ?query= is cacheable: it carries a weak ETag (the body's response_time
+    changes on every build) and answers If-None-Match with 304.
     """
     try:
         if request.method == 'GET':
-            return jsonify({
-                "service": "Windhoek Property Brokers Search API",
-                "version": "1.0",
-                "status": "active",
-                "agency": "Windhoek Property Brokers"
-            })
-        
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "No JSON data provided"}), 400
-        
-        query = data.get('query', '').strip()
-        max_results = data.get('max_results', 5)
-        
-        if not query:
-            return jsonify({"error": "Query parameter required"}), 400
-        
-        print(f"🔍 WPB Search Request: '{query}'")
-        
-        # Initialize database for API route
-        db = PropertyDatabase(db_path='neuroedge_properties.db', agency_name='NeuroEdge Properties')
-        properties = db.search_properties(query, max_results)
-        
-        formatted_properties = []
-        for prop in properties:
-            formatted_prop = {
-                "property_id": prop['id'],
-                "title": prop['title'],
-                "price": f"N$ {prop['price']:,.2f}",
-                "bedrooms": prop['bedrooms'],
-                "bathrooms": prop['bathrooms'],
-                "location": prop['location'],
-                "type": prop['property_type'],
-                "size": f"{prop.get('size_sqft', 0)} sqft",
-                "agent_name": prop['agent_name'],
-                "agent_contact": prop['agent_phone'],
-                "agent_specialty": prop.get('agent_specialty', ''),
-                "description": prop.get('description', ''),
-                "features": json.loads(prop['features']) if prop['features'] else [],
-                "listing_url": prop.get('listing_url', ''),
-                "chat_link": f"/chat/{prop['agent_name'].replace(' ', '%20')}",
-                "view_link": f"/admin/properties/{prop['id']}"
-            }
-            formatted_properties.append(formatted_prop)
-        
-        response = {
-            "agency": "NeuroEdge Properties",
-            "query": query,
-            "properties": formatted_properties,
-            "count": len(formatted_properties),
-            "response_time": datetime.now().isoformat(),
-            "success": True
-        }
+            query = request.args.get('query', '').strip()
+            if not query:
+                return jsonify({
+                    "service": "Windhoek Property Brokers Search API",
+                    "version": "1.0",
+                    "status": "active",
+                    "agency": "Windhoek Property Brokers"
+                })
+            max_results = request.args.get('max_results', 5, type=int)
+        else:
+            data = request.get_json()
+            if not data:
+                return jsonify({"error": "No JSON data provided"}), 400
+            
+            query = data.get('query', '').strip()
+            max_results = data.get('max_results', 5)
+            
+            if not query:
+                return jsonify({"error": "Query parameter required"}), 400
         
-        print(f"✅ WPB Found {len(formatted_properties)} properties for: '{query}'")
-        return jsonify(response)
+        etag = etag_for('api_search', db.get_data_version(), query, max_results, wants_stream())
+        return conditional(etag, lambda: search_response(query, max_results), weak=True)
         
     except Exception as e:
         print(f"❌ WPB Search Error: {str(e)}")
@@ -1225,16 +1941,161 @@ def api_search():
             "success": False
         }), 500
 
+MAX_BATCH_QUERIES = 25
+
+@app.route('/api/search/batch', methods=['POST'])
+def api_search_batch():
+    """
+    Answer several searches in one request, e.g. a portal page of featured searches.
+    Body: {"queries": [{"query": "...", "max_results": 5} | "...", ...], "share_scan": false}
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get('queries') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "'queries' must be a non-empty list", "success": False}), 400
+    if len(items) > MAX_BATCH_QUERIES:
+        return jsonify({"error": f"At most {MAX_BATCH_QUERIES} queries per batch", "success": False}), 400
+
+    queries = []
+    for item in items:
+        if isinstance(item, str):
+            item = {'query': item}
+        if not isinstance(item, dict):
+            return jsonify({"error": "Each query must be a string or an object", "success": False}), 400
+        try:
+            max_results = max(1, min(int(item.get('max_results', data.get('max_results', 5))), 50))
+        except (TypeError, ValueError):
+            return jsonify({"error": "max_results must be an integer", "success": False}), 400
+        query = item.get('query') or ''
+        if not isinstance(query, str):
+            return jsonify({"error": "query must be a string", "success": False}), 400
+        queries.append((query.strip(), max_results))
+
+    check_rate_limit('search', cost=len(queries))  # a batch costs as much as its searches
+
+    started = datetime.now()
+    try:
+        db = PropertyDatabase(db_path='neuroedge_properties.db', agency_name='NeuroEdge Properties')
+        answers = db.search_properties_batch(queries, share_scan=bool(data.get('share_scan')))
+    except Exception as e:
+        print(f"❌ WPB Batch Search Error: {str(e)}")
+        return jsonify({"error": str(e), "success": False}), 500
+
+    results = []
+    for answer in answers:
+        fragments = [fragment_cache.get_or_render('json', prop, render_api_property) for prop in answer['results']]
+        envelope = {
+            "query": answer['query'],
+            "count": len(fragments),
+            "elapsed_ms": answer['elapsed_ms'],
+            "deduplicated": answer['deduplicated']
+        }
+        results.append(assemble_json(envelope, 'properties', fragments))
+
+    envelope = {
+        "agency": "NeuroEdge Properties",
+        "count": len(results),
+        "distinct_queries": sum(1 for a in answers if not a['deduplicated']),
+        "total_ms": round((datetime.now() - started).total_seconds() * 1000, 3),
+        "response_time": datetime.now().isoformat(),
+        "success": True
+    }
+    print(f"✅ WPB Batch answered {len(results)} queries ({envelope['distinct_queries']} distinct)")
+    return app.response_class(assemble_json(envelope, 'results', results), mimetype='application/json')
+
+def visitor_id():
+    """Stable anonymous id for the current browser session (owner of saved searches)"""
+    if 'visitor_id' not in session:
+        session['visitor_id'] = uuid.uuid4().hex
+    return session['visitor_id']
+
+@app.route('/api/saved-searches', methods=['GET', 'POST'])
+def api_saved_searches():
+    """List or create saved searches for the current visitor"""
+    if request.method == 'GET':
+        return jsonify({"saved_searches": saved_search_store.list_searches(visitor_id())})
+
+    data = request.get_json() or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "Body must be a JSON object"}), 400
+    query, given = data.get('query') or '', data.get('filters') or {}
+    if not isinstance(query, str):
+        return jsonify({"error": "query must be a string"}), 400
+    if not isinstance(given, dict):
+        return jsonify({"error": "filters must be an object"}), 400
+    query = query.strip()
+    filters = {key: given.get(key) for key in list(NUMERIC_FILTERS) + ['property_type', 'location']}
+    if any(not isinstance(filters[key], (str, type(None))) for key in ('property_type', 'location')):
+        return jsonify({"error": "property_type and location must be strings"}), 400
+    if not isinstance(data.get('contact'), (str, type(None))):
+        return jsonify({"error": "contact must be a string"}), 400
+    if not query and not any(v not in (None, '') for v in filters.values()):
+        return jsonify({"error": "A query or at least one filter is required"}), 400
+    try:
+        for key in NUMERIC_FILTERS:
+            if filters[key] not in (None, ''):
+                filters[key] = float(filters[key])
+    except (TypeError, ValueError):
+        return jsonify({"error": "Numeric filters must be numbers"}), 400
+
+    search_id = saved_search_store.save_search(visitor_id(), query, filters, contact=data.get('contact'))
+    return jsonify({"id": search_id, "success": True}), 201
+
+@app.route('/api/saved-searches/<int:search_id>', methods=['DELETE'])
+def api_delete_saved_search(search_id):
+    if not saved_search_store.delete_search(visitor_id(), search_id):
+        return jsonify({"error": "Saved search not found"}), 404
+    return jsonify({"success": True})
+
+@app.route('/api/saved-searches/alerts', methods=['GET'])
+def api_saved_search_alerts():
+    """New listings matching the visitor's saved searches (marked seen with ?mark_seen=1)"""
+    alerts = saved_search_store.alerts(visitor_id(), mark_seen=request.args.get('mark_seen') == '1')
+    properties = {}
+    for alert in alerts:
+        if alert['property_id'] not in properties:
+            prop = db.get_property_by_id(alert['property_id'])
+            properties[alert['property_id']] = format_api_property(prop) if prop else None
+        alert['property'] = properties[alert['property_id']]
+    return jsonify({"alerts": [a for a in alerts if a['property']], "count": len(alerts)})
+
+@app.route('/api/autocomplete', methods=['GET'])
+@rate_limited('autocomplete')
+def api_autocomplete():
+    """Search-as-you-type suggestions for suburbs, property types, features and titles"""
+    query = request.args.get('q', '')
+    limit = max(1, min(request.args.get('limit', 8, type=int), 20))
+
+    # Served from the current index; a stale one is rebuilt off the request path
+    if autocomplete_index.is_stale(db):
+        autocomplete_index.rebuild_in_background(db)
+
+    return jsonify({
+        "query": query,
+        "suggestions": autocomplete_index.suggest(query, limit)
+    })
+
 @app.route('/api/properties', methods=['GET'])
 def get_all_properties():
     """Test route to see all properties in WPB database"""
     db = PropertyDatabase(db_path='neuroedge_properties.db', agency_name='NeuroEdge Properties')
-    properties = db.get_all_properties()
-    return jsonify({
-        "agency": "Windhoek Property Brokers",
-        "total_properties": len(properties),
-        "properties": properties
-    })
+
+    def build():
+        if wants_stream():
+            # Full feed for partner integrations: one row per line, constant memory
+            return ndjson_response(
+                json.dumps(prop, ensure_ascii=False, default=str)
+                for prop in db.iter_all_properties()
+            )
+
+        properties = db.get_all_properties()
+        return jsonify({
+            "agency": "Windhoek Property Brokers",
+            "total_properties": len(properties),
+            "properties": properties
+        })
+
+    return conditional(etag_for('api_properties', db.get_data_version(), wants_stream()), build)
 @app.route('/admin/debug/properties')
 @login_required
 def debug_properties():
@@ -1252,6 +2113,50 @@ def debug_properties():
     
     return jsonify(property_info)
 
+def runtime_stats():
+    """Live state of this worker's LLM client, gates and caches"""
+    return {
+        'llm_client': llm.stats(),
+        'llm_gate': llm_gate.stats(),
+        'single_flight': single_flight.stats(),
+        'rate_limiter': rate_limiter.stats(),
+        'intent_router': intent_router.stats(),
+        'text_extraction': text_extractor.stats(),
+        'documents': document_store.stats(),
+    }
+
+@app.route('/admin/metrics')
+@login_required
+def admin_metrics():
+    """Per-agent LLM latency percentiles, tokens, cost, cache hits and errors (?format=json for raw)"""
+    snapshot = metrics.snapshot()
+    rows = metrics.summary(snapshot)
+    if request.args.get('format') == 'json':
+        return jsonify({'source': snapshot['source'], 'agents': rows, 'runtime': runtime_stats()})
+    return render_template('admin_metrics.html',
+                           agency=session.get('admin_agency', 'Agency'),
+                           rows=rows,
+                           source=snapshot['source'],
+                           runtime=runtime_stats())
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint; needs ``Authorization: Bearer $METRICS_TOKEN`` or an admin login"""
+    token = os.getenv('METRICS_TOKEN')
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    if not (token and hmac.compare_digest(supplied, token)) and not session.get('admin_logged_in'):
+        abort(403)
+    gate = llm_gate.stats()
+    text = metrics.prometheus() + (
+        "# HELP neuroedge_llm_in_flight GPT calls in flight in this worker\n"
+        "# TYPE neuroedge_llm_in_flight gauge\n"
+        f"neuroedge_llm_in_flight {gate['in_flight']}\n"
+        "# HELP neuroedge_llm_refused_total GPT calls refused because the in-flight cap was reached\n"
+        "# TYPE neuroedge_llm_refused_total counter\n"
+        f"neuroedge_llm_refused_total {gate['refused']}\n"
+    )
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
 @app.errorhandler(404)
 def not_found(e):
     flash("Page not found", 'error')
@@ -1262,8 +2167,17 @@ def too_large(e):
     flash("File too large (max 16MB)", "error")
     return redirect(request.referrer or url_for('home'))
 
+@app.errorhandler(RateLimited)
+def rate_limited_response(e):
+    headers = {'Retry-After': str(e.retry_after)}
+    if request.endpoint == 'chat':
+        # Chat form posts come back to the page, which shows the flash
+        flash(f"{e.message} (try again in {e.retry_after}s)", 'error')
+        return redirect(url_for('chat', **request.view_args)), 303, headers
+    return jsonify({'error': e.message, 'retry_after': e.retry_after, 'success': False}), 429, headers
+
 if __name__ == '__main__':
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-    load_agent_documents()  # Load all saved agent documents into memory before starting the app
+    sync_document_registry()  # Register documents copied into /var/data by hand
     app.run(host='0.0.0.0', port=5090)
 
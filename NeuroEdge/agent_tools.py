@@ -0,0 +1,95 @@
+# agent_tools.py - property database lookups exposed to GPT as function tools
+import re
+import json
+
+from context_packer import format_listings_table, listing_row, LISTING_COLUMNS
+
+MAX_TOOL_RESULTS = 8
+TOOL_RESULT_TOKEN_BUDGET = 700  # listing rows returned by one search (estimated tokens)
+
+# Listing exports uploaded as documents ("Sergej_listings.txt", "Christopher-listings.txt")
+LISTINGS_EXPORT_RE = re.compile(r'[-_]listings\.txt$', re.I)
+
+TOOLS = [
+    {
+        'type': 'function',
+        'function': {
+            'name': 'search_properties',
+            'description': "Search this agent's currently available listings. Use it for any question about "
+                           "which properties, prices, areas or features the agent has. Returns one row per listing.",
+            'parameters': {
+                'type': 'object',
+                'properties': {
+                    'query': {'type': 'string',
+                              'description': 'Keywords: property type, suburb, features (e.g. "house Eros pool")'},
+                    'bedrooms': {'type': 'integer', 'description': 'Exact number of bedrooms'},
+                    'max_price': {'type': 'number', 'description': 'Highest price in NAD'},
+                    'max_results': {'type': 'integer', 'description': f'At most {MAX_TOOL_RESULTS}'}
+                },
+                'required': ['query']
+            }
+        }
+    },
+    {
+        'type': 'function',
+        'function': {
+            'name': 'get_property_by_id',
+            'description': "Full details (description, features, link) of one of this agent's listings by its id.",
+            'parameters': {
+                'type': 'object',
+                'properties': {'property_id': {'type': 'string'}},
+                'required': ['property_id']
+            }
+        }
+    }
+]
+
+TOOL_INSTRUCTIONS = (
+    "Your current listings are in the property database, not in this prompt. Call search_properties to find "
+    "them and get_property_by_id for details of one. Never invent listings, prices or links."
+)
+
+
+def is_listings_export(filename):
+    """True for an uploaded dump of an agent's listings, which the tools replace"""
+    return bool(LISTINGS_EXPORT_RE.search(filename))
+
+
+def owned_by(prop, agent_id):
+    return agent_id in (prop.get('agent_id'), prop.get('agent_name'))
+
+
+def search_properties(db, agent_id, query='', bedrooms=None, max_price=None, max_results=5):
+    max_results = max(1, min(int(max_results or 5), MAX_TOOL_RESULTS))
+    filtered = bedrooms is not None or max_price is not None
+    rows = db.search_properties(query or '', max_results * 5 if filtered else max_results, agent=agent_id)
+    if bedrooms is not None:
+        rows = [p for p in rows if p.get('bedrooms') == int(bedrooms)]
+    if max_price is not None:
+        rows = [p for p in rows if (p.get('price') or 0) <= float(max_price)]
+    return format_listings_table(rows[:max_results], query, TOOL_RESULT_TOKEN_BUDGET)
+
+
+def get_property_by_id(db, agent_id, property_id):
+    prop = db.get_property_by_id(property_id)
+    if not prop or not owned_by(prop, agent_id) or prop.get('status') not in (None, 'available'):
+        return f"No available listing {property_id} for this agent."
+    details = {key: prop.get(key) for key in ('description', 'city', 'currency', 'listing_url')}
+    return f"{LISTING_COLUMNS}\n{listing_row(prop)}\n{json.dumps(details, ensure_ascii=False)}"
+
+
+HANDLERS = {'search_properties': search_properties, 'get_property_by_id': get_property_by_id}
+
+
+def run_tool(db, agent_id, name, arguments):
+    """Execute one tool call for ``agent_id``; errors are returned as text for the model to read"""
+    handler = HANDLERS.get(name)
+    if handler is None:
+        return f"Unknown tool {name}."
+    try:
+        kwargs = json.loads(arguments or '{}')
+        if not isinstance(kwargs, dict):
+            raise ValueError('arguments must be a JSON object')
+        return handler(db, agent_id, **kwargs)
+    except (ValueError, TypeError) as e:
+        return f"Invalid arguments for {name}: {e}"
@@ -0,0 +1,211 @@
+# autocomplete.py - in-memory prefix index for search-as-you-type suggestions
+import json
+import time
+import threading
+from bisect import bisect_left, insort
+
+# Shown first when several suggestions share a prefix
+KIND_PRIORITY = {'location': 0, 'type': 1, 'feature': 2, 'title': 3}
+
+
+def normalize(text):
+    return " ".join(str(text).lower().split())
+
+
+class PrefixIndex:
+    """Sorted-array prefix index over property locations, types, features and titles.
+
+    Every term is stored under its full text and under each later word start,
+    so "kuppe" finds "Kleine Kuppe". Lookups are a bisect plus a short scan and
+    never touch SQLite; the index is kept current by ``index_property`` /
+    ``remove_property`` and rebuilt when the database's data version moves
+    (another worker changed a property). Rebuilds run on a background
+    thread; lookups keep using the previous index until the new one is
+    swapped in.
+    """
+
+    def __init__(self, max_scan=200, rebuild_interval=5.0):
+        self.max_scan = max_scan
+        self.rebuild_interval = rebuild_interval
+        self._keys = []          # sorted list of (key, term) pairs
+        self._terms = {}         # term -> {'text', 'kind', 'count'}
+        self._by_property = {}   # property_id -> [(kind, text)]
+        self._lock = threading.Lock()
+        self._data_version = None
+        self._last_check = 0.0
+        self._rebuilding = threading.Lock()
+
+    # --- Building -----------------------------------------------------------
+    def terms_for(self, prop):
+        """Distinct (kind, display text) pairs a property contributes"""
+        terms = set()
+        for part in (prop.get('location') or '').split(','):
+            if part.strip():
+                terms.add(('location', part.strip()))
+        if prop.get('property_type'):
+            terms.add(('type', prop['property_type'].strip()))
+        features = prop.get('features') or []
+        if isinstance(features, str):
+            try:
+                features = json.loads(features)
+            except ValueError:
+                features = []
+        for feature in features:
+            if str(feature).strip():
+                terms.add(('feature', str(feature).strip()))
+        if prop.get('title'):
+            terms.add(('title', prop['title'].strip()))
+        return terms
+
+    def _add_term(self, kind, text):
+        term = (kind, normalize(text))
+        entry = self._terms.get(term)
+        if entry:
+            entry['count'] += 1
+            return
+        self._terms[term] = {'text': text, 'kind': kind, 'count': 1}
+        words = term[1].split(' ')
+        for i in range(len(words)):
+            insort(self._keys, (" ".join(words[i:]), term))
+
+    def _remove_term(self, kind, text):
+        term = (kind, normalize(text))
+        entry = self._terms.get(term)
+        if not entry:
+            return
+        entry['count'] -= 1
+        if entry['count'] > 0:
+            return
+        del self._terms[term]
+        words = term[1].split(' ')
+        for i in range(len(words)):
+            pair = (" ".join(words[i:]), term)
+            pos = bisect_left(self._keys, pair)
+            if pos < len(self._keys) and self._keys[pos] == pair:
+                del self._keys[pos]
+
+    def index_property(self, prop):
+        """Add or re-index a property; unavailable listings are dropped"""
+        with self._lock:
+            self._remove_locked(prop['id'])
+            if prop.get('status') not in (None, 'available'):
+                return
+            terms = self.terms_for(prop)
+            for kind, text in terms:
+                self._add_term(kind, text)
+            self._by_property[prop['id']] = list(terms)
+
+    def remove_property(self, property_id):
+        with self._lock:
+            self._remove_locked(property_id)
+
+    def _remove_locked(self, property_id):
+        for kind, text in self._by_property.pop(property_id, []):
+            self._remove_term(kind, text)
+
+    def rebuild(self, db):
+        """Rebuild from every available property in the database (keys sorted once, not inserted one by one)"""
+        version = db.get_data_version()
+        terms, by_property = {}, {}
+        for prop in db.iter_all_properties():
+            if prop.get('status') not in (None, 'available'):
+                continue
+            prop_terms = self.terms_for(prop)
+            by_property[prop['id']] = list(prop_terms)
+            for kind, text in prop_terms:
+                term = (kind, normalize(text))
+                entry = terms.get(term)
+                if entry:
+                    entry['count'] += 1
+                else:
+                    terms[term] = {'text': text, 'kind': kind, 'count': 1}
+        keys = []
+        for term in terms:
+            words = term[1].split(' ')
+            keys.extend((" ".join(words[i:]), term) for i in range(len(words)))
+        keys.sort()
+        with self._lock:
+            self._keys, self._terms, self._by_property = keys, terms, by_property
+            self._data_version = version
+            self._last_check = time.monotonic()
+        print(f"✅ Autocomplete index built with {len(terms)} terms")
+
+    def rebuild_in_background(self, db):
+        """Start ``rebuild`` on a thread unless one is already running; returns at once"""
+        if not self._rebuilding.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                self.rebuild(db)
+            except Exception as e:
+                print(f"⚠️ Autocomplete rebuild failed: {e}")
+            finally:
+                self._rebuilding.release()
+
+        threading.Thread(target=run, name='autocomplete-rebuild', daemon=True).start()
+
+    def mark_synced(self, db):
+        """Record the database's data version after applying our own write"""
+        version = db.get_data_version()
+        with self._lock:
+            self._data_version = version
+
+    def is_stale(self, db):
+        """Throttled data-version check for property writes made by other workers"""
+        if self._data_version is None:
+            return True
+        now = time.monotonic()
+        if now - self._last_check < self.rebuild_interval:
+            return False
+        self._last_check = now
+        return db.get_data_version() != self._data_version
+
+    # --- Lookup -------------------------------------------------------------
+    def lookup(self, prefix, limit=8):
+        """Terms with a word starting with ``prefix``, best kinds and most listings first"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        with self._lock:
+            pos = bisect_left(self._keys, (prefix,))
+            seen = {}
+            for key, term in self._keys[pos:pos + self.max_scan]:
+                if not key.startswith(prefix):
+                    break
+                entry = self._terms.get(term)
+                if entry and term not in seen:
+                    seen[term] = entry
+        ranked = sorted(
+            seen.values(),
+            key=lambda e: (KIND_PRIORITY.get(e['kind'], 9), not normalize(e['text']).startswith(prefix), -e['count'], e['text'])
+        )
+        return [{'text': e['text'], 'kind': e['kind'], 'listings': e['count']} for e in ranked[:limit]]
+
+    def suggest(self, text, limit=8):
+        """Complete the trailing words of a chat message.
+
+        Tries the last three, two, then one word as the prefix so multi-word
+        suburbs ("klein wind") complete; each suggestion carries the full
+        completed input.
+        """
+        words = text.rstrip().split(' ') if text.strip() else []
+        if text.endswith(' ') or not words:
+            return []
+        for n in (3, 2, 1):
+            if len(words) < n:
+                continue
+            head, tail = " ".join(words[:-n]), " ".join(words[-n:])
+            matches = self.lookup(tail, limit)
+            if n > 1:
+                # Multi-word tails must start the term, not land mid-title
+                matches = [m for m in matches if normalize(m['text']).startswith(normalize(tail))]
+            if matches:
+                for match in matches:
+                    match['completion'] = f"{head} {match['text']}".strip()
+                return matches
+        return []
+
+    def stats(self):
+        with self._lock:
+            return {'terms': len(self._terms), 'keys': len(self._keys), 'properties': len(self._by_property)}
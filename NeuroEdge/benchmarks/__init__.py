@@ -0,0 +1 @@
+# benchmarks - synthetic-inventory benchmarks for search and listing paths
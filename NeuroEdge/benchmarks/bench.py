@@ -0,0 +1,273 @@
+# bench.py - latency/memory benchmarks for the search and listing paths
+"""
+Run from the NeuroEdge directory:
+
+    python -m benchmarks.bench run --scales 1k,10k
+    python -m benchmarks.bench run --scales 100k,1m --max-time 20
+    python -m benchmarks.bench compare benchmarks/results/A.json benchmarks/results/B.json
+
+Each scale point gets its own synthetic database under benchmarks/.data/<scale>/
+(reused between runs) and runs in its own Python process with an empty, temporary
+PERSISTENT_DISK_PATH, so no index, cache or /var/data state carries over from
+another scale. Results are written to benchmarks/results/ as
+<timestamp>-<commit>.json so runs from different commits can be compared.
+"""
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import platform
+import resource
+import statistics
+import tempfile
+import subprocess
+import tracemalloc
+from datetime import datetime
+
+from benchmarks.generator import SCALES, build_database
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+DATA_DIR = os.path.join(BENCH_DIR, '.data')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+SEARCH_QUERIES = {
+    'phrase': 'house Klein Windhoek',
+    'single_term': 'pool',
+    'multi_term': '3 bedroom garden Eros',
+    'empty': '',
+}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=BENCH_DIR, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def measure(fn, rounds=10, max_time=5.0, setup=None):
+    """Time ``fn`` pytest-benchmark style, then take one traced run for peak memory"""
+    if setup:
+        setup()
+    fn()  # warmup
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < rounds and (not timings or time.perf_counter() - started < max_time):
+        if setup:
+            setup()
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+
+    if setup:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    ordered = sorted(timings)
+    return {
+        'rounds': len(timings),
+        'min_ms': ordered[0] * 1000,
+        'max_ms': ordered[-1] * 1000,
+        'mean_ms': statistics.fmean(timings) * 1000,
+        'median_ms': statistics.median(timings) * 1000,
+        'p95_ms': ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))] * 1000,
+        'stddev_ms': (statistics.stdev(timings) * 1000) if len(timings) > 1 else 0.0,
+        'ops_per_sec': 1.0 / statistics.fmean(timings) if statistics.fmean(timings) else 0.0,
+        'peak_alloc_kb': peak / 1024,
+    }
+
+
+def ok(response):
+    """A route response, checked: timing a 429 or an error page would measure the wrong thing"""
+    if response.status_code != 200:
+        raise RuntimeError(f"{response.request.method} {response.request.path} answered "
+                           f"{response.status_code}: {response.get_data(as_text=True)[:200]}")
+    return response
+
+
+def run_scale(scale, rounds, max_time):
+    """Benchmark every database method and route against one scale point (imports WPB: one per process)"""
+    count = SCALES[scale]
+    scale_dir = os.path.join(DATA_DIR, scale)
+    os.makedirs(scale_dir, exist_ok=True)
+    t0 = time.perf_counter()
+    build_database(os.path.join(scale_dir, 'neuroedge_properties.db'), count)
+    build_seconds = time.perf_counter() - t0
+
+    # WPB opens 'neuroedge_properties.db' relative to the working directory
+    os.chdir(scale_dir)
+    # The routes are hammered from one client; rate limiting would turn them into 429s
+    for route in ('SEARCH', 'AUTOCOMPLETE'):
+        os.environ[f'RATE_LIMIT_{route}'] = '1000000000/1'
+    import WPB
+    from property_database import PropertyDatabase
+
+    db = PropertyDatabase('neuroedge_properties.db', 'Benchmark Properties')
+    client = WPB.app.test_client()
+    results = {}
+
+    def bench(name, fn, setup=None):
+        results[name] = measure(fn, rounds, max_time, setup)
+        print(f"  {scale:>5} {name:<40} median {results[name]['median_ms']:10.2f} ms"
+              f"  peak {results[name]['peak_alloc_kb']:10.1f} KiB")
+
+    # --- PropertyDatabase methods ---
+    for label, query in SEARCH_QUERIES.items():
+        bench(f'db.search_properties[{label}]', lambda q=query: db.search_properties(q, max_results=15))
+    bench('db.get_all_properties', lambda: db.get_all_properties())
+    bench('db.iter_all_properties', lambda: sum(1 for _ in db.iter_all_properties()))
+    bench('db.get_all_properties[include_deleted]', lambda: db.get_all_properties(include_deleted=True))
+    bench('db.get_property_by_id', lambda: db.get_property_by_id(f"SYN-{count // 2:07d}"))
+    bench('db.get_deleted_properties', lambda: db.get_deleted_properties())
+
+    # --- Rendering ---
+    found = db.search_properties(SEARCH_QUERIES['phrase'], max_results=15)
+    bench('generate_database_response[cold]',
+          lambda: WPB.generate_database_response(found, SEARCH_QUERIES['phrase']),
+          setup=WPB.fragment_cache.clear)
+    bench('generate_database_response[warm]',
+          lambda: WPB.generate_database_response(found, SEARCH_QUERIES['phrase']))
+
+    # --- Routes through the Flask test client ---
+    # /api/search would otherwise start a semantic index build in the background and time
+    # against it; build it up front, as a running server would have it
+    WPB.semantic_build_lock.acquire()
+    WPB.build_semantic_index()
+    for label, query in SEARCH_QUERIES.items():
+        if query:
+            bench(f'POST /api/search[{label}]',
+                  lambda q=query: ok(client.post('/api/search', json={'query': q, 'max_results': 15})).data)
+    bench('POST /api/search[ndjson]',
+          lambda: ok(client.post('/api/search?stream=1', json={'query': 'pool', 'max_results': 15})).data)
+    bench('GET /api/properties', lambda: ok(client.get('/api/properties')).data)
+    bench('GET /api/properties[ndjson]',
+          lambda: sum(len(chunk) for chunk in ok(client.get('/api/properties?stream=1')).response))
+
+    # Build the autocomplete index now: the route only starts a background rebuild,
+    # and timing it before that finishes would measure an empty index
+    WPB.autocomplete_index.rebuild(WPB.db)
+    if not WPB.autocomplete_index.suggest('klein wi', 8):
+        raise RuntimeError("autocomplete index has no suggestions for 'klein wi'")
+    bench('GET /api/autocomplete', lambda: ok(client.get('/api/autocomplete?q=klein wi')).data)
+
+    WPB.fragment_cache.clear()
+    return {
+        'rows': count,
+        'build_seconds': build_seconds,
+        'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'benchmarks': results,
+    }
+
+
+def run_scale_isolated(scale, rounds, max_time):
+    """``run_scale`` in a fresh interpreter with its own empty data directory"""
+    with tempfile.TemporaryDirectory(prefix=f'neuroedge-bench-{scale}-') as tmp:
+        out = os.path.join(tmp, 'result.json')
+        env = {**os.environ, 'PERSISTENT_DISK_PATH': os.path.join(tmp, 'data')}
+        subprocess.run([sys.executable, '-m', 'benchmarks.bench', 'scale', scale, '--rounds', str(rounds),
+                        '--max-time', str(max_time), '--output', out], cwd=APP_DIR, env=env, check=True)
+        with open(out, encoding='utf-8') as f:
+            return json.load(f)
+
+
+def run_one(args):
+    """Child process of ``run``: one scale point, result written as JSON"""
+    result = run_scale(args.scale, args.rounds, args.max_time)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(result, f)
+
+
+def run(args):
+    scales = [s.strip().lower() for s in args.scales.split(',') if s.strip()]
+    unknown = [s for s in scales if s not in SCALES]
+    if unknown:
+        sys.exit(f"Unknown scale(s): {', '.join(unknown)} (choose from {', '.join(SCALES)})")
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'scales': {}
+    }
+    for name in scales:
+        print(f"▶ Scale {name} ({SCALES[name]:,} rows)")
+        report['scales'][name] = run_scale_isolated(name, args.rounds, args.max_time)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    out = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{report['commit']}.json")
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {out}")
+
+
+def compare(args):
+    """Print median latency deltas between two result files and flag regressions"""
+    with open(args.baseline, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(args.candidate, encoding='utf-8') as f:
+        cand = json.load(f)
+
+    print(f"baseline {base['commit']} ({base['timestamp']})  vs  candidate {cand['commit']} ({cand['timestamp']})")
+    regressions = 0
+    for scale, cand_scale in cand['scales'].items():
+        base_scale = base['scales'].get(scale)
+        if not base_scale:
+            continue
+        print(f"\n{scale}  (max RSS {base_scale['max_rss_mb']:.0f} MB -> {cand_scale['max_rss_mb']:.0f} MB)")
+        for name, stats in cand_scale['benchmarks'].items():
+            old = base_scale['benchmarks'].get(name)
+            if not old:
+                continue
+            change = (stats['median_ms'] - old['median_ms']) / old['median_ms'] if old['median_ms'] else 0.0
+            flag = ''
+            if change > args.threshold:
+                flag = '  ⚠️ slower'
+                regressions += 1
+            elif change < -args.threshold:
+                flag = '  ✅ faster'
+            print(f"  {name:<40} {old['median_ms']:10.2f} -> {stats['median_ms']:10.2f} ms ({change:+.1%}){flag}")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Search and listing benchmarks on synthetic inventory')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = sub.add_parser('run', help='run benchmarks and store the results')
+    run_parser.add_argument('--scales', default='1k,10k', help=f"comma-separated ({', '.join(SCALES)})")
+    run_parser.add_argument('--rounds', type=int, default=10)
+    run_parser.add_argument('--max-time', type=float, default=5.0, help='seconds per benchmark')
+    run_parser.add_argument('--output', help='result file (default: benchmarks/results/<time>-<commit>.json)')
+    run_parser.set_defaults(func=run)
+
+    scale_parser = sub.add_parser('scale', help='benchmark one scale point in this process (used by run)')
+    scale_parser.add_argument('scale', choices=list(SCALES))
+    scale_parser.add_argument('--rounds', type=int, default=10)
+    scale_parser.add_argument('--max-time', type=float, default=5.0)
+    scale_parser.add_argument('--output', required=True, help='result file (JSON)')
+    scale_parser.set_defaults(func=run_one)
+
+    cmp_parser = sub.add_parser('compare', help='compare two result files')
+    cmp_parser.add_argument('baseline')
+    cmp_parser.add_argument('candidate')
+    cmp_parser.add_argument('--threshold', type=float, default=0.10, help='relative change to flag')
+    cmp_parser.add_argument('--fail-on-regression', action='store_true')
+    cmp_parser.set_defaults(func=compare)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+# generator.py - deterministic synthetic Namibian property inventory
+import os
+import json
+import math
+import random
+import sqlite3
+from datetime import datetime, timedelta
+
+from property_database import PropertyDatabase
+
+# (suburb, town, price multiplier) - rough relative price levels
+SUBURBS = [
+    ('Klein Windhoek', 'Windhoek', 1.6), ('Ludwigsdorf', 'Windhoek', 2.0), ('Eros', 'Windhoek', 1.4),
+    ('Olympia', 'Windhoek', 1.3), ('Pioneers Park', 'Windhoek', 1.1), ('Kleine Kuppe', 'Windhoek', 1.2),
+    ('Auasblick', 'Windhoek', 1.7), ('Avis', 'Windhoek', 1.5), ('Hochland Park', 'Windhoek', 1.0),
+    ('Academia', 'Windhoek', 0.9), ('Khomasdal', 'Windhoek', 0.6), ('Katutura', 'Windhoek', 0.4),
+    ('Rocky Crest', 'Windhoek', 0.7), ('Dorado Park', 'Windhoek', 0.6), ('Brakwater', 'Windhoek', 0.8),
+    ('Elisenheim', 'Windhoek', 1.0), ('Finkenstein', 'Windhoek', 1.8), ('Windhoek CBD', 'Windhoek', 1.1),
+    ('Vogelstrand', 'Swakopmund', 1.9), ('Kramersdorf', 'Swakopmund', 1.2), ('Mile 4', 'Swakopmund', 0.9),
+    ('Ocean View', 'Swakopmund', 1.5), ('Meersig', 'Walvis Bay', 1.0), ('Langstrand', 'Walvis Bay', 1.6),
+    ('Kuisebmond', 'Walvis Bay', 0.4), ('Otjiwarongo Central', 'Otjiwarongo', 0.5),
+    ('Ongwediva', 'Ongwediva', 0.5), ('Oshakati East', 'Oshakati', 0.4), ('Rundu Central', 'Rundu', 0.35),
+    ('Keetmanshoop Central', 'Keetmanshoop', 0.35),
+]
+
+# property type -> (weight, median price N$, bedroom range)
+PROPERTY_TYPES = {
+    'house': (45, 2_400_000, (2, 6)),
+    'apartment': (20, 1_300_000, (1, 3)),
+    'townhouse': (20, 1_600_000, (2, 4)),
+    'plot': (8, 900_000, (0, 0)),
+    'commercial': (5, 5_500_000, (0, 0)),
+    'farm': (2, 7_000_000, (3, 8)),
+}
+
+FEATURES = [
+    'Pool', 'Garden', 'Solar Panels', 'Borehole', 'Double Garage', 'Smart Home', 'Braai Area',
+    'Flatlet', 'Electric Fence', 'Alarm System', 'Mountain View', 'Sea View', 'Secure Complex',
+    'Staff Quarters', 'Study', 'Walk-in Closet', 'Backup Generator', 'Water Tank', 'Fibre Internet',
+    'Pet Friendly', 'Built-in Braai', 'Air Conditioning', 'Fireplace', 'Jacuzzi'
+]
+
+ADJECTIVES = ['Spacious', 'Modern', 'Charming', 'Luxury', 'Secure', 'Renovated', 'Family',
+              'Elegant', 'Cosy', 'Stylish', 'Affordable', 'Exclusive']
+
+DESCRIPTIONS = [
+    'Close to schools and shopping centres.', 'Quiet cul-de-sac with friendly neighbours.',
+    'Walking distance to the Grove Mall.', 'Open-plan kitchen and living area.',
+    'Low-maintenance garden with indigenous plants.', 'Views over the Auas Mountains.',
+    'Ideal first home or investment.', 'Secure estate with 24-hour guarding.',
+    'Recently renovated bathrooms and kitchen.', 'Large erf with room to extend.',
+    'Minutes from Hosea Kutako road.', 'Prepaid electricity and municipal water.'
+]
+
+AGENT_IDS = ['NE001', 'NE002', 'NE003', 'NE005']
+
+SCALES = {'1k': 1_000, '10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+
+def generate_listings(count, seed=2024):
+    """Yield ``count`` listing tuples in the column order used by ``build_database``"""
+    rng = random.Random(seed)
+    type_names = list(PROPERTY_TYPES)
+    type_weights = [PROPERTY_TYPES[t][0] for t in type_names]
+    start = datetime(2023, 1, 1)
+
+    for i in range(count):
+        suburb, town, multiplier = rng.choice(SUBURBS)
+        property_type = rng.choices(type_names, type_weights)[0]
+        _, median, (min_beds, max_beds) = PROPERTY_TYPES[property_type]
+
+        # Log-normal prices around the type median, shifted by suburb
+        price = round(median * multiplier * math.exp(rng.gauss(0, 0.35)), -3)
+        bedrooms = rng.randint(min_beds, max_beds)
+        bathrooms = max(1, bedrooms - rng.randint(0, 2)) if bedrooms else rng.randint(0, 2)
+        size = int((bedrooms or 3) * rng.randint(350, 700) * (1 + 0.3 * (multiplier > 1.3)))
+        features = rng.sample(FEATURES, rng.randint(1, 6))
+        adjective = rng.choice(ADJECTIVES)
+        label = f"{bedrooms}-Bedroom {property_type}" if bedrooms else property_type.title()
+        title = f"{adjective} {label} in {suburb}"
+        description = " ".join(rng.sample(DESCRIPTIONS, 3))
+        status = 'available' if rng.random() < 0.9 else rng.choice(['sold', 'archived', 'deleted'])
+        created_at = (start + timedelta(minutes=i * 7 + rng.randint(0, 6))).strftime('%Y-%m-%d %H:%M:%S')
+
+        yield (
+            f"SYN-{i:07d}", title, description, price, property_type, bedrooms, bathrooms, size,
+            f"{suburb}, {town}", town, json.dumps(features), status, rng.choice(AGENT_IDS), created_at
+        )
+
+
+def build_database(db_path, count, seed=2024, batch_size=10_000):
+    """Create (or reuse) a database holding exactly ``count`` synthetic listings"""
+    if os.path.exists(db_path):
+        conn = sqlite3.connect(db_path)
+        try:
+            existing = conn.execute('SELECT COUNT(*) FROM properties').fetchone()[0]
+        except sqlite3.Error:
+            existing = -1
+        finally:
+            conn.close()
+        if existing == count:
+            return db_path
+        os.remove(db_path)
+
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+    PropertyDatabase(db_path, 'Benchmark Properties')  # schema + sample agents
+
+    conn = sqlite3.connect(db_path)
+    rows = generate_listings(count, seed)
+    while True:
+        batch = [row for _, row in zip(range(batch_size), rows)]
+        if not batch:
+            break
+        conn.executemany('''
+            INSERT INTO properties
+            (id, title, description, price, property_type, bedrooms, bathrooms, size_sqft,
+             location, city, features, status, agent_id, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', batch)
+        conn.commit()
+    conn.close()
+    print(f"✅ Generated {count:,} synthetic listings in {db_path}")
+    return db_path
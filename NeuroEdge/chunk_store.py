@@ -0,0 +1,240 @@
+# chunk_store.py - overlapping chunks of uploaded agent documents, searchable with BM25
+import os
+import re
+import sqlite3
+import threading
+
+from context_packer import compact_text, rank_snippets
+from text_extraction import ExtractionPending
+
+BOUNDARY = re.compile(r"\n\s*\n|(?<=[.!?])\s+|\n")
+
+
+def chunk_text(text, size=800, overlap=200):
+    """Split text into ~size-character windows overlapping by ~overlap characters.
+
+    Window ends are pulled back to the nearest paragraph/sentence boundary
+    when one is close, so chunks rarely cut a sentence in half. Returns
+    (start, end, chunk) tuples with offsets into ``text``.
+    """
+    chunks, start, length = [], 0, len(text)
+    while start < length:
+        end = min(start + size, length)
+        if end < length:
+            breaks = [m.end() for m in BOUNDARY.finditer(text, start + size // 2, end)]
+            if breaks:
+                end = breaks[-1]
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append((start, end, chunk))
+        if end >= length:
+            break
+        next_start = max(end - overlap, start + 1)
+        # Begin the next window on a word boundary
+        space = text.find(" ", next_start, end)
+        start = space + 1 if space != -1 else next_start
+    return chunks
+
+
+def fts_query(text):
+    """Quote each term so user punctuation can never break the FTS5 syntax"""
+    terms = {t for t in re.findall(r"\w+", text.lower()) if len(t) > 1}
+    return " OR ".join(f'"{t}"' for t in sorted(terms))
+
+
+class ChunkStore:
+    """SQLite store of document chunks per agent, ranked with FTS5 bm25().
+
+    A ``documents`` table remembers each file's stat stamp (inode, mtime,
+    size), so ``sync`` only re-chunks files that changed on disk. A file that
+    could not be read is recorded too, with its error, and is only retried
+    once its stamp changes. If the SQLite build lacks
+    FTS5, chunks go in a plain table and are ranked in Python instead.
+    """
+
+    def __init__(self, db_path, chunk_chars=800, overlap=200):
+        self.db_path = db_path
+        self.chunk_chars = chunk_chars
+        self.overlap = overlap
+        self._lock = threading.Lock()
+        self.fts = True
+        self.init_tables()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def init_tables(self):
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS documents (
+                agent_id TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                stamp TEXT,
+                chunks INTEGER DEFAULT 0,
+                ingested_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (agent_id, filename)
+            )
+        ''')
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(documents)')]
+        if 'stamp' not in columns:
+            conn.execute('ALTER TABLE documents ADD COLUMN stamp TEXT')
+        if 'error' not in columns:
+            conn.execute('ALTER TABLE documents ADD COLUMN error TEXT')
+        try:
+            conn.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5(
+                    text, agent_id UNINDEXED, filename UNINDEXED,
+                    position UNINDEXED, start UNINDEXED, end UNINDEXED,
+                    tokenize = 'porter unicode61'
+                )
+            ''')
+        except sqlite3.OperationalError:
+            print("⚠️ SQLite has no FTS5; document chunks will be ranked in Python")
+            self.fts = False
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS chunks_plain (
+                    text TEXT, agent_id TEXT, filename TEXT,
+                    position INTEGER, start INTEGER, end INTEGER
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_chunks_plain_agent ON chunks_plain(agent_id)')
+        conn.commit()
+        conn.close()
+
+    @property
+    def table(self):
+        return 'chunks' if self.fts else 'chunks_plain'
+
+    def ingest(self, agent_id, filename, text, stamp=None):
+        """(Re)chunk one document; returns the number of chunks stored"""
+        chunks = chunk_text(compact_text(text), self.chunk_chars, self.overlap)
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute(f'DELETE FROM {self.table} WHERE agent_id = ? AND filename = ?', (agent_id, filename))
+                conn.executemany(
+                    f'INSERT INTO {self.table} (text, agent_id, filename, position, start, end) VALUES (?, ?, ?, ?, ?, ?)',
+                    [(chunk, agent_id, filename, i, start, end) for i, (start, end, chunk) in enumerate(chunks)]
+                )
+                conn.execute('''
+                    INSERT OR REPLACE INTO documents (agent_id, filename, stamp, chunks)
+                    VALUES (?, ?, ?, ?)
+                ''', (agent_id, filename, str(stamp) if stamp else None, len(chunks)))
+                conn.commit()
+            finally:
+                conn.close()
+        return len(chunks)
+
+    def mark_failed(self, agent_id, filename, stamp, error):
+        """Record that this version of a document yielded no text, dropping any old chunks"""
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute(f'DELETE FROM {self.table} WHERE agent_id = ? AND filename = ?', (agent_id, filename))
+                conn.execute('''
+                    INSERT OR REPLACE INTO documents (agent_id, filename, stamp, chunks, error)
+                    VALUES (?, ?, ?, 0, ?)
+                ''', (agent_id, filename, str(stamp) if stamp else None, str(error) or 'unreadable'))
+                conn.commit()
+            finally:
+                conn.close()
+
+    def remove(self, agent_id, filename):
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute(f'DELETE FROM {self.table} WHERE agent_id = ? AND filename = ?', (agent_id, filename))
+                conn.execute('DELETE FROM documents WHERE agent_id = ? AND filename = ?', (agent_id, filename))
+                conn.commit()
+            finally:
+                conn.close()
+
+    def sync(self, files, read_text, stamp_of, agent_id=None):
+        """Bring the store in line with ``files`` ((agent_id, filename, path) tuples).
+
+        ``stamp_of(path)`` identifies a file version (None if gone);
+        ``read_text(path)`` is only called for new or modified files; a
+        version it fails on is recorded and not read again.
+        Documents no longer listed are dropped - only those of ``agent_id``
+        when the sync is limited to one agent. Returns the number of
+        (re)ingested documents.
+        """
+        conn = self._connect()
+        try:
+            if agent_id:
+                rows = conn.execute('SELECT agent_id, filename, stamp FROM documents WHERE agent_id = ?', (agent_id,))
+            else:
+                rows = conn.execute('SELECT agent_id, filename, stamp FROM documents')
+            known = {(r['agent_id'], r['filename']): r['stamp'] for r in rows}
+        finally:
+            conn.close()
+
+        ingested, seen = 0, set()
+        for file_agent, filename, path in files:
+            seen.add((file_agent, filename))
+            stamp = stamp_of(path)
+            if stamp is None or known.get((file_agent, filename)) == str(stamp):
+                continue
+            try:
+                text = read_text(path)
+            except ExtractionPending:
+                continue  # still being extracted; ingested once it is ready
+            except (UnicodeDecodeError, OSError) as e:
+                print(f"Skipping {file_agent}/{filename} for chunking: {e}")
+                self.mark_failed(file_agent, filename, stamp, e)
+                continue
+            if text is not None:
+                self.ingest(file_agent, filename, text, stamp)
+                ingested += 1
+        for gone_agent, filename in set(known) - seen:
+            self.remove(gone_agent, filename)
+        return ingested
+
+    def search(self, agent_id, query, k=6):
+        """Top-k chunks of one agent's documents for the query, best first"""
+        if not self.fts:
+            return self._search_plain(agent_id, query, k)
+        match = fts_query(query)
+        if not match:
+            return []
+        conn = self._connect()
+        try:
+            rows = conn.execute('''
+                SELECT text, filename, position, start, end, bm25(chunks) AS rank
+                FROM chunks
+                WHERE chunks MATCH ? AND agent_id = ?
+                ORDER BY rank
+                LIMIT ?
+            ''', (match, agent_id, 2 * k)).fetchall()
+        finally:
+            conn.close()
+        # The same file uploaded twice yields identical chunks; keep the first
+        results, seen = [], set()
+        for r in rows:
+            if r['text'] in seen:
+                continue
+            seen.add(r['text'])
+            results.append({'text': r['text'], 'filename': r['filename'], 'position': r['position'],
+                            'start': r['start'], 'end': r['end'], 'score': -r['rank']})
+        return results[:k]
+
+    def _search_plain(self, agent_id, query, k):
+        conn = self._connect()
+        try:
+            rows = [dict(r) for r in conn.execute(
+                'SELECT text, filename, position, start, end FROM chunks_plain WHERE agent_id = ?', (agent_id,))]
+        finally:
+            conn.close()
+        return [{**r, 'score': 0.0} for r in rank_snippets(query, rows)[:k]]
+
+    def stats(self):
+        conn = self._connect()
+        try:
+            docs, chunks, failed = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(chunks), 0), COUNT(error) FROM documents').fetchone()
+        finally:
+            conn.close()
+        return {'documents': docs, 'chunks': chunks, 'failed': failed, 'fts5': self.fts}
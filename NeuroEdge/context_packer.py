@@ -0,0 +1,115 @@
+# context_packer.py - rank and pack listings / document snippets into a token budget
+import re
+import json
+import math
+from collections import Counter
+
+from semantic_index import tokenize
+
+SEPARATOR_LINE = re.compile(r"^[\s\-=_*~─━•·#]{3,}$")
+
+
+def estimate_tokens(text):
+    """Local token estimate (no tokenizer download): the larger of chars/4 and words*4/3"""
+    if not text:
+        return 0
+    return max(math.ceil(len(text) / 4), math.ceil(len(text.split()) * 4 / 3))
+
+
+def compact_text(text):
+    """Strip separator rules, repeated blank lines and runs of spaces"""
+    lines = []
+    for line in text.splitlines():
+        line = " ".join(line.split())
+        if not line or SEPARATOR_LINE.match(line):
+            if lines and lines[-1] != "":
+                lines.append("")
+            continue
+        lines.append(line)
+    return "\n".join(lines).strip()
+
+
+def rank_snippets(query, snippets, k1=1.2, b=0.75):
+    """Order snippets by BM25 against the query, plus any precomputed 'boost'"""
+    query_terms = set(tokenize(query))
+    if not snippets:
+        return []
+    docs = [Counter(tokenize(s['text'])) for s in snippets]
+    avg_len = sum(sum(d.values()) for d in docs) / len(docs) or 1.0
+    df = Counter(term for d in docs for term in d if term in query_terms)
+
+    def score(i):
+        doc, length = docs[i], sum(docs[i].values())
+        total = snippets[i].get('boost', 0.0)
+        for term in query_terms:
+            tf = doc.get(term, 0)
+            if tf:
+                idf = math.log(1 + (len(docs) - df[term] + 0.5) / (df[term] + 0.5))
+                total += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_len))
+        return total
+
+    order = sorted(range(len(snippets)), key=lambda i: (-score(i), snippets[i].get('order', i)))
+    return [snippets[i] for i in order]
+
+
+def pack(snippets, budget_tokens):
+    """Greedily keep whole snippets, best first, until the budget is used up"""
+    packed, used = [], 0
+    for snippet in snippets:
+        cost = snippet.get('tokens') or estimate_tokens(snippet['text'])
+        if used + cost > budget_tokens:
+            continue
+        packed.append(snippet)
+        used += cost
+    return packed, used
+
+
+def build_document_context(query, snippets, budget_tokens=900):
+    """Most relevant document snippets for the query, packed into the budget.
+
+    ``snippets`` come from the chunk store and the semantic index, each with
+    its own ``boost``; repeated texts are kept once.
+    """
+    unique, seen = [], set()
+    for snippet in snippets:
+        if snippet['text'] not in seen:
+            unique.append(snippet)
+            seen.add(snippet['text'])
+    packed, used = pack(rank_snippets(query, unique), budget_tokens)
+    # Keep document order within the packed set so passages read naturally
+    packed.sort(key=lambda s: s.get('order', len(unique)))
+    return "\n\n".join(f"[{s.get('source', 'context')}]\n{s['text']}" for s in packed), used
+
+
+LISTING_COLUMNS = "id|title|price N$|bed|bath|sqft|type|location|features|agent|link"
+
+
+def listing_row(prop):
+    """One dense, pipe-separated row per listing"""
+    features = prop.get('features') or []
+    if isinstance(features, str):
+        try:
+            features = json.loads(features)
+        except ValueError:
+            features = [features]
+    cells = [
+        prop.get('id', ''), prop.get('title', ''), f"{prop.get('price') or 0:,.0f}",
+        prop.get('bedrooms', ''), prop.get('bathrooms', ''), prop.get('size_sqft', ''),
+        prop.get('property_type', ''), prop.get('location', ''), ", ".join(map(str, features[:5])),
+        prop.get('agent_name', ''), prop.get('listing_url') or ''
+    ]
+    return "|".join(str(c).replace("|", "/").replace("\n", " ") for c in cells)
+
+
+def format_listings_table(properties, query=None, budget_tokens=None):
+    """Listings as a header plus one row each, ranked by relevance when a budget applies"""
+    if not properties:
+        return "No matching listings."
+    rows = [{'text': listing_row(p), 'order': i} for i, p in enumerate(properties)]
+    if budget_tokens:
+        ranked = rank_snippets(query, rows) if query else rows
+        rows, _ = pack(ranked, budget_tokens - estimate_tokens(LISTING_COLUMNS))
+        rows.sort(key=lambda r: r['order'])
+    omitted = len(properties) - len(rows)
+    table = "\n".join([LISTING_COLUMNS] + [r['text'] for r in rows])
+    return table + (f"\n(+{omitted} more not shown)" if omitted else "")
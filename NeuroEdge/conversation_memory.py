@@ -0,0 +1,110 @@
+# conversation_memory.py - rolling summary of older chat turns plus a verbatim tail
+import re
+import html
+from collections import Counter
+
+from semantic_index import tokenize
+
+TAIL_MESSAGES = 6     # most recent messages always sent verbatim
+FOLD_AFTER = 12       # start summarising once the history holds this many messages
+HARD_LIMIT = 24       # never keep more than this, even if the summariser is slow
+SUMMARY_CHARS = 1200  # budget for the running summary
+
+TAG_RE = re.compile(r"<(script|style)\b.*?</\1>|<[^>]+>", re.S | re.I)
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+
+SUMMARY_INSTRUCTIONS = (
+    "Update the running summary of a conversation between a property client and a real estate "
+    "assistant. Keep facts the assistant will need later: the client's budget, preferred areas, "
+    "property types, timelines, contact details given, listings or documents discussed, and open "
+    "questions. Write plain prose, at most {words} words. Return only the summary."
+)
+
+
+def strip_html(text):
+    """Plain text of an HTML reply (Search-AI cards, contact-form links)"""
+    return " ".join(html.unescape(TAG_RE.sub(" ", str(text))).split())
+
+
+def transcript(turns):
+    return "\n".join(f"{m['role']}: {strip_html(m['content'])}" for m in turns)
+
+
+def extractive_summary(previous, turns, max_chars=SUMMARY_CHARS):
+    """Local fallback: keep the most informative sentences, client turns first.
+
+    Sentences are scored by the document frequency of their terms across the
+    folded turns (with numbers - prices, bedrooms - weighted up), then kept in
+    their original order until ``max_chars`` is used.
+    """
+    sentences, seen = [], set()
+    candidates = [('summary', s) for s in SENTENCE_RE.split(previous or '')]
+    for m in turns:
+        if str(m['content']).startswith('⚠️'):
+            continue  # API errors and other notices carry nothing worth keeping
+        candidates.extend((m['role'], s) for s in SENTENCE_RE.split(strip_html(m['content'])))
+    for role, sentence in candidates:
+        sentence = sentence.strip()
+        if len(sentence) > 12 and sentence.lower() not in seen:
+            seen.add(sentence.lower())
+            sentences.append((role, sentence))
+
+    df = Counter(term for _, s in sentences for term in set(tokenize(s)))
+
+    def score(item):
+        role, sentence = item
+        terms = set(tokenize(sentence))
+        if not terms:
+            return 0.0
+        weight = {'summary': 1.5, 'user': 1.3}.get(role, 1.0)
+        numbers = sum(1 for t in terms if t.isdigit())
+        return weight * (sum(df[t] for t in terms) / len(terms) + numbers)
+
+    ranked = sorted(range(len(sentences)), key=lambda i: -score(sentences[i]))
+    keep, used = set(), 0
+    for i in ranked:
+        cost = len(sentences[i][1]) + 1
+        if used + cost > max_chars:
+            continue
+        keep.add(i)
+        used += cost
+    return " ".join(sentences[i][1] for i in sorted(keep))
+
+
+def llm_summary(complete, previous, turns, max_chars=SUMMARY_CHARS):
+    """Ask the model to fold ``turns`` into the previous summary"""
+    messages = [
+        {'role': 'system', 'content': SUMMARY_INSTRUCTIONS.format(words=max_chars // 6)},
+        {'role': 'user', 'content': f"Current summary:\n{previous or '(none)'}\n\nNew turns:\n{transcript(turns)}"}
+    ]
+    summary = (complete(messages) or "").strip()
+    return summary[:max_chars * 2]
+
+
+def summarise(previous, turns, complete=None, max_chars=SUMMARY_CHARS):
+    """LLM summary when a completion function is given and works, extractive otherwise"""
+    if complete is not None:
+        try:
+            summary = llm_summary(complete, previous, turns, max_chars)
+            if summary:
+                return summary
+        except Exception as e:
+            print(f"⚠️ Summary model unavailable, using extractive summary: {e}")
+    return extractive_summary(previous, turns, max_chars)
+
+
+def fold(data, count, summary):
+    """Replace the oldest ``count`` messages with the new running summary"""
+    del data['history'][:count]
+    data['summary'] = summary
+
+
+def prompt_messages(data, tail=TAIL_MESSAGES):
+    """Running summary (if any) plus the verbatim tail, HTML stripped"""
+    messages = []
+    if data.get('summary'):
+        messages.append({'role': 'system', 'content': f"Summary of the earlier conversation:\n{data['summary']}"})
+    for m in data['history'][-tail:]:
+        content = strip_html(m['content']) if '<' in str(m['content']) else m['content']
+        messages.append({'role': m['role'], 'content': content})
+    return messages
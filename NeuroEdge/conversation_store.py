@@ -0,0 +1,283 @@
+# conversation_store.py - chat messages in SQLite instead of the session blob
+import os
+import json
+import uuid
+import sqlite3
+import threading
+from datetime import datetime
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+STATE_KEYS = ('summary', 'summary_job', 'pending_jobs', 'window_start')
+
+
+def format_timestamp(ts):
+    if ts is None:
+        return datetime.now().strftime(TIMESTAMP_FORMAT)
+    return ts if isinstance(ts, str) else ts.strftime(TIMESTAMP_FORMAT)
+
+
+def merge_state(base, ours, theirs):
+    """Apply our changes to ``base`` on top of a state another turn saved meanwhile.
+
+    Keys we did not touch keep their value; job lists keep the jobs either
+    side added and lose the ones either side removed; the window start only
+    moves forward.
+    """
+    merged = dict(theirs)
+    for key in set(base) | set(ours):
+        mine, old = ours.get(key), base.get(key)
+        if mine == old:
+            continue
+        if key == 'window_start':
+            merged[key] = max(mine or 0, theirs.get(key) or 0)
+        elif isinstance(mine, list) and isinstance(theirs.get(key), list):
+            kept = [x for x in theirs[key] if x in mine or x not in (old or [])]
+            merged[key] = kept + [x for x in mine if x not in kept and x not in (old or [])]
+        elif mine is None:
+            merged.pop(key, None)
+        else:
+            merged[key] = mine
+    return merged
+
+
+class MessageWindow(list):
+    """Messages of a conversation that are still in the prompt window.
+
+    ``append`` writes the message to the store first, so nothing is lost if
+    the request dies afterwards. Deleting a leading slice (folding old turns
+    into the summary) only moves the window start; stored messages are never
+    rewritten.
+    """
+
+    def __init__(self, conversation, messages):
+        super().__init__(messages)
+        self.conversation = conversation
+
+    def append(self, message):
+        message = dict(message, timestamp=format_timestamp(message.get('timestamp')))
+        message['id'] = self.conversation.store.append(
+            self.conversation.id, message['role'], message['content'], message['timestamp'],
+            agent_id=self.conversation.agent_id)
+        super().append(message)
+
+    def __delitem__(self, index):
+        if not isinstance(index, slice) or index.start is not None or index.step is not None:
+            raise TypeError("only a leading slice of the message window can be dropped")
+        count = len(range(*index.indices(len(self))))
+        if count == 0:
+            return
+        start = self[count]['id'] if count < len(self) else self[-1]['id'] + 1
+        super().__delitem__(slice(None, count))
+        self.conversation['window_start'] = start
+
+
+class Conversation(dict):
+    """One agent conversation, shaped like the session entry it replaces.
+
+    ``self['history']`` is the prompt window (a ``MessageWindow``); the keys
+    in STATE_KEYS are persisted by ``save()``. Anything else (e.g. document
+    names for the page) lives only for the current request. ``version`` is
+    the state row version this copy was loaded at (0: no row yet).
+    """
+
+    def __init__(self, store, conversation_id, agent_id, state, messages, version=0):
+        super().__init__(state)
+        self.store = store
+        self.id = conversation_id
+        self.agent_id = agent_id
+        self.version = version
+        self['history'] = MessageWindow(self, messages)
+        self._saved = self.state()
+
+    def state(self):
+        return {key: self[key] for key in STATE_KEYS if self.get(key) is not None}
+
+    def save(self, attempts=5):
+        """Write the state row if anything in it changed.
+
+        If another turn saved since this copy was loaded, our changes are
+        merged into its state (``merge_state``) rather than overwriting it.
+        """
+        state = self.state()
+        for _ in range(attempts):
+            if state == self._saved:
+                return
+            version = self.store.save_state(self.id, state, self.version, self.agent_id)
+            if version is not None:
+                self.version, self._saved = version, state
+                return
+            theirs, self.version = self.store.load_state(self.id)
+            state = merge_state(self._saved, state, theirs)
+            self._saved = theirs
+            self.update(state)
+            for key in STATE_KEYS:
+                if key not in state:
+                    self.pop(key, None)
+        print(f"⚠️ Gave up saving conversation {self.id}: its state kept changing")
+
+
+class ConversationStore:
+    """Append-only message log per conversation, indexed for paged reads.
+
+    A ``conversations`` row holds the small per-conversation state (running
+    summary, pending job ids, start of the prompt window) and a version
+    bumped on every state save; ``messages`` rows are only ever inserted.
+    The row is written with the first message (or state change), so
+    visitors who only look at a page leave nothing behind. A session just
+    stores the conversation id of each agent it talked to, so its size no
+    longer grows with the chat.
+    """
+
+    def __init__(self, db_path, window_limit=50):
+        self.db_path = db_path
+        self.window_limit = window_limit
+        self._lock = threading.Lock()
+        self.init_tables()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def init_tables(self):
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS conversations (
+                id TEXT PRIMARY KEY,
+                agent_id TEXT NOT NULL,
+                state TEXT DEFAULT '{}',
+                version INTEGER DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(conversations)')]
+        if 'version' not in columns:
+            conn.execute('ALTER TABLE conversations ADD COLUMN version INTEGER DEFAULT 0')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS conversation_messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                conversation_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            )
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_conversation_messages
+            ON conversation_messages(conversation_id, id)
+        ''')
+        conn.commit()
+        conn.close()
+
+    def create(self, agent_id, conversation_id=None):
+        """A new, empty conversation; nothing is stored until its first message"""
+        return Conversation(self, conversation_id or uuid.uuid4().hex, agent_id, {}, [])
+
+    def exists(self, conversation_id):
+        conn = self._connect()
+        try:
+            return conn.execute('SELECT 1 FROM conversations WHERE id = ?', (conversation_id,)).fetchone() is not None
+        finally:
+            conn.close()
+
+    def load(self, conversation_id, agent_id=None):
+        """The conversation with its prompt window, or None if unknown"""
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT agent_id, state, version FROM conversations WHERE id = ?',
+                               (conversation_id,)).fetchone()
+            if row is None or (agent_id and row['agent_id'] != agent_id):
+                return None
+            state = json.loads(row['state'] or '{}')
+            rows = conn.execute('''
+                SELECT id, role, content, created_at FROM conversation_messages
+                WHERE conversation_id = ? AND id >= ?
+                ORDER BY id DESC LIMIT ?
+            ''', (conversation_id, state.get('window_start', 0), self.window_limit)).fetchall()
+        finally:
+            conn.close()
+        return Conversation(self, conversation_id, row['agent_id'], state,
+                            [self._message(r) for r in reversed(rows)], row['version'])
+
+    def _message(self, row):
+        return {'id': row['id'], 'role': row['role'], 'content': row['content'], 'timestamp': row['created_at']}
+
+    def append(self, conversation_id, role, content, created_at=None, agent_id=None):
+        """Add one message, creating the conversation row if needed (given ``agent_id``); returns its id"""
+        with self._lock:
+            conn = self._connect()
+            try:
+                cursor = conn.execute('''
+                    INSERT INTO conversation_messages (conversation_id, role, content, created_at)
+                    VALUES (?, ?, ?, ?)
+                ''', (conversation_id, role, content, format_timestamp(created_at)))
+                message_id = cursor.lastrowid
+                self._touch(conn, conversation_id, agent_id)
+                conn.commit()
+                return message_id
+            finally:
+                conn.close()
+
+    @staticmethod
+    def _touch(conn, conversation_id, agent_id):
+        if agent_id:
+            conn.execute('INSERT OR IGNORE INTO conversations (id, agent_id) VALUES (?, ?)', (conversation_id, agent_id))
+        conn.execute('UPDATE conversations SET updated_at = CURRENT_TIMESTAMP WHERE id = ?', (conversation_id,))
+
+    def load_state(self, conversation_id):
+        """(state dict, version) as stored; ({}, 0) if there is no row yet"""
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT state, version FROM conversations WHERE id = ?', (conversation_id,)).fetchone()
+        finally:
+            conn.close()
+        return (json.loads(row['state'] or '{}'), row['version']) if row else ({}, 0)
+
+    def save_state(self, conversation_id, state, version, agent_id=None):
+        """Replace the state row (a dict or its JSON) if it is still at ``version``.
+
+        Returns the new version, or None if another save got there first.
+        """
+        if not isinstance(state, str):
+            state = json.dumps(state, sort_keys=True)
+        with self._lock:
+            conn = self._connect()
+            try:
+                if agent_id and version == 0:
+                    conn.execute('INSERT OR IGNORE INTO conversations (id, agent_id) VALUES (?, ?)',
+                                 (conversation_id, agent_id))
+                updated = conn.execute('''
+                    UPDATE conversations SET state = ?, version = version + 1, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ? AND version = ?
+                ''', (state, conversation_id, version)).rowcount
+                conn.commit()
+            finally:
+                conn.close()
+        return version + 1 if updated else None
+
+    def page(self, conversation_id, before_id=None, limit=50):
+        """One page of messages, oldest first, ending just before ``before_id``.
+
+        Returns (messages, more) where ``more`` says whether older ones exist.
+        """
+        conn = self._connect()
+        try:
+            rows = conn.execute('''
+                SELECT id, role, content, created_at FROM conversation_messages
+                WHERE conversation_id = ? AND id < ?
+                ORDER BY id DESC LIMIT ?
+            ''', (conversation_id, before_id or 2 ** 63 - 1, limit + 1)).fetchall()
+        finally:
+            conn.close()
+        return [self._message(r) for r in reversed(rows[:limit])], len(rows) > limit
+
+    def stats(self):
+        conn = self._connect()
+        try:
+            conversations = conn.execute('SELECT COUNT(*) FROM conversations').fetchone()[0]
+            messages = conn.execute('SELECT COUNT(*) FROM conversation_messages').fetchone()[0]
+        finally:
+            conn.close()
+        return {'conversations': conversations, 'messages': messages}
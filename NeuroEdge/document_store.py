@@ -0,0 +1,162 @@
+# document_store.py - shared in-memory cache of uploaded document text
+import os
+import time
+import threading
+from collections import OrderedDict
+
+
+def file_stamp(st):
+    """Identity of a file's content as far as os.stat can tell"""
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def read_utf8(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+class DocumentStore:
+    """Decoded text of every agent's uploaded documents, LRU-bounded by size.
+
+    Entries are revalidated with ``os.stat`` (inode, mtime, size), at most once
+    per ``revalidate_after`` seconds, so a steady stream of chat turns costs no
+    file reads and few stats. A replaced or edited file is re-read on its next
+    use; a deleted one drops out. Directory listings are cached the same way,
+    keyed on the directory's mtime. ``reader(path)`` turns a file into text
+    (default: read it as UTF-8).
+    """
+
+    def __init__(self, base_dir, allowed=None, max_bytes=64 * 1024 * 1024, revalidate_after=2.0, reader=None):
+        self.base_dir = base_dir
+        self.allowed = allowed or (lambda filename: True)
+        self.reader = reader or read_utf8
+        self.max_bytes = max_bytes
+        self.revalidate_after = revalidate_after
+        self._texts = OrderedDict()   # path -> {'stamp', 'text', 'bytes', 'checked'}
+        self._listings = {}           # agent dir -> (dir mtime_ns, checked, [filenames])
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _stat(self, path):
+        try:
+            return os.stat(path)
+        except OSError:
+            return None
+
+    def stamp(self, path):
+        """Current (inode, mtime, size) of a file, or None if it is gone"""
+        with self._lock:
+            entry = self._texts.get(path)
+            if entry and time.monotonic() - entry['checked'] < self.revalidate_after:
+                return entry['stamp']
+        st = self._stat(path)
+        return file_stamp(st) if st else None
+
+    def read(self, path):
+        """Text of one document; raises OSError/UnicodeDecodeError like the reader does"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._texts.get(path)
+            if entry and now - entry['checked'] < self.revalidate_after:
+                self._texts.move_to_end(path)
+                self.hits += 1
+                return entry['text']
+
+        st = os.stat(path)
+        stamp = file_stamp(st)
+        with self._lock:
+            entry = self._texts.get(path)
+            if entry and entry['stamp'] == stamp:
+                entry['checked'] = now
+                self._texts.move_to_end(path)
+                self.hits += 1
+                return entry['text']
+            self.misses += 1
+
+        text = self.reader(path)
+        self._store(path, stamp, text, now)
+        return text
+
+    def _store(self, path, stamp, text, now):
+        size = len(text.encode('utf-8'))
+        with self._lock:
+            old = self._texts.pop(path, None)
+            if old:
+                self._bytes -= old['bytes']
+            if size > self.max_bytes:
+                return  # too large to keep; served straight from disk
+            self._texts[path] = {'stamp': stamp, 'text': text, 'bytes': size, 'checked': now}
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._texts:
+                _, evicted = self._texts.popitem(last=False)
+                self._bytes -= evicted['bytes']
+                self.evictions += 1
+
+    def agent_files(self, agent_id):
+        """Filenames of an agent's uploaded documents (cached directory listing)"""
+        agent_dir = os.path.join(self.base_dir, agent_id)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._listings.get(agent_dir)
+            if cached and now - cached[1] < self.revalidate_after:
+                return list(cached[2])
+        st = self._stat(agent_dir)
+        if st is None or not os.path.isdir(agent_dir):
+            return []
+        with self._lock:
+            cached = self._listings.get(agent_dir)
+            if cached and cached[0] == st.st_mtime_ns:
+                self._listings[agent_dir] = (cached[0], now, cached[2])
+                return list(cached[2])
+        filenames = sorted(f for f in os.listdir(agent_dir) if self.allowed(f))
+        with self._lock:
+            self._listings[agent_dir] = (st.st_mtime_ns, now, filenames)
+        return list(filenames)
+
+    def agent_ids(self):
+        if not os.path.isdir(self.base_dir):
+            return []
+        return [a for a in os.listdir(self.base_dir) if os.path.isdir(os.path.join(self.base_dir, a))]
+
+    def iter_files(self, agent_id=None):
+        """Yield (agent_id, filename, path) for one agent's documents, or everyone's"""
+        for agent in ([agent_id] if agent_id else self.agent_ids()):
+            for filename in self.agent_files(agent):
+                yield agent, filename, os.path.join(self.base_dir, agent, filename)
+
+    def documents(self, agent_id):
+        """[(filename, text)] for every readable document of an agent"""
+        docs = []
+        for _, filename, path in self.iter_files(agent_id):
+            try:
+                docs.append((filename, self.read(path)))
+            except (UnicodeDecodeError, OSError) as e:
+                print(f"Skipping {agent_id}/{filename}: {e}")
+        return docs
+
+    def invalidate(self, path=None):
+        """Forget one file (and its directory listing), or everything"""
+        with self._lock:
+            if path is None:
+                self._texts.clear()
+                self._listings.clear()
+                self._bytes = 0
+                return
+            entry = self._texts.pop(path, None)
+            if entry:
+                self._bytes -= entry['bytes']
+            self._listings.pop(os.path.dirname(path), None)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'documents': len(self._texts),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions,
+                'hit_rate': round(100.0 * self.hits / total, 1) if total else 0.0
+            }
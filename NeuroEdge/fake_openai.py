@@ -0,0 +1,237 @@
+# fake_openai.py - local stand-in for the OpenAI chat completions API
+"""
+Serves POST /v1/chat/completions (streaming and non-streaming) with a canned
+or echoed reply, so chat streaming can be exercised without an API key:
+
+    python fake_openai.py --port 8765 --first-token-delay 0.8 --chunk-delay 0.05
+    python fake_openai.py --error-rate 0.2 --slow-rate 0.1 --slow-delay 5   # flaky upstream
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=test python WPB.py
+
+or in-process:
+
+    server = FakeOpenAIServer(reply="Hello there").start()
+    os.environ['OPENAI_BASE_URL'] = server.base_url
+    ...
+    server.stop()
+"""
+import re
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def split_tokens(text):
+    """Roughly token-sized pieces (words with their leading whitespace)"""
+    return re.findall(r"\s*\S+", text) or [text]
+
+
+def usage(messages, text, tool_calls=None):
+    """Token counts in the shape of the API's ``usage`` (word pieces stand in for tokens)"""
+    prompt = sum(len(split_tokens(m.get('content') or '')) for m in messages)
+    completion = len(split_tokens(text)) if text else sum(
+        len(split_tokens(c['function']['arguments'])) for c in tool_calls or [])
+    return {'prompt_tokens': prompt, 'completion_tokens': completion, 'total_tokens': prompt + completion}
+
+
+class FakeOpenAIServer:
+    """Threaded HTTP server answering chat completions from ``reply``.
+
+    ``reply`` may be a string or a callable taking the request's messages;
+    by default the last user message is echoed back. A callable may also
+    return ``{'tool_calls': [{'name': ..., 'arguments': {...}}]}`` to have
+    the model call tools instead of answering.
+
+    Faults can be injected to exercise retries and hedging: ``error_rate``
+    of requests fail with ``error_status``, ``slow_rate`` of them take an
+    extra ``slow_delay`` seconds; with ``retry_after`` set, injected errors
+    carry that Retry-After header. ``faults`` is a script consumed one entry
+    per request before the random rates apply - an int is an HTTP error
+    status, a float extra latency in seconds, ``'midstream'`` a streamed
+    reply that breaks off with an error event halfway through, None a
+    normal reply.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, reply=None, first_token_delay=0.0, chunk_delay=0.0,
+                 error_rate=0.0, error_status=500, slow_rate=0.0, slow_delay=0.0, faults=None, retry_after=None):
+        self.reply = reply
+        self.first_token_delay = first_token_delay
+        self.chunk_delay = chunk_delay
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.slow_rate = slow_rate
+        self.slow_delay = slow_delay
+        self.faults = list(faults or [])
+        self.retry_after = retry_after
+        self.requests = []  # request bodies, newest last
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def reply_for(self, messages):
+        if callable(self.reply):
+            return self.reply(messages)
+        if self.reply is not None:
+            return self.reply
+        last_user = next((m.get('content', '') for m in reversed(messages) if m.get('role') == 'user'), '')
+        return f"You said: {last_user}"
+
+    def next_fault(self):
+        """(error status, 'midstream' or None; extra delay) for the next request"""
+        with self._lock:
+            if self.faults:
+                fault = self.faults.pop(0)
+                if isinstance(fault, bool) or fault is None:
+                    return None, 0.0
+                if isinstance(fault, (int, str)):
+                    return fault, 0.0
+                return None, float(fault)
+        if random.random() < self.error_rate:
+            return self.error_status, 0.0
+        return None, self.slow_delay if random.random() < self.slow_rate else 0.0
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _json(self, status, payload, headers=None):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                if not self.path.rstrip('/').endswith('/chat/completions'):
+                    return self._json(404, {'error': {'message': f'Unknown path {self.path}'}})
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length) or b'{}')
+                server.requests.append(body)
+
+                status, delay = server.next_fault()
+                if delay:
+                    time.sleep(delay)
+                midstream = status == 'midstream'
+                if status and not midstream:
+                    kind = 'rate_limit_exceeded' if status == 429 else 'server_error'
+                    headers = {'Retry-After': str(server.retry_after)} if server.retry_after is not None else None
+                    return self._json(status, {'error': {'message': f'Injected {status}', 'type': kind}}, headers)
+
+                text = server.reply_for(body.get('messages', []))
+                tool_calls = None
+                if isinstance(text, dict):
+                    tool_calls = [
+                        {'id': f"call_{uuid.uuid4().hex[:8]}", 'type': 'function',
+                         'function': {'name': call['name'], 'arguments': json.dumps(call.get('arguments', {}))}}
+                        for call in text.get('tool_calls', [])
+                    ]
+                    text = None
+                model = body.get('model', 'fake-model')
+                completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+                created = int(time.time())
+                if not body.get('stream'):
+                    time.sleep(server.first_token_delay)
+                    message = {'role': 'assistant', 'content': text}
+                    if tool_calls:
+                        message['tool_calls'] = tool_calls
+                    return self._json(200, {
+                        'id': completion_id, 'object': 'chat.completion', 'created': created, 'model': model,
+                        'choices': [{'index': 0, 'message': message,
+                                     'finish_reason': 'tool_calls' if tool_calls else 'stop'}],
+                        'usage': usage(body.get('messages', []), text, tool_calls)
+                    })
+
+                # Streamed: one SSE chunk per token, connection closed at the end (HTTP/1.0)
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+
+                def send(delta, finish_reason=None):
+                    chunk = {
+                        'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                        'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                    self.wfile.flush()
+
+                def finish(finish_reason):
+                    send({}, finish_reason)
+                    if (body.get('stream_options') or {}).get('include_usage'):
+                        chunk = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created,
+                                 'model': model, 'choices': [],
+                                 'usage': usage(body.get('messages', []), text, tool_calls)}
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.wfile.flush()
+
+                time.sleep(server.first_token_delay)
+                send({'role': 'assistant', 'content': ''})
+                if tool_calls:
+                    for index, call in enumerate(tool_calls):
+                        send({'tool_calls': [{'index': index, **call}]})
+                    return finish('tool_calls')
+                tokens = split_tokens(text)
+                for i, token in enumerate(tokens):
+                    if midstream and i == len(tokens) // 2:
+                        # What the API sends when a generation fails after it started
+                        error = {'error': {'message': 'Injected mid-stream error', 'type': 'server_error'}}
+                        self.wfile.write(f"data: {json.dumps(error)}\n\n".encode('utf-8'))
+                        self.wfile.flush()
+                        return
+                    if i and server.chunk_delay:
+                        time.sleep(server.chunk_delay)
+                    send({'content': token})
+                finish('stop')
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local fake OpenAI chat completions server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--reply', help='fixed reply text (default: echo the last user message)')
+    parser.add_argument('--first-token-delay', type=float, default=0.0, help='seconds before the first token')
+    parser.add_argument('--chunk-delay', type=float, default=0.0, help='seconds between tokens')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests that fail')
+    parser.add_argument('--error-status', type=int, default=500, help='HTTP status of injected failures')
+    parser.add_argument('--slow-rate', type=float, default=0.0, help='fraction of requests that are slow')
+    parser.add_argument('--slow-delay', type=float, default=0.0, help='extra seconds for slow requests')
+    args = parser.parse_args(argv)
+
+    server = FakeOpenAIServer(args.host, args.port, args.reply, args.first_token_delay, args.chunk_delay,
+                              args.error_rate, args.error_status, args.slow_rate, args.slow_delay)
+    print(f"✅ Fake OpenAI server on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
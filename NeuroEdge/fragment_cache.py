@@ -0,0 +1,95 @@
+# fragment_cache.py - rendered property fragments keyed by (kind, property id, row version)
+import threading
+from collections import OrderedDict
+
+
+class FragmentCache:
+    """LRU cache of rendered per-property fragments (card HTML, API JSON).
+
+    Keys include the row ``version`` column, so an edited property simply
+    misses and re-renders; explicit invalidation only frees the stale entries.
+    """
+
+    def __init__(self, max_entries=5000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # (kind, property_id, version) -> fragment
+        self._by_property = {}          # property_id -> set of keys
+        self._by_agent = {}             # agent_id -> set of property_ids
+        self._lock = threading.Lock()
+        self._stats = {}                # kind -> {'hits': n, 'misses': n}
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _count(self, kind, field):
+        self._stats.setdefault(kind, {'hits': 0, 'misses': 0})[field] += 1
+
+    def get_or_render(self, kind, prop, render):
+        """Return the cached fragment for ``prop`` or render and store it."""
+        key = (kind, prop['id'], prop.get('version') or 1)
+        with self._lock:
+            fragment = self._entries.get(key)
+            if fragment is not None:
+                self._entries.move_to_end(key)
+                self._count(kind, 'hits')
+                return fragment
+            self._count(kind, 'misses')
+
+        fragment = render(prop)
+
+        with self._lock:
+            self._entries[key] = fragment
+            self._entries.move_to_end(key)
+            self._by_property.setdefault(prop['id'], set()).add(key)
+            if prop.get('agent_id'):
+                self._by_agent.setdefault(prop['agent_id'], set()).add(prop['id'])
+            while len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                keys = self._by_property.get(old_key[1])
+                if keys:
+                    keys.discard(old_key)
+                    if not keys:
+                        self._by_property.pop(old_key[1], None)
+                self.evictions += 1
+        return fragment
+
+    def invalidate(self, property_id):
+        """Drop every fragment rendered for one property."""
+        with self._lock:
+            for key in self._by_property.pop(property_id, set()):
+                if self._entries.pop(key, None) is not None:
+                    self.invalidations += 1
+
+    def invalidate_agent(self, agent_id):
+        """Drop fragments of all properties listed by an agent (name/phone shown on cards)."""
+        with self._lock:
+            property_ids = self._by_agent.pop(agent_id, set())
+        for property_id in property_ids:
+            self.invalidate(property_id)
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._by_property.clear()
+            self._by_agent.clear()
+
+    def stats(self):
+        """Hit/miss counters per fragment kind, for the admin dashboard."""
+        with self._lock:
+            kinds = {}
+            for kind, counts in self._stats.items():
+                total = counts['hits'] + counts['misses']
+                kinds[kind] = {
+                    **counts,
+                    'hit_rate': round(100.0 * counts['hits'] / total, 1) if total else 0.0
+                }
+            hits = sum(c['hits'] for c in self._stats.values())
+            total = hits + sum(c['misses'] for c in self._stats.values())
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_rate': round(100.0 * hits / total, 1) if total else 0.0,
+                'kinds': kinds
+            }
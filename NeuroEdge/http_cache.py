@@ -0,0 +1,95 @@
+# http_cache.py - ETag revalidation and response compression
+import gzip
+import hashlib
+
+from flask import request, current_app
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    'application/json', 'application/x-ndjson', 'text/html', 'text/plain',
+    'text/css', 'application/javascript', 'text/javascript'
+}
+ENCODING_SUFFIX = {'gzip': '-gzip', 'br': '-br'}
+
+
+def etag_for(*parts):
+    """Entity tag derived from the data version and request parameters"""
+    raw = "\x1f".join(str(p) for p in parts)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def held_etag(etag):
+    """The variant of this entity's tag (any encoding) in the client's If-None-Match, or None"""
+    if not request.if_none_match:
+        return None
+    for tag in (etag, *(etag + suffix for suffix in ENCODING_SUFFIX.values())):
+        if request.if_none_match.contains_weak(tag):  # If-None-Match compares weakly
+            return tag
+    return None
+
+
+def conditional(etag, build, cache_control='no-cache', weak=False):
+    """Answer 304 when the client's copy is current, otherwise build the response.
+
+    ``build`` is only called on a miss, so unchanged data costs neither the
+    query nor the serialisation. Only meaningful for GET/HEAD requests. Use
+    ``weak`` when the body varies without the data changing (e.g. a
+    timestamp): the tag then stands for every such body and every encoding.
+    A 304 carries the tag the client holds, including its encoding suffix.
+    """
+    held = held_etag(etag) if request.method in ('GET', 'HEAD') else None
+    if held:
+        response = current_app.response_class(status=304)
+        response.set_etag(held, weak=weak)
+    else:
+        response = current_app.make_response(build())
+        response.set_etag(etag, weak=weak)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def _negotiate_encoding():
+    accepted = request.accept_encodings
+    options = (['br'] if brotli is not None else []) + ['gzip']
+    best = max(options, key=lambda enc: (accepted[enc], -options.index(enc)))
+    return best if accepted[best] > 0 else None
+
+
+def init_compression(app, min_size=1024, level=6):
+    """Compress large JSON/HTML responses with brotli or gzip per Accept-Encoding"""
+
+    @app.after_request
+    def compress_response(response):
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_TYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        if response.content_length is not None and response.content_length < min_size:
+            return response
+        encoding = _negotiate_encoding()
+        if encoding is None:
+            return response
+
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        if encoding == 'br':
+            compressed = brotli.compress(data, quality=5)
+        else:
+            compressed = gzip.compress(data, compresslevel=level)
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        # Each encoding is a distinct representation, so it needs its own strong ETag
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag + ENCODING_SUFFIX[encoding])
+        return response
+
+    return compress_response
@@ -0,0 +1,232 @@
+# intent_router.py - local intent classification so simple chat turns skip the LLM
+import re
+import json
+import math
+import threading
+from collections import Counter
+
+from semantic_index import tokenize
+
+LISTING, FAQ, GREETING, CONTACT, OPEN = 'listing_search', 'faq', 'greeting', 'contact_form', 'open'
+
+CONTACT_PHRASES = ('leave my details', 'contact form', '📋', 'call me back', 'get in touch with me')
+GREETING_RE = re.compile(
+    r"^\s*(hi|hello|hey|hiya|howzit|good (morning|afternoon|evening)|greetings)"
+    r"( there| all)?[\s!.,👋🙂😊]*$", re.I)
+BEDROOMS_RE = re.compile(r"\b(\d+)\s*-?\s*(?:bed(?:room)?s?|br)\b", re.I)
+MAX_PRICE_RE = re.compile(
+    r"\b(?:under|below|less than|max(?:imum)?|up to|not more than)\s*(?:n\$|nad|r)?\s*"
+    r"(\d+(?:,\d{3})*(?:\.\d+)?)\s*(m|mil|million|k|thousand)?\b", re.I)
+PRICE_UNITS = {'m': 1_000_000, 'mil': 1_000_000, 'million': 1_000_000, 'k': 1_000, 'thousand': 1_000}
+
+# How a question is asked, not what it is about; ignored when matching FAQs
+QUESTION_TERMS = {
+    'what', 'how', 'who', 'where', 'when', 'which', 'do', 'does', 'did', 'could', 'would', 'should',
+    'please', 'tell', 'know', 'let'
+}
+
+# A listing search must name something we list; the model only decides among those turns
+PROPERTY_TERMS = {
+    'house', 'home', 'apartment', 'flat', 'townhouse', 'plot', 'erf', 'land', 'property', 'propertie',
+    'listing', 'bedroom', 'bed', 'duplex', 'villa', 'unit', 'office', 'warehouse', 'farm', 'rental',
+    'cottage', 'studio', 'penthouse', 'simplex', 'commercial', 'residential', 'br'
+}
+# Words that say how the client asked, not what they want; dropped from the search query
+FILLER_TERMS = {
+    'show', 'list', 'find', 'have', 'do', 'does', 'any', 'anything', 'some', 'please', 'looking',
+    'look', 'want', 'need', 'send', 'see', 'get', 'what', 'which', 'available', 'currently', 'got',
+    'there', 'like', 'would', 'interested', 'sale', 'buy', 'listing', 'propertie', 'property',
+    'something', 'bed', 'bedroom', 'br', 'im', 'us', 'them', 'one', 'few', 'new', 'latest', 'under',
+    'over', 'below', 'above', 'around', 'about', 'near', 'million', 'mil', 'thousand', 'nad', 'price',
+    'less', 'than', 'max', 'maximum', 'up'
+}
+
+LISTING_EXAMPLES = [
+    "show me your 3 bedroom houses", "do you have any apartments for sale", "list your properties in Klein Windhoek",
+    "any houses under 2 million", "what listings do you have", "I'm looking for a townhouse with a garden",
+    "find me a flat to rent in Eros", "show me plots in Brakwater", "which properties are available",
+    "houses with a pool", "2 bed apartment in the CBD", "do you have anything in Ludwigsdorf",
+    "what do you have for sale", "send me your listings", "commercial property for sale", "show me houses",
+    "any new listings", "looking for a family home with 4 bedrooms", "do you have office space to let",
+    "apartments in Olympia", "show me your cheapest homes", "I want a 3 bed house with a double garage",
+]
+OPEN_EXAMPLES = [
+    "should I buy or rent in Windhoek", "how does the transfer process work", "what are transfer costs in Namibia",
+    "can you explain bond repayments", "is now a good time to invest in property", "how do I qualify for a home loan",
+    "what should I look out for when viewing a house", "compare Eros and Olympia as neighbourhoods",
+    "what documents do I need to sell my house", "why are house prices so high", "help me plan my budget",
+    "what is the difference between sectional title and freehold", "how long does registration take",
+    "tell me about yourself", "what is your advice for first time buyers", "how much deposit do I need",
+    "can I negotiate the price of a house", "what happens if the bond is declined", "how do I value my home",
+    "explain the offer to purchase", "is it worth renovating before selling", "what fees does the seller pay",
+]
+
+
+class NaiveBayes:
+    """Multinomial naive Bayes over ``tokenize`` terms, with Laplace smoothing"""
+
+    def __init__(self, examples):
+        self.labels = sorted(examples)
+        self.priors, self.counts, self.totals = {}, {}, {}
+        vocabulary = set()
+        total_examples = sum(len(texts) for texts in examples.values())
+        for label, texts in examples.items():
+            counts = Counter(t for text in texts for t in tokenize(text))
+            self.counts[label] = counts
+            self.totals[label] = sum(counts.values())
+            self.priors[label] = math.log(len(texts) / total_examples)
+            vocabulary.update(counts)
+        self.vocabulary_size = len(vocabulary)
+
+    def probabilities(self, text):
+        terms = [t for t in tokenize(text) if any(t in c for c in self.counts.values())]
+        scores = {}
+        for label in self.labels:
+            denominator = self.totals[label] + self.vocabulary_size
+            scores[label] = self.priors[label] + sum(
+                math.log((self.counts[label][t] + 1) / denominator) for t in terms)
+        top = max(scores.values())
+        exp = {label: math.exp(score - top) for label, score in scores.items()}
+        norm = sum(exp.values())
+        return {label: value / norm for label, value in exp.items()}
+
+
+class IntentRouter:
+    """Decide whether a chat turn can be answered locally.
+
+    Rules catch contact-form requests and bare greetings; FAQs are matched
+    against a table of cached answers (global or per agent) when the
+    message contains every key term of an FAQ question and little else;
+    listing searches need a property term *and* a confident
+    naive-Bayes vote. Everything else is OPEN and goes to the LLM.
+    """
+
+    def __init__(self, listing_threshold=0.7, faq_threshold=0.6):
+        self.listing_threshold = listing_threshold
+        self.faq_threshold = faq_threshold
+        self.model = NaiveBayes({LISTING: LISTING_EXAMPLES, OPEN: OPEN_EXAMPLES})
+        self._faqs = []   # (agent_id or '*', question terms, answer)
+        self._lock = threading.Lock()
+        self.counts = Counter()
+
+    # ─── FAQ table ───────────────────────────────────────────────────────────
+    def add_faq(self, questions, answer, agent_id='*'):
+        if isinstance(questions, str):
+            questions = [questions]
+        with self._lock:
+            for question in questions:
+                terms = self.key_terms(question)
+                if terms:
+                    self._faqs.append((agent_id, terms, answer))
+
+    def load_faqs(self, path):
+        """Load ``[{"questions": [...], "answer": "...", "agent_id": "*"}]`` from JSON; returns the count"""
+        try:
+            with open(path, encoding='utf-8') as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not load FAQ answers from {path}: {e}")
+            return 0
+        for entry in entries:
+            self.add_faq(entry['questions'], entry['answer'], entry.get('agent_id', '*'))
+        return len(entries)
+
+    def clear_faqs(self, agent_id=None):
+        with self._lock:
+            self._faqs = [f for f in self._faqs if agent_id is not None and f[0] != agent_id]
+
+    @staticmethod
+    def key_terms(text):
+        terms = set(tokenize(text))
+        return terms - QUESTION_TERMS or terms
+
+    def match_faq(self, agent_id, text):
+        """(answer, score) of the closest FAQ, preferring the agent's own; (None, 0.0) if none is close.
+
+        An FAQ question only matches if the message has all of its key terms;
+        the score is the share of the message's key terms it accounts for, so
+        "how can I contact the seller directly" does not match "how can I
+        contact you" (1 of 3 terms).
+        """
+        terms = self.key_terms(text)
+        if not terms:
+            return None, 0.0
+        best, best_score = None, 0.0
+        with self._lock:
+            faqs = list(self._faqs)
+        for faq_agent, question, answer in faqs:
+            if faq_agent not in ('*', agent_id) or not question <= terms:
+                continue
+            # An agent-specific entry wins a tie with a global one
+            score = len(question) / len(terms)
+            if score > best_score or (score == best_score and faq_agent == agent_id):
+                best, best_score = answer, score
+        if best_score < self.faq_threshold:
+            return None, best_score
+        return best, best_score
+
+    # ─── Classification ──────────────────────────────────────────────────────
+    def classify(self, agent_id, text):
+        """(intent, confidence, FAQ answer or None) for one message"""
+        lowered = text.lower()
+        if any(phrase in lowered for phrase in CONTACT_PHRASES):
+            return CONTACT, 1.0, None
+        if GREETING_RE.match(text):
+            return GREETING, 1.0, None
+
+        answer, score = self.match_faq(agent_id, text)
+        if answer is not None:
+            return FAQ, score, answer
+
+        terms = set(tokenize(text))
+        if terms & PROPERTY_TERMS or BEDROOMS_RE.search(text):
+            probability = self.model.probabilities(text)[LISTING]
+            if probability >= self.listing_threshold:
+                return LISTING, probability, None
+            return OPEN, 1.0 - probability, None
+        return OPEN, 1.0, None
+
+    def route(self, agent_id, text):
+        intent, confidence, answer = self.classify(agent_id, text)
+        self.counts[intent] += 1
+        return intent, confidence, answer
+
+    def stats(self):
+        total = sum(self.counts.values())
+        return {
+            'routed': dict(self.counts),
+            'faqs': len(self._faqs),
+            'local_rate': round(100.0 * (total - self.counts[OPEN]) / total, 1) if total else 0.0
+        }
+
+
+def listing_query(text):
+    """Search terms plus bedroom/price filters from a listing request.
+
+    "show me your 3-bed houses in Eros under 2 million"
+    -> ("house eros", {'bedrooms': 3, 'max_price': 2000000.0})
+    """
+    filters = {}
+    bedrooms = BEDROOMS_RE.search(text)
+    if bedrooms:
+        filters['bedrooms'] = int(bedrooms.group(1))
+    price = MAX_PRICE_RE.search(text)
+    if price:
+        amount = float(price.group(1).replace(',', ''))
+        filters['max_price'] = amount * PRICE_UNITS.get((price.group(2) or '').lower(), 1)
+    rest = MAX_PRICE_RE.sub(" ", BEDROOMS_RE.sub(" ", text))
+    terms = [t for t in tokenize(rest) if t not in FILLER_TERMS and not t.isdigit()]
+    return " ".join(dict.fromkeys(terms)), filters
+
+
+def apply_listing_filters(properties, filters):
+    """Keep the listings that satisfy ``listing_query`` filters"""
+    def keep(prop):
+        if 'bedrooms' in filters and prop.get('bedrooms') != filters['bedrooms']:
+            return False
+        if 'max_price' in filters and (prop.get('price') or 0) > filters['max_price']:
+            return False
+        return True
+    return [prop for prop in properties if keep(prop)]
@@ -0,0 +1,176 @@
+# job_queue.py - background jobs for slow calls (LLM requests) with persisted state
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+
+class JobQueue:
+    """In-process thread pool whose job state lives in SQLite.
+
+    The web request only records the job and returns its id; a pool thread
+    does the slow call and stores the result. Because state is in the
+    database, a poll can be answered by any gunicorn worker. While a job is
+    queued or running here, a heartbeat thread refreshes its ``updated_at``
+    every ``stale_after / 3`` seconds, however long the call takes; a job
+    not refreshed for ``stale_after`` (its worker was restarted) is
+    reported as failed.
+    """
+
+    def __init__(self, db_path, max_workers=8, stale_after=300, retention=86400):
+        self.db_path = db_path
+        self.stale_after = stale_after
+        self.retention = retention
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._last_purge = 0.0
+        self._purge_lock = threading.Lock()
+        self._live = set()  # ids of jobs queued or running in this process
+        self._live_lock = threading.Lock()
+        self._heartbeat = None
+        self.init_tables()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def init_tables(self):
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                owner TEXT,
+                status TEXT NOT NULL DEFAULT 'queued',
+                result TEXT,
+                error TEXT,
+                delivered INTEGER DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs(created_at)')
+        conn.commit()
+        conn.close()
+
+    def _set(self, job_id, **fields):
+        fields['updated_at'] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        conn = self._connect()
+        try:
+            conn.execute(f'UPDATE jobs SET {assignments} WHERE id = ?', (*fields.values(), job_id))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def submit(self, kind, fn, *args, owner=None, **kwargs):
+        """Record a job and run ``fn(*args, **kwargs)`` on the pool; returns the job id"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                'INSERT INTO jobs (id, kind, owner, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (job_id, kind, owner, QUEUED, now, now)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        with self._live_lock:
+            self._live.add(job_id)
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._beat, name='job-heartbeat', daemon=True)
+                self._heartbeat.start()
+        self.pool.submit(self._run, job_id, fn, args, kwargs)
+        self._maybe_purge()
+        return job_id
+
+    def _run(self, job_id, fn, args, kwargs):
+        try:
+            self._set(job_id, status=RUNNING)
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                print(f"⚠️ Job {job_id} failed: {e}")
+                self._set(job_id, status=FAILED, error=str(e))
+            else:
+                self._set(job_id, status=DONE, result=json.dumps(result))
+        finally:
+            with self._live_lock:
+                self._live.discard(job_id)
+
+    def _beat(self):
+        """Keep this process's unfinished jobs from looking interrupted"""
+        while True:
+            time.sleep(self.stale_after / 3.0)
+            with self._live_lock:
+                live = list(self._live)
+            if not live:
+                continue
+            try:
+                conn = self._connect()
+                try:
+                    for start in range(0, len(live), 500):  # stay under SQLite's bound-parameter limit
+                        batch = live[start:start + 500]
+                        conn.execute(
+                            f'UPDATE jobs SET updated_at = ? WHERE status IN (?, ?) AND id IN ({", ".join("?" * len(batch))})',
+                            (time.time(), QUEUED, RUNNING, *batch)
+                        )
+                    conn.commit()
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                print(f"⚠️ Job heartbeat failed: {e}")
+
+    def get(self, job_id):
+        """Job state as a dict (result decoded), or None if unknown"""
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        if job['status'] in (QUEUED, RUNNING) and time.time() - job['updated_at'] > self.stale_after:
+            job['status'], job['error'] = FAILED, 'Job was interrupted'
+        return job
+
+    def claim(self, job_id):
+        """Mark a finished job delivered; True only for the first caller"""
+        conn = self._connect()
+        try:
+            cursor = conn.execute('UPDATE jobs SET delivered = 1 WHERE id = ? AND delivered = 0', (job_id,))
+            conn.commit()
+            return cursor.rowcount > 0
+        finally:
+            conn.close()
+
+    def _maybe_purge(self):
+        """Drop old jobs, at most once a minute"""
+        now = time.time()
+        if now - self._last_purge < 60 or not self._purge_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_purge = now
+            conn = self._connect()
+            try:
+                conn.execute('DELETE FROM jobs WHERE created_at < ?', (now - self.retention,))
+                conn.commit()
+            finally:
+                conn.close()
+        finally:
+            self._purge_lock.release()
+
+    def stats(self):
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        finally:
+            conn.close()
+        return {status: count for status, count in rows}
@@ -0,0 +1,127 @@
+# llm_cache.py - GPT reply cache keyed on a fingerprint of the prompt
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+WHITESPACE = re.compile(r"\s+")
+TRAILING_PUNCTUATION = re.compile(r"[\s?!.,;:]+$")
+
+
+def normalise_message(content):
+    """Case, whitespace and trailing punctuation do not change the question"""
+    return TRAILING_PUNCTUATION.sub("", WHITESPACE.sub(" ", str(content)).strip().lower())
+
+
+class ResponseCache:
+    """In-process LRU in front of an optional Redis tier, both with TTLs.
+
+    Keys hash the agent id, its per-agent generation and the exact request
+    messages (system prompt and RAG context verbatim, conversation turns
+    normalised), so a changed prompt or document simply misses.
+    ``invalidate_agent`` bumps the generation - in Redis too, so every
+    worker stops serving the old entries, which then expire on their TTL.
+    """
+
+    def __init__(self, redis_client=None, max_entries=1000, ttl=6 * 3600, namespace='llmcache'):
+        self.redis = redis_client
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.namespace = namespace
+        self._entries = OrderedDict()   # key -> (expires_at, reply)
+        self._generations = {}          # agent_id -> generation (local fallback)
+        self._lock = threading.Lock()
+        self.hits = {'memory': 0, 'redis': 0}
+        self.misses = 0
+        self.redis_errors = 0
+
+    def _redis_call(self, method, *args):
+        if self.redis is None:
+            return None
+        try:
+            return getattr(self.redis, method)(*args)
+        except Exception as e:
+            self.redis_errors += 1
+            print(f"⚠️ LLM cache Redis error ({method}): {e}")
+            return None
+
+    def generation(self, agent_id):
+        value = self._redis_call('get', f"{self.namespace}:gen:{agent_id}")
+        if value is not None:
+            return int(value)
+        return self._generations.get(agent_id, 0)
+
+    def key(self, agent_id, messages):
+        """Fingerprint of everything that shapes the reply"""
+        fingerprint = [agent_id, self.generation(agent_id)]
+        for m in messages:
+            content = m['content'] if m['role'] == 'system' else normalise_message(m['content'])
+            fingerprint.append((m['role'], content))
+        digest = hashlib.sha256(json.dumps(fingerprint, ensure_ascii=False).encode('utf-8')).hexdigest()
+        return f"{self.namespace}:{agent_id}:{digest}"
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits['memory'] += 1
+                    return entry[1]
+                del self._entries[key]
+
+        value = self._redis_call('get', key)
+        if value is not None:
+            reply = value.decode('utf-8') if isinstance(value, bytes) else value
+            ttl = self._redis_call('ttl', key)
+            self._remember(key, reply, ttl if ttl and ttl > 0 else self.ttl)
+            with self._lock:
+                self.hits['redis'] += 1
+            return reply
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _remember(self, key, reply, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, reply)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def set(self, key, reply, ttl=None):
+        ttl = ttl or self.ttl
+        self._remember(key, reply, ttl)
+        self._redis_call('setex', key, ttl, reply.encode('utf-8'))
+
+    def invalidate_agent(self, agent_id):
+        """Stop serving every cached reply of one agent (prompt or documents changed)"""
+        prefix = f"{self.namespace}:{agent_id}:"
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+            self._generations[agent_id] = self._generations.get(agent_id, 0) + 1
+        self._redis_call('incr', f"{self.namespace}:gen:{agent_id}")
+
+    def clear(self):
+        """Empty the in-process tier"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            hits = sum(self.hits.values())
+            total = hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': dict(self.hits),
+                'misses': self.misses,
+                'redis': self.redis is not None,
+                'redis_errors': self.redis_errors,
+                'hit_rate': round(100.0 * hits / total, 1) if total else 0.0
+            }
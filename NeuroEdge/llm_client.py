@@ -0,0 +1,272 @@
+# llm_client.py - retries, circuit breaker and hedged requests around chat completions
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import openai
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the API while the circuit breaker is open"""
+
+
+class DeadlineExceeded(TimeoutError):
+    """The call's overall deadline ran out (across retries and hedges)"""
+
+
+def is_retryable(error):
+    """Timeouts, dropped connections, 429s and 5xxs are worth another try"""
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    status = getattr(error, 'status_code', None)
+    return status == 429 or (status is not None and status >= 500)
+
+
+def retry_after(error, cap):
+    """Seconds the API asked us to wait (Retry-After header), if any"""
+    response = getattr(error, 'response', None)
+    try:
+        return min(float(response.headers.get('retry-after')), cap)
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """Stop calling an upstream that keeps failing.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls fail fast for ``reset_after`` seconds; then a single probe call is
+    let through (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold=5, reset_after=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.trips = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened_at is None:
+            return CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return HALF_OPEN
+        return OPEN
+
+    def allow(self):
+        with self._lock:
+            state = self._state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def retry_in(self):
+        """Seconds until the next probe is allowed"""
+        with self._lock:
+            if self.opened_at is None:
+                return 0.0
+            return max(0.0, self.reset_after - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self.probing:
+                    self.trips += 1
+                self.opened_at = time.monotonic()
+                self.probing = False
+
+
+class LatencyTracker:
+    """Recent successful call latencies, for percentile estimates"""
+
+    def __init__(self, window=200):
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, p):
+        with self._lock:
+            ordered = sorted(self.samples)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))]
+
+    def __len__(self):
+        return len(self.samples)
+
+
+class ResilientClient:
+    """Chat completions with jittered exponential retries, a circuit breaker
+    and optional hedging.
+
+    Retryable errors (see ``is_retryable``) are retried up to ``max_retries``
+    times, sleeping a random time up to ``base_delay * 2**attempt`` (capped
+    at ``max_delay``, or the server's Retry-After). Other errors - bad
+    requests, auth - are raised at once and do not count against the
+    breaker.
+
+    With ``hedge_percentile`` set (e.g. 95), a non-streaming call that has
+    not answered after that percentile of recent latencies gets a second,
+    identical request; whichever finishes first wins. Hedging waits for
+    ``hedge_min_samples`` latencies so the threshold means something.
+
+    ``deadline`` (seconds, per call) bounds the whole call: each attempt's
+    ``timeout`` is cut to the time left, a retry whose wait would not fit
+    is not made, and DeadlineExceeded is raised once the time is up.
+    """
+
+    def __init__(self, create=None, max_retries=2, base_delay=0.5, max_delay=8.0, breaker=None,
+                 hedge_percentile=None, hedge_min_samples=20, hedge_workers=8):
+        self.create = create or (lambda **kwargs: openai.chat.completions.create(**kwargs))
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.latency = LatencyTracker()
+        self._pool = ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix='llm-hedge') \
+            if hedge_percentile else None
+        self.counts = {'calls': 0, 'retries': 0, 'hedges': 0, 'hedge_wins': 0, 'failures': 0, 'rejected': 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def _timed(self, kwargs):
+        started = time.monotonic()
+        response = self.create(**kwargs)
+        return response, time.monotonic() - started
+
+    def _hedged(self, kwargs, remaining=None):
+        threshold = None
+        if self._pool and len(self.latency) >= self.hedge_min_samples:
+            threshold = self.latency.percentile(self.hedge_percentile)
+        if threshold is None:
+            return self._won(self._timed(kwargs))
+
+        ends = None if remaining is None else time.monotonic() + remaining
+        first = self._pool.submit(self._timed, kwargs)
+        done, _ = wait([first], timeout=threshold if remaining is None else min(threshold, remaining))
+        if done:
+            return self._won(first.result())
+        if ends is not None and time.monotonic() >= ends:
+            raise DeadlineExceeded("LLM deadline exceeded before a hedge could help")
+
+        self._count('hedges')
+        second = self._pool.submit(self._timed, kwargs)
+        pending, error = {first, second}, None
+        while pending:
+            left = None if ends is None else max(0.0, ends - time.monotonic())
+            done, pending = wait(pending, timeout=left, return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceeded("LLM deadline exceeded waiting for hedged requests")
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        self._count('hedge_wins')
+                    return self._won(future.result())  # the loser finishes in the background
+                error = future.exception()
+        raise error
+
+    def _won(self, timed):
+        """Only latencies of answers actually used feed the hedging threshold"""
+        response, seconds = timed
+        self.latency.record(seconds)
+        return response
+
+    def _call(self, attempt_fn, deadline=None):
+        """``attempt_fn(remaining)`` with retries; ``remaining`` is None without a deadline"""
+        self._count('calls')
+        ends = None if deadline is None else time.monotonic() + deadline
+        attempt = 0
+        while True:
+            remaining = None if ends is None else ends - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                self._count('failures')
+                raise DeadlineExceeded(f"LLM deadline of {deadline:g}s exceeded")
+            if not self.breaker.allow():
+                self._count('rejected')
+                raise CircuitOpenError(f"LLM circuit open, retry in {self.breaker.retry_in():.0f}s")
+            try:
+                result = attempt_fn(remaining)
+            except DeadlineExceeded:
+                self.breaker.record_failure()
+                self._count('failures')
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    self.breaker.record_success()  # the API answered; the request was at fault
+                    raise
+                self.breaker.record_failure()
+                delay = retry_after(e, self.max_delay)
+                if delay is None:
+                    delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                if attempt >= self.max_retries or self.breaker.state == OPEN:
+                    self._count('failures')
+                    raise
+                if ends is not None and time.monotonic() + delay >= ends:
+                    self._count('failures')
+                    raise DeadlineExceeded(f"LLM deadline of {deadline:g}s leaves no time to retry ({e})") from e
+                print(f"⚠️ LLM call failed ({e}); retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+                self._count('retries')
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return result
+
+    @staticmethod
+    def _within(kwargs, remaining):
+        """Request options with the per-attempt timeout cut to the time left"""
+        if remaining is None:
+            return kwargs
+        return {**kwargs, 'timeout': min(kwargs.get('timeout') or remaining, remaining)}
+
+    def complete(self, deadline=None, **kwargs):
+        """chat.completions.create(**kwargs), made resilient"""
+        return self._call(lambda remaining: self._hedged(self._within(kwargs, remaining), remaining), deadline)
+
+    def stream(self, deadline=None, **kwargs):
+        """Open a streaming completion; only the connection attempt is retried,
+        never a stream that has already produced tokens. ``deadline`` bounds
+        opening the stream, not reading it."""
+        return self._call(lambda remaining: self.create(stream=True, **self._within(kwargs, remaining)), deadline)
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+        p = self.hedge_percentile or 95
+        threshold = self.latency.percentile(p)
+        return {
+            **counts,
+            'circuit': self.breaker.state,
+            'trips': self.breaker.trips,
+            'samples': len(self.latency),
+            f'p{p:g}_seconds': round(threshold, 3) if threshold is not None else None
+        }
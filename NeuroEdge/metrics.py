@@ -0,0 +1,261 @@
+# metrics.py - per-agent latency, token, cost and cache instrumentation
+import time
+import threading
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets; a final +Inf bucket is implied
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 4, 6, 8, 12, 16, 24, 32,
+                   45, 60, 90, 120)
+
+# USD per 1K tokens (prompt, completion); unknown models still count tokens, at no cost
+MODEL_PRICES = {
+    'gpt-4-turbo': (0.01, 0.03),
+    'gpt-4o': (0.0025, 0.01),
+    'gpt-4o-mini': (0.00015, 0.0006),
+    'gpt-3.5-turbo': (0.0005, 0.0015),
+}
+
+DESCRIPTIONS = {
+    'llm_seconds': 'Duration of one LLM call (a streamed call lasts until its last token)',
+    'llm_first_token_seconds': 'Time from starting a streamed LLM call to its first token',
+    'db_search_seconds': 'Duration of one property database search',
+    'llm_prompt_tokens': 'Prompt tokens billed',
+    'llm_completion_tokens': 'Completion tokens billed',
+    'llm_cost_usd': 'Estimated LLM spend in US dollars',
+    'llm_cache_hits': 'Replies served from the response cache',
+    'llm_cache_misses': 'Replies that needed an LLM call',
+    'llm_errors': 'LLM calls that raised',
+    'db_search_errors': 'Property searches that raised',
+}
+
+
+def percentile(bounds, counts, p):
+    """Estimate the p-th percentile from bucket counts (linear within a bucket, like histogram_quantile)"""
+    total = sum(counts)
+    if not total:
+        return None
+    rank = p / 100.0 * total
+    cumulative, lower = 0, 0.0
+    for bound, n in zip(bounds, counts):
+        if n and cumulative + n >= rank:
+            return lower + (bound - lower) * (rank - cumulative) / n
+        cumulative += n
+        lower = bound
+    return lower  # in the +Inf bucket: the highest finite bound is all we know
+
+
+class Metrics:
+    """Histograms and counters labelled by agent.
+
+    Every observation is kept in process memory. With a Redis client the
+    same increments also go to Redis hashes (``<namespace>:<metric>``,
+    fields ``<agent>|<bucket>``), so ``snapshot`` can report across all
+    workers; if Redis fails the local figures are reported instead, and
+    Redis is left alone for ``redis_retry_after`` seconds (one warning per
+    outage, not one per observation).
+    """
+
+    def __init__(self, redis_client=None, namespace='metrics', buckets=LATENCY_BUCKETS, redis_retry_after=30.0):
+        self.redis = redis_client
+        self.namespace = namespace
+        self.buckets = tuple(buckets)
+        self._histograms = {}   # name -> agent -> [bucket counts..., +Inf count]
+        self._sums = {}         # name -> agent -> total seconds
+        self._counters = {}     # name -> agent -> value
+        self._lock = threading.Lock()
+        self.redis_errors = 0
+        self.redis_retry_after = redis_retry_after
+        self._redis_down_until = None  # monotonic time Redis is next tried, while it is failing
+
+    @staticmethod
+    def label(agent):
+        return str(agent) if agent else 'none'
+
+    def _bucket(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                return i
+        return len(self.buckets)
+
+    def _use_redis(self):
+        if self.redis is None:
+            return False
+        down_until = self._redis_down_until
+        return down_until is None or time.monotonic() >= down_until
+
+    def _redis_failed(self, e):
+        with self._lock:
+            self.redis_errors += 1
+            first = self._redis_down_until is None
+            self._redis_down_until = time.monotonic() + self.redis_retry_after
+        if first:
+            print(f"⚠️ Metrics Redis error, using this worker's figures for {self.redis_retry_after:g}s: {e}")
+
+    def _redis_ok(self):
+        if self._redis_down_until is not None:
+            self._redis_down_until = None
+            print("✅ Metrics Redis reachable again")
+
+    def _to_redis(self, ops):
+        if not self._use_redis():
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for op in ops:
+                getattr(pipe, op[0])(*op[1:])
+            pipe.execute()
+        except Exception as e:
+            self._redis_failed(e)
+        else:
+            self._redis_ok()
+
+    # ─── Recording ───────────────────────────────────────────────────────────
+    def observe(self, name, agent, seconds):
+        agent = self.label(agent)
+        i = self._bucket(seconds)
+        with self._lock:
+            counts = self._histograms.setdefault(name, {}).setdefault(agent, [0] * (len(self.buckets) + 1))
+            counts[i] += 1
+            sums = self._sums.setdefault(name, {})
+            sums[agent] = sums.get(agent, 0.0) + seconds
+        key = f"{self.namespace}:h:{name}"
+        self._to_redis([('sadd', f"{self.namespace}:histograms", name),
+                        ('hincrby', key, f"{agent}|{i}", 1),
+                        ('hincrbyfloat', key, f"{agent}|sum", seconds)])
+
+    def inc(self, name, agent, amount=1):
+        if not amount:
+            return
+        agent = self.label(agent)
+        with self._lock:
+            values = self._counters.setdefault(name, {})
+            values[agent] = values.get(agent, 0) + amount
+        self._to_redis([('sadd', f"{self.namespace}:counters", name),
+                        ('hincrbyfloat', f"{self.namespace}:c:{name}", agent, amount)])
+
+    @contextmanager
+    def timed(self, kind, agent):
+        """Time the block as ``<kind>_seconds``; an exception also counts in ``<kind>_errors``"""
+        started = time.monotonic()
+        try:
+            yield
+        except Exception:
+            self.inc(f"{kind}_errors", agent)
+            raise
+        finally:
+            self.observe(f"{kind}_seconds", agent, time.monotonic() - started)
+
+    def record_usage(self, agent, model, usage):
+        """Tokens and estimated cost from an OpenAI ``usage`` object (ignored if missing)"""
+        if usage is None:
+            return
+        prompt = getattr(usage, 'prompt_tokens', 0) or 0
+        completion = getattr(usage, 'completion_tokens', 0) or 0
+        prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+        self.inc('llm_prompt_tokens', agent, prompt)
+        self.inc('llm_completion_tokens', agent, completion)
+        self.inc('llm_cost_usd', agent, (prompt * prompt_price + completion * completion_price) / 1000.0)
+
+    # ─── Reporting ───────────────────────────────────────────────────────────
+    def _local_snapshot(self):
+        with self._lock:
+            histograms = {name: {agent: {'counts': list(counts), 'sum': self._sums[name][agent]}
+                                 for agent, counts in by_agent.items()}
+                          for name, by_agent in self._histograms.items()}
+            counters = {name: dict(values) for name, values in self._counters.items()}
+        return {'histograms': histograms, 'counters': counters, 'source': 'local'}
+
+    def _redis_snapshot(self):
+        size = len(self.buckets) + 1
+        histograms, counters = {}, {}
+        for name in self.redis.smembers(f"{self.namespace}:histograms"):
+            name = name.decode() if isinstance(name, bytes) else name
+            for field, value in self.redis.hgetall(f"{self.namespace}:h:{name}").items():
+                field = field.decode() if isinstance(field, bytes) else field
+                agent, _, slot = field.rpartition('|')
+                entry = histograms.setdefault(name, {}).setdefault(agent, {'counts': [0] * size, 'sum': 0.0})
+                if slot == 'sum':
+                    entry['sum'] = float(value)
+                elif int(slot) < size:
+                    entry['counts'][int(slot)] = int(value)
+        for name in self.redis.smembers(f"{self.namespace}:counters"):
+            name = name.decode() if isinstance(name, bytes) else name
+            values = self.redis.hgetall(f"{self.namespace}:c:{name}")
+            counters[name] = {(a.decode() if isinstance(a, bytes) else a): float(v) for a, v in values.items()}
+        return {'histograms': histograms, 'counters': counters, 'source': 'redis'}
+
+    def snapshot(self):
+        """{'histograms': {name: {agent: {counts, sum}}}, 'counters': {name: {agent: value}}, 'source'}"""
+        if self._use_redis():
+            try:
+                snapshot = self._redis_snapshot()
+            except Exception as e:
+                self._redis_failed(e)
+            else:
+                self._redis_ok()
+                return snapshot
+        return self._local_snapshot()
+
+    def summary(self, snapshot=None):
+        """One row per agent: call counts, p50/p95/p99 latency, tokens, cost, cache hit rate and errors"""
+        snapshot = snapshot or self.snapshot()
+        histograms, counters = snapshot['histograms'], snapshot['counters']
+        agents = set()
+        for by_agent in list(histograms.values()) + list(counters.values()):
+            agents.update(by_agent)
+
+        def latency(name, agent):
+            entry = histograms.get(name, {}).get(agent)
+            if not entry or not sum(entry['counts']):
+                return {'count': 0, 'mean': None, 'p50': None, 'p95': None, 'p99': None}
+            count = sum(entry['counts'])
+            return {'count': count, 'mean': entry['sum'] / count,
+                    **{f"p{p}": percentile(self.buckets, entry['counts'], p) for p in (50, 95, 99)}}
+
+        rows = []
+        for agent in sorted(agents):
+            counter = lambda name: counters.get(name, {}).get(agent, 0)
+            hits, misses = counter('llm_cache_hits'), counter('llm_cache_misses')
+            rows.append({
+                'agent': agent,
+                'llm': latency('llm_seconds', agent),
+                'first_token': latency('llm_first_token_seconds', agent),
+                'db_search': latency('db_search_seconds', agent),
+                'prompt_tokens': int(counter('llm_prompt_tokens')),
+                'completion_tokens': int(counter('llm_completion_tokens')),
+                'cost_usd': round(counter('llm_cost_usd'), 4),
+                'cache_hits': int(hits),
+                'cache_misses': int(misses),
+                'cache_hit_rate': round(100.0 * hits / (hits + misses), 1) if hits + misses else None,
+                'llm_errors': int(counter('llm_errors')),
+                'db_search_errors': int(counter('db_search_errors')),
+            })
+        return rows
+
+    def prometheus(self, prefix='neuroedge', snapshot=None):
+        """Prometheus text exposition; percentiles come from ``histogram_quantile`` over the buckets"""
+        snapshot = snapshot or self.snapshot()
+
+        def labels(agent, **extra):
+            pairs = [('agent', agent)] + list(extra.items())
+            escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+            return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+        lines = []
+        for name, by_agent in sorted(snapshot['histograms'].items()):
+            metric = f"{prefix}_{name}"
+            lines += [f"# HELP {metric} {DESCRIPTIONS.get(name, name)}", f"# TYPE {metric} histogram"]
+            for agent, entry in sorted(by_agent.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets + (float('inf'),), entry['counts']):
+                    cumulative += n
+                    le = '+Inf' if bound == float('inf') else repr(float(bound))
+                    lines.append(f"{metric}_bucket{labels(agent, le=le)} {cumulative}")
+                lines.append(f"{metric}_sum{labels(agent)} {entry['sum']}")
+                lines.append(f"{metric}_count{labels(agent)} {cumulative}")
+        for name, by_agent in sorted(snapshot['counters'].items()):
+            metric = f"{prefix}_{name}_total"
+            lines += [f"# HELP {metric} {DESCRIPTIONS.get(name, name)}", f"# TYPE {metric} counter"]
+            for agent, value in sorted(by_agent.items()):
+                lines.append(f"{metric}{labels(agent)} {value}")
+        return "\n".join(lines) + "\n"
@@ -1,9 +1,16 @@
 # property_database.py - COMPLETE VERSION
+import re
+import time
 import sqlite3
 import json
 import hashlib
 from datetime import datetime
 
+# Relevance weights used by search_properties (and its in-memory twin)
+SEARCH_WEIGHTS = (('title', 10), ('description', 6), ('location', 8), ('property_type', 7), ('features', 5))
+# A shared batch scan holds the whole available inventory in memory; above this many listings use SQL per query
+SHARE_SCAN_MAX_ROWS = 5000
+
 class PropertyDatabase:
     def __init__(self, db_path, agency_name):
         self.db_path = db_path
@@ -35,9 +42,16 @@ class PropertyDatabase:
                 agent_id TEXT NOT NULL,
                 listing_url TEXT,  -- NEW: Link to external listing (Property24, etc.)
                 images TEXT,       -- NEW: JSON array of image URLs
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                version INTEGER DEFAULT 1,  -- bumped on every change; keys rendered fragments
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
+
+        # Add columns introduced after the first release to existing databases
+        self.ensure_column(cursor, 'properties', 'version', 'INTEGER DEFAULT 1')
+        if self.ensure_column(cursor, 'properties', 'updated_at', 'TIMESTAMP'):
+            cursor.execute('UPDATE properties SET updated_at = created_at WHERE updated_at IS NULL')
         
         # Create agents table
         cursor.execute('''
@@ -51,6 +65,24 @@ class PropertyDatabase:
             )
         ''')
         
+        # Single-row counter bumped by triggers on any listing/agent change (HTTP ETags)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS data_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute('INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)')
+        for table in ('properties', 'agents'):
+            for event in ('INSERT', 'UPDATE', 'DELETE'):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS bump_version_{table}_{event.lower()}
+                    AFTER {event} ON {table}
+                    BEGIN
+                        UPDATE data_version SET version = version + 1 WHERE id = 1;
+                    END
+                ''')
+        
         # Insert sample agents if they don't exist
         sample_agents = [
             ('NE001', 'Sergej-AI', 'sergejwitbooi@gmail.com', '+264 85 749 4061', 
@@ -72,6 +104,23 @@ class PropertyDatabase:
         conn.commit()
         conn.close()
         print(f"✅ Database initialized for {self.agency_name}")
+
+    def ensure_column(self, cursor, table, column, definition):
+        """Add a column to an existing table if it is missing; returns True if added"""
+        cursor.execute(f'PRAGMA table_info({table})')
+        if column not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+            return True
+        return False
+
+    def get_data_version(self):
+        """Counter that changes whenever any property or agent row changes"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            row = conn.execute('SELECT version FROM data_version WHERE id = 1').fetchone()
+            return row[0] if row else 0
+        finally:
+            conn.close()
     
     def init_users_table(self):
         """Initialize users table for admin authentication"""
@@ -236,6 +285,12 @@ class PropertyDatabase:
                 SET {set_clause}
                 WHERE id = ?
             ''', values)
+            # Agent details are rendered on every property card
+            cursor.execute('''
+                UPDATE properties
+                SET version = COALESCE(version, 1) + 1, updated_at = CURRENT_TIMESTAMP
+                WHERE agent_id = ?
+            ''', (agent_id,))
             conn.commit()
             return True, "Agent updated successfully"
         except Exception as e:
@@ -318,29 +373,42 @@ class PropertyDatabase:
     
     def get_all_properties(self, include_deleted=False):
         """Get all properties with option to include deleted ones"""
+        return list(self.iter_all_properties(include_deleted))
+
+    def iter_all_properties(self, include_deleted=False, batch_size=500):
+        """Yield properties one at a time from a server-side cursor (constant memory)"""
         conn = sqlite3.connect(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
     
-        if include_deleted:
-            cursor.execute('''
-                SELECT p.*, a.name as agent_name, a.phone as agent_phone, a.specialty as agent_specialty
-                FROM properties p
-                JOIN agents a ON p.agent_id = a.id
-                ORDER BY p.created_at DESC
-            ''')
-        else:
-            cursor.execute('''
-                SELECT p.*, a.name as agent_name, a.phone as agent_phone, a.specialty as agent_specialty
-                FROM properties p
-                JOIN agents a ON p.agent_id = a.id
-                WHERE p.status = 'available' OR p.status IS NULL
-                ORDER BY p.created_at DESC
-            ''')
-    
-        results = cursor.fetchall()
-        conn.close()
-        return [dict(row) for row in results]
+        try:
+            if include_deleted:
+                cursor.execute('''
+                    SELECT p.*, a.name as agent_name, a.phone as agent_phone, a.specialty as agent_specialty
+                    FROM properties p
+                    JOIN agents a ON p.agent_id = a.id
+                    ORDER BY p.created_at DESC
+                ''')
+            else:
+                cursor.execute('''
+                    SELECT p.*, a.name as agent_name, a.phone as agent_phone, a.specialty as agent_specialty
+                    FROM properties p
+                    JOIN agents a ON p.agent_id = a.id
+                    WHERE p.status = 'available' OR p.status IS NULL
+                    ORDER BY p.created_at DESC
+                ''')
+            yield from self._iter_rows(cursor, batch_size)
+        finally:
+            conn.close()
+
+    def _iter_rows(self, cursor, batch_size):
+        """Fetch rows from an executed cursor in batches and yield them as dicts"""
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
 
     def get_property_by_id(self, property_id):
         """Get a specific property by ID"""
@@ -409,7 +477,7 @@ class PropertyDatabase:
             
             cursor.execute(f'''
                 UPDATE properties 
-                SET {set_clause}
+                SET {set_clause}, version = COALESCE(version, 1) + 1, updated_at = CURRENT_TIMESTAMP
                 WHERE id = ?
             ''', values)
             conn.commit()
@@ -428,7 +496,7 @@ class PropertyDatabase:
         try:
             cursor.execute('''
                 UPDATE properties 
-                SET status = 'deleted'
+                SET status = 'deleted', version = COALESCE(version, 1) + 1, updated_at = CURRENT_TIMESTAMP
                 WHERE id = ?
             ''', (property_id,))
             conn.commit()
@@ -490,7 +558,7 @@ class PropertyDatabase:
         try:
             cursor.execute('''
                 UPDATE properties 
-                SET status = 'available'
+                SET status = 'available', version = COALESCE(version, 1) + 1, updated_at = CURRENT_TIMESTAMP
                 WHERE id = ?
             ''', (property_id,))
             conn.commit()
@@ -529,27 +597,128 @@ class PropertyDatabase:
         """Alias for permanently_delete_all_deleted"""
         return self.permanently_delete_all_deleted()
     
-    def search_properties(self, query, max_results=10):
-        """Balanced property search - matches query terms with weighted relevance scoring."""
+    def search_properties(self, query, max_results=10, agent=None):
+        """Balanced property search - matches query terms with weighted relevance scoring.
+
+        ``agent`` (an agent id or name) limits results to that agent's listings.
+        """
+        return list(self.iter_search_properties(query, max_results, agent=agent))
+
+    def iter_search_properties(self, query, max_results=10, batch_size=100, agent=None):
+        """Yield search results as they are fetched instead of materialising the list"""
         conn = sqlite3.connect(self.db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
 
+        try:
+            sql, params = self._search_sql(query, max_results, agent)
+            cursor.execute(sql, params)
+            yield from self._iter_rows(cursor, batch_size)
+        finally:
+            conn.close()
+
+    def search_properties_batch(self, queries, share_scan=False, share_scan_max_rows=SHARE_SCAN_MAX_ROWS):
+        """Run many searches over one connection.
+
+        ``queries`` is a list of (query, max_results). Identical queries (same
+        text ignoring case and spacing) are executed once with the largest
+        limit and sliced per request. With ``share_scan`` the available
+        inventory is read once and every distinct query is scored in memory
+        with the same rules as the SQL search, unless the inventory has more
+        than ``share_scan_max_rows`` listings (then each query runs in SQL).
+        Returns one dict per input with ``results``, ``elapsed_ms`` and
+        ``deduplicated``.
+        """
+        distinct = {}
+        for query, max_results in queries:
+            key = " ".join((query or "").lower().split())
+            distinct[key] = max(distinct.get(key, 0), max_results)
+
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            answers = {}
+            if share_scan:
+                started = time.perf_counter()
+                available = conn.execute('''
+                    SELECT COUNT(*) FROM properties WHERE status = 'available' OR status IS NULL
+                ''').fetchone()[0]
+                share_scan = available <= share_scan_max_rows
+            if share_scan:
+                candidates = [dict(row) for row in conn.execute('''
+                    SELECT p.*, a.name as agent_name, a.phone as agent_phone,
+                           a.specialty as agent_specialty, a.email as agent_email
+                    FROM properties p
+                    JOIN agents a ON p.agent_id = a.id
+                    WHERE (p.status = 'available' OR p.status IS NULL)
+                ''')]
+                scan_ms = (time.perf_counter() - started) * 1000 / max(len(distinct), 1)
+                for key, limit in distinct.items():
+                    started = time.perf_counter()
+                    answers[key] = (self._score_in_memory(candidates, key, limit),
+                                    scan_ms + (time.perf_counter() - started) * 1000)
+            else:
+                for key, limit in distinct.items():
+                    started = time.perf_counter()
+                    sql, params = self._search_sql(key, limit)
+                    rows = [dict(row) for row in conn.execute(sql, params)]
+                    answers[key] = (rows, (time.perf_counter() - started) * 1000)
+        finally:
+            conn.close()
+
+        results, seen = [], set()
+        for query, max_results in queries:
+            key = " ".join((query or "").lower().split())
+            rows, elapsed = answers[key]
+            results.append({
+                'query': query,
+                'max_results': max_results,
+                'results': rows[:max_results],
+                'elapsed_ms': round(elapsed, 3) if key not in seen else 0.0,
+                'deduplicated': key in seen
+            })
+            seen.add(key)
+        return results
+
+    def _score_in_memory(self, candidates, query, max_results):
+        """Apply the search_properties matching and scoring rules to rows already in memory"""
+        if not query:
+            return sorted(candidates, key=lambda p: p.get('created_at') or '', reverse=True)[:max_results]
+
+        def like(text):
+            # SQL LIKE '%text%': case-insensitive, with % and _ as wildcards
+            pattern = "".join('.*' if ch == '%' else '.' if ch == '_' else re.escape(ch) for ch in text)
+            return re.compile(pattern, re.IGNORECASE | re.DOTALL)
+
+        search_terms = [term for term in query.split() if len(term) > 2] or [query]
+        patterns = [like(query)] + [like(term) for term in search_terms]
+        phrase = patterns[0]
+
+        scored = []
+        for prop in candidates:
+            fields = [str(prop.get(field) or '') for field, _ in SEARCH_WEIGHTS]
+            if not any(p.search(f) for p in patterns for f in fields):
+                continue
+            score = sum(weight for (_, weight), f in zip(SEARCH_WEIGHTS, fields) if phrase.search(f))
+            scored.append({**prop, 'relevance_score': score})
+        scored.sort(key=lambda p: (-p['relevance_score'], p['price']))
+        return scored[:max_results]
+
+    def _search_sql(self, query, max_results, agent=None):
+        """Build the relevance-scored search statement and its parameters"""
+        agent_clause, agent_params = ("AND (a.id = ? OR a.name = ?)", [agent, agent]) if agent else ("", [])
         if not query or query.strip() == "":
             # Return recent properties for empty search
-            sql = '''
+            sql = f'''
                 SELECT p.*, a.name as agent_name, a.phone as agent_phone, 
                        a.specialty as agent_specialty, a.email as agent_email
                 FROM properties p
                 JOIN agents a ON p.agent_id = a.id
-                WHERE (p.status = 'available' OR p.status IS NULL)
+                WHERE (p.status = 'available' OR p.status IS NULL) {agent_clause}
                 ORDER BY p.created_at DESC
                 LIMIT ?
             '''
-            cursor.execute(sql, [max_results])
-            results = cursor.fetchall()
-            conn.close()
-            return [dict(row) for row in results]
+            return sql, agent_params + [max_results]
 
         # Break query into terms (ignore very short ones)
         search_terms = [term.strip().lower() for term in query.split() if len(term.strip()) > 2]
@@ -579,7 +748,7 @@ class PropertyDatabase:
             params.extend([term_pattern] * 5)
 
         # Final WHERE clause: always enforce availability
-        where_clause = f"(p.status = 'available' OR p.status IS NULL) AND ({' OR '.join(search_conditions)})"
+        where_clause = f"(p.status = 'available' OR p.status IS NULL) {agent_clause} AND ({' OR '.join(search_conditions)})"
 
         # --- Build SQL with scoring ---
         sql = f'''
@@ -599,16 +768,8 @@ class PropertyDatabase:
             LIMIT ?
         '''
 
-        # Add scoring params (based on full query)
+        # Scoring params (based on full query) come first, as in the statement
         scoring_pattern = f'%{query}%'
-        params.extend([
-            scoring_pattern, scoring_pattern, scoring_pattern,
-            scoring_pattern, scoring_pattern,  # scoring weights
-            max_results
-        ])
+        params = [scoring_pattern] * 5 + agent_params + params + [max_results]
 
-        cursor.execute(sql, params)
-        results = cursor.fetchall()
-        conn.close()
-
-        return [dict(row) for row in results]
+        return sql, params
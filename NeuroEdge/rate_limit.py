@@ -0,0 +1,131 @@
+# rate_limit.py - token-bucket rate limiting and a cap on concurrent LLM calls
+import math
+import time
+import threading
+from collections import OrderedDict
+
+# KEYS[1] = bucket; ARGV = rate (tokens/s), burst, now, cost. Returns {allowed, seconds to wait}
+TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed, wait = 0, 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(wait)}
+"""
+
+
+class RateLimited(Exception):
+    """Request refused; ``retry_after`` is the suggested wait in seconds"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.message = message
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+def parse_limit(spec):
+    """'20/60' (20 requests per 60 seconds) -> (rate per second, burst)"""
+    count, _, seconds = str(spec).partition('/')
+    count, seconds = float(count), float(seconds or 1)
+    return count / seconds, count
+
+
+class RateLimiter:
+    """Token buckets in Redis (atomic Lua script), or in process memory.
+
+    Without Redis, or whenever a Redis call fails, buckets live in a
+    bounded in-memory LRU - limits then apply per worker, the same
+    trade-off as the filesystem session fallback.
+    """
+
+    def __init__(self, redis_client=None, namespace='ratelimit', max_local_buckets=100000):
+        self.redis = redis_client
+        self.namespace = namespace
+        self.max_local_buckets = max_local_buckets
+        self._script = redis_client.register_script(TOKEN_BUCKET_LUA) if redis_client is not None else None
+        self._buckets = OrderedDict()   # key -> (tokens, ts)
+        self._lock = threading.Lock()
+        self.counts = {'allowed': 0, 'limited': 0, 'redis_errors': 0}
+
+    def allow(self, key, rate, burst, cost=1):
+        """Take ``cost`` tokens from a bucket; returns (allowed, seconds until enough tokens)"""
+        now = time.time()
+        allowed, wait = None, 0.0
+        if self._script is not None:
+            try:
+                result = self._script(keys=[f"{self.namespace}:{key}"], args=[rate, burst, now, cost])
+                allowed, wait = bool(int(result[0])), float(result[1])
+            except Exception as e:
+                self.counts['redis_errors'] += 1
+                print(f"⚠️ Rate limiter Redis error, using in-memory buckets: {e}")
+        if allowed is None:
+            allowed, wait = self._allow_local(key, rate, burst, cost, now)
+        self.counts['allowed' if allowed else 'limited'] += 1
+        return allowed, wait
+
+    def _allow_local(self, key, rate, burst, cost, now):
+        with self._lock:
+            tokens, ts = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + max(0.0, now - ts) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_local_buckets:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+    def stats(self):
+        return {**self.counts, 'redis': self._script is not None, 'local_buckets': len(self._buckets)}
+
+
+class Slot:
+    """One admitted call; ``release`` is idempotent"""
+
+    def __init__(self, gate):
+        self._gate = gate
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._gate._release()
+
+
+class ConcurrencyGate:
+    """At most ``limit`` calls in flight; the rest are refused, not queued"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self.refused = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            if self.in_flight >= self.limit:
+                self.refused += 1
+                return None
+            self.in_flight += 1
+        return Slot(self)
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def stats(self):
+        with self._lock:
+            return {'in_flight': self.in_flight, 'limit': self.limit, 'refused': self.refused}
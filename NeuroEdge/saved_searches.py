@@ -0,0 +1,249 @@
+# saved_searches.py - saved searches and a percolator for new-listing alerts
+import re
+import json
+import sqlite3
+import threading
+from bisect import bisect_right
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+NUMERIC_FILTERS = {
+    'min_price': ('price', 'min'), 'max_price': ('price', 'max'),
+    'min_bedrooms': ('bedrooms', 'min'), 'max_bedrooms': ('bedrooms', 'max'),
+    'min_bathrooms': ('bathrooms', 'min'),
+}
+
+# Geometric price buckets (N$10k .. ~N$1bn, 25% apart) for the range index
+PRICE_BUCKETS = [10_000 * 1.25 ** i for i in range(52)]
+
+
+def terms_of(text):
+    """Normalised terms: lowercase words longer than two characters, light plural stem"""
+    terms = set()
+    for tok in TOKEN_RE.findall(str(text).lower()):
+        if len(tok) <= 2:
+            continue
+        if len(tok) > 4 and tok.endswith('s') and not tok.endswith('ss'):
+            tok = tok[:-1]
+        terms.add(tok)
+    return terms
+
+
+def listing_terms(prop):
+    features = prop.get('features') or []
+    if isinstance(features, str):
+        try:
+            features = json.loads(features)
+        except ValueError:
+            features = [features]
+    return terms_of(" ".join(str(part) for part in [
+        prop.get('title', ''), prop.get('description', ''), prop.get('location', ''),
+        prop.get('property_type', ''), " ".join(map(str, features))
+    ]))
+
+
+def price_bucket(price):
+    return min(bisect_right(PRICE_BUCKETS, price), len(PRICE_BUCKETS))
+
+
+class Percolator:
+    """Reverse search: which saved searches does a listing match?
+
+    Searches with query terms are posted under each term and match when every
+    term was seen (counting over the listing's terms). Term-less searches are
+    posted under their property type, or else under the geometric price
+    buckets their price range overlaps. A listing therefore only touches the
+    searches sharing a term, its type, or its price bucket - never all of them.
+    """
+
+    def __init__(self):
+        self.searches = {}   # id -> {'terms', 'filters'}
+        self.by_term = {}    # term -> set(ids)
+        self.by_type = {}    # property_type -> set(ids)
+        self.by_bucket = {}  # price bucket -> set(ids)
+
+    def add(self, search_id, query, filters):
+        terms = terms_of(query) | terms_of(filters.get('location', ''))
+        self.searches[search_id] = {'terms': terms, 'filters': filters}
+        if terms:
+            for term in terms:
+                self.by_term.setdefault(term, set()).add(search_id)
+        elif filters.get('property_type'):
+            self.by_type.setdefault(filters['property_type'].lower(), set()).add(search_id)
+        else:
+            for bucket in self._buckets(filters):
+                self.by_bucket.setdefault(bucket, set()).add(search_id)
+
+    def remove(self, search_id):
+        search = self.searches.pop(search_id, None)
+        if not search:
+            return
+        for term in search['terms']:
+            self.by_term.get(term, set()).discard(search_id)
+        for postings in (self.by_type, self.by_bucket):
+            for ids in postings.values():
+                ids.discard(search_id)
+
+    def _buckets(self, filters):
+        lo = price_bucket(float(filters.get('min_price') or 0))
+        hi = price_bucket(float(filters['max_price'])) if filters.get('max_price') else len(PRICE_BUCKETS)
+        return range(lo, hi + 1)
+
+    def _passes_filters(self, prop, filters):
+        for key, (field, kind) in NUMERIC_FILTERS.items():
+            if filters.get(key) in (None, ''):
+                continue
+            value = prop.get(field)
+            if value is None:
+                return False
+            if kind == 'min' and value < float(filters[key]):
+                return False
+            if kind == 'max' and value > float(filters[key]):
+                return False
+        if filters.get('property_type') and (prop.get('property_type') or '').lower() != filters['property_type'].lower():
+            return False
+        return True
+
+    def match(self, prop):
+        """Ids of saved searches the listing satisfies"""
+        candidates = set()
+        hits = {}
+        for term in listing_terms(prop):
+            for search_id in self.by_term.get(term, ()):
+                hits[search_id] = hits.get(search_id, 0) + 1
+        candidates.update(sid for sid, n in hits.items() if n == len(self.searches[sid]['terms']))
+        candidates.update(self.by_type.get((prop.get('property_type') or '').lower(), ()))
+        if prop.get('price') is not None:
+            candidates.update(self.by_bucket.get(price_bucket(prop['price']), ()))
+        return [sid for sid in candidates if self._passes_filters(prop, self.searches[sid]['filters'])]
+
+
+class SavedSearchStore:
+    """Saved searches per visitor (session) or contact, plus their pending alerts"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.percolator = Percolator()
+        self._loaded_up_to = 0
+        self._lock = threading.Lock()
+        self.init_tables()
+
+    def init_tables(self):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS saved_searches (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                owner TEXT NOT NULL,
+                contact TEXT,
+                query TEXT,
+                filters TEXT,
+                active INTEGER DEFAULT 1,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_saved_searches_owner ON saved_searches(owner)')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS saved_search_alerts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                search_id INTEGER NOT NULL,
+                property_id TEXT NOT NULL,
+                seen INTEGER DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(search_id, property_id)
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def _sync(self, conn):
+        """Pick up searches saved (or removed) since the last sync, e.g. by other workers"""
+        rows = conn.execute(
+            'SELECT id, query, filters, active FROM saved_searches WHERE id > ? ORDER BY id',
+            (self._loaded_up_to,)
+        ).fetchall()
+        for search_id, query, filters, active in rows:
+            if active:
+                self.percolator.add(search_id, query or '', json.loads(filters or '{}'))
+            self._loaded_up_to = search_id
+
+    def save_search(self, owner, query, filters=None, contact=None):
+        """Store a saved search and index it; returns the new id"""
+        filters = {k: v for k, v in (filters or {}).items() if v not in (None, '')}
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.execute(
+                'INSERT INTO saved_searches (owner, contact, query, filters) VALUES (?, ?, ?, ?)',
+                (owner, contact, query, json.dumps(filters))
+            )
+            conn.commit()
+            with self._lock:
+                self._sync(conn)
+            return cursor.lastrowid
+        finally:
+            conn.close()
+
+    def delete_search(self, owner, search_id):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.execute(
+                'UPDATE saved_searches SET active = 0 WHERE id = ? AND owner = ?', (search_id, owner)
+            )
+            conn.commit()
+            with self._lock:
+                self.percolator.remove(search_id)
+            return cursor.rowcount > 0
+        finally:
+            conn.close()
+
+    def list_searches(self, owner):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            rows = conn.execute('''
+                SELECT s.id, s.query, s.filters, s.contact, s.created_at,
+                       (SELECT COUNT(*) FROM saved_search_alerts a WHERE a.search_id = s.id AND a.seen = 0) as unseen
+                FROM saved_searches s
+                WHERE s.owner = ? AND s.active = 1
+                ORDER BY s.created_at DESC
+            ''', (owner,)).fetchall()
+            return [{**dict(row), 'filters': json.loads(row['filters'] or '{}')} for row in rows]
+        finally:
+            conn.close()
+
+    def percolate(self, prop):
+        """Record alerts for every saved search a new or updated listing matches"""
+        if prop.get('status') not in (None, 'available'):
+            return []
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with self._lock:
+                self._sync(conn)
+                matches = self.percolator.match(prop)
+            if matches:
+                conn.executemany('''
+                    INSERT OR IGNORE INTO saved_search_alerts (search_id, property_id)
+                    SELECT id, ? FROM saved_searches WHERE id = ? AND active = 1
+                ''', [(prop['id'], search_id) for search_id in matches])
+                conn.commit()
+            return matches
+        finally:
+            conn.close()
+
+    def alerts(self, owner, mark_seen=False):
+        """Unseen alerts for an owner, newest first"""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            rows = conn.execute('''
+                SELECT a.id, a.search_id, a.property_id, a.created_at, s.query
+                FROM saved_search_alerts a
+                JOIN saved_searches s ON s.id = a.search_id
+                WHERE s.owner = ? AND s.active = 1 AND a.seen = 0
+                ORDER BY a.created_at DESC
+            ''', (owner,)).fetchall()
+            if mark_seen and rows:
+                conn.executemany('UPDATE saved_search_alerts SET seen = 1 WHERE id = ?', [(r['id'],) for r in rows])
+                conn.commit()
+            return [dict(row) for row in rows]
+        finally:
+            conn.close()
@@ -0,0 +1,440 @@
+# semantic_index.py - local TF-IDF + SVD embeddings in a persisted faiss index
+import os
+import re
+import json
+import math
+import time
+import fcntl
+import hashlib
+import threading
+from contextlib import contextmanager
+from collections import Counter
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:  # faiss-cpu is optional; fall back to brute force in NumPy
+    faiss = None
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has', 'have', 'in', 'is',
+    'it', 'its', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was', 'with', 'we', 'you',
+    'your', 'our', 'i', 'me', 'my', 'can', 'will', 'all', 'any', 'not', 'but', 'so', 'if'
+}
+
+
+def tokenize(text):
+    """Lowercase word tokens with stopwords removed and a light plural stem"""
+    tokens = []
+    for tok in TOKEN_RE.findall(str(text).lower()):
+        if len(tok) < 2 or tok in STOPWORDS:
+            continue
+        if len(tok) > 4 and tok.endswith('s') and not tok.endswith('ss'):
+            tok = tok[:-1]
+        tokens.append(tok)
+    return tokens
+
+
+def split_passages(text, max_chars=800):
+    """Split a document into paragraph-aligned passages of at most ~max_chars"""
+    passages, current = [], ""
+    for para in re.split(r"\n\s*\n", text):
+        para = para.strip()
+        if not para:
+            continue
+        if current and len(current) + len(para) + 2 > max_chars:
+            passages.append(current)
+            current = ""
+        while len(para) > max_chars:
+            passages.append(para[:max_chars])
+            para = para[max_chars:]
+        current = f"{current}\n\n{para}" if current else para
+    if current:
+        passages.append(current)
+    return passages
+
+
+def property_text(prop):
+    """Text embedded for a listing"""
+    features = prop.get('features') or []
+    if isinstance(features, str):
+        try:
+            features = json.loads(features)
+        except ValueError:
+            features = [features]
+    return " ".join(str(part) for part in [
+        prop.get('title', ''), prop.get('property_type', ''), prop.get('location', ''),
+        prop.get('description', ''), " ".join(map(str, features)),
+        f"{prop.get('bedrooms', '')} bedroom" if prop.get('bedrooms') else ''
+    ] if part)
+
+
+def stable_id(key):
+    """Positive int64 id for a string key (faiss ids must be integers)"""
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big') & 0x7FFFFFFFFFFFFFFF
+
+
+class _NumpyIndex:
+    """Minimal stand-in for faiss.IndexIDMap2(IndexFlatIP) when faiss is unavailable"""
+
+    def __init__(self, dim):
+        self.d = dim
+        self.ids = np.zeros(0, dtype='int64')
+        self.vectors = np.zeros((0, dim), dtype='float32')
+
+    @property
+    def ntotal(self):
+        return len(self.ids)
+
+    def add_with_ids(self, vectors, ids):
+        self.vectors = np.vstack([self.vectors, vectors])
+        self.ids = np.concatenate([self.ids, ids])
+
+    def remove_ids(self, ids):
+        keep = ~np.isin(self.ids, ids)
+        self.ids, self.vectors = self.ids[keep], self.vectors[keep]
+
+    def search(self, queries, k):
+        scores = queries @ self.vectors.T
+        order = np.argsort(-scores, axis=1)[:, :k]
+        return np.take_along_axis(scores, order, axis=1), self.ids[order]
+
+
+class SemanticIndex:
+    """Nearest-neighbour search over listings and agent document passages.
+
+    Embeddings come from a TF-IDF model reduced with a randomized truncated SVD,
+    computed locally in NumPy. New texts are folded into the fitted space, so
+    property writes and uploads update the index incrementally; ``fit`` is only
+    needed again when the corpus has grown well beyond what the model saw.
+    Files live next to each other as ``<base>.faiss``, ``<base>.npz`` and
+    ``<base>.json``.
+
+    Several workers share those files. Each one records the changes it made
+    since its last save; ``save`` takes an exclusive lock on ``<base>.lock``,
+    reloads the files if another worker saved in between (the counter in
+    ``<base>.generation`` tells), replays its own changes on top and replaces
+    every file atomically. ``refresh`` picks up other workers' saves.
+    """
+
+    def __init__(self, base_path, dim=128, max_features=20000):
+        self.base_path = base_path
+        self.target_dim = dim
+        self.max_features = max_features
+        self.vocab = {}
+        self.idf = None
+        self.components = None   # (vocab, dim) projection
+        self.index = None
+        self.entries = {}        # str(id) -> {'kind', 'ref', 'agent_id', 'text'}
+        self.fitted_docs = 0
+        self.generation = 0      # generation of the files last loaded or saved
+        self._pending = {}       # str(id) -> item added, or None if removed, since then
+        self._rebuilt = False    # built from scratch: save replaces the files outright
+        self._checked_at = 0.0
+        self._lock = threading.RLock()
+
+    # --- Model --------------------------------------------------------------
+    @property
+    def ready(self):
+        return self.index is not None
+
+    def _tfidf_rows(self, token_lists):
+        """Dense, L2-normalised TF-IDF rows for a batch of tokenised texts"""
+        rows = np.zeros((len(token_lists), len(self.vocab)), dtype='float32')
+        for r, tokens in enumerate(token_lists):
+            for tok, tf in Counter(tokens).items():
+                col = self.vocab.get(tok)
+                if col is not None:
+                    rows[r, col] = (1.0 + math.log(tf)) * self.idf[col]
+        norms = np.linalg.norm(rows, axis=1, keepdims=True)
+        return rows / np.maximum(norms, 1e-12)
+
+    def _batches(self, token_lists, size=256):
+        for start in range(0, len(token_lists), size):
+            yield start, self._tfidf_rows(token_lists[start:start + size])
+
+    def fit(self, texts, seed=42):
+        """Learn vocabulary, IDF and SVD projection from a corpus (randomized SVD, batched)"""
+        token_lists = [tokenize(t) for t in texts]
+        n_docs = len(token_lists)
+        df = Counter(tok for tokens in token_lists for tok in set(tokens))
+        min_df = 2 if n_docs > 500 else 1
+        terms = [t for t, c in df.most_common(self.max_features) if c >= min_df]
+        self.vocab = {t: i for i, t in enumerate(sorted(terms))}
+        self.idf = np.array([math.log((1 + n_docs) / (1 + df[t])) + 1.0 for t in sorted(terms)], dtype='float32')
+
+        dim = max(1, min(self.target_dim, n_docs - 1, len(self.vocab) - 1))
+        oversample = min(dim + 10, len(self.vocab))
+        rng = np.random.default_rng(seed)
+        omega = rng.standard_normal((len(self.vocab), oversample)).astype('float32')
+
+        # Range finder with one power iteration: Y = A (A^T (A omega))
+        y = np.zeros((n_docs, oversample), dtype='float32')
+        for start, rows in self._batches(token_lists):
+            y[start:start + len(rows)] = rows @ omega
+        z = np.zeros((len(self.vocab), oversample), dtype='float32')
+        for start, rows in self._batches(token_lists):
+            z += rows.T @ y[start:start + len(rows)]
+        for start, rows in self._batches(token_lists):
+            y[start:start + len(rows)] = rows @ z
+        q, _ = np.linalg.qr(y)
+
+        b = np.zeros((q.shape[1], len(self.vocab)), dtype='float32')
+        for start, rows in self._batches(token_lists):
+            b += q[start:start + len(rows)].T @ rows
+        _, _, vt = np.linalg.svd(b, full_matrices=False)
+        self.components = np.ascontiguousarray(vt[:dim].T, dtype='float32')
+        self.fitted_docs = n_docs
+
+    def embed(self, texts):
+        """Project texts into the fitted space (unit vectors, cosine = inner product)"""
+        rows = self._tfidf_rows([tokenize(t) for t in texts])
+        vectors = rows @ self.components
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return np.ascontiguousarray(vectors / np.maximum(norms, 1e-12), dtype='float32')
+
+    def _new_index(self):
+        dim = self.components.shape[1]
+        if faiss is not None:
+            return faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        return _NumpyIndex(dim)
+
+    # --- Building -----------------------------------------------------------
+    def build(self, properties, documents):
+        """Fit the model and index everything from scratch.
+
+        ``documents`` is an iterable of (agent_id, filename, text). The fit
+        runs on a separate instance, so searches and updates carry on against
+        the current index meanwhile; updates made during the build are
+        replayed onto the new one.
+        """
+        items = [self._property_item(p) for p in properties]
+        for agent_id, filename, text in documents:
+            items.extend(self._document_items(agent_id, filename, text))
+        fresh = SemanticIndex(self.base_path, self.target_dim, self.max_features)
+        fresh.fit([item['text'] for item in items] or ["property"])
+        fresh.index = fresh._new_index()
+        fresh._add(items)
+        with self._lock:
+            pending = self._pending
+            self._take(fresh)
+            self._pending = {}
+            self._replay(pending)
+            self._rebuilt = True
+        print(f"✅ Semantic index built with {len(items)} vectors")
+
+    def _take(self, other):
+        self.vocab, self.idf, self.components = other.vocab, other.idf, other.components
+        self.index, self.entries, self.fitted_docs = other.index, other.entries, other.fitted_docs
+
+    def _replay(self, pending):
+        """Re-apply recorded changes (re-embedding with the current model)"""
+        self._remove([int(id_) for id_, item in pending.items() if item is None])
+        self._add([item for item in pending.values() if item is not None])
+
+    def _property_item(self, prop):
+        return {
+            'id': stable_id(f"property:{prop['id']}"), 'kind': 'property', 'ref': prop['id'],
+            'agent_id': prop.get('agent_id'), 'text': property_text(prop)
+        }
+
+    def _document_items(self, agent_id, filename, text):
+        return [{
+            'id': stable_id(f"document:{agent_id}/{filename}#{i}"), 'kind': 'document',
+            'ref': f"{filename}#{i}", 'agent_id': agent_id, 'text': passage
+        } for i, passage in enumerate(split_passages(text))]
+
+    def _add(self, items):
+        if not items:
+            return
+        vectors = self.embed([item['text'] for item in items])
+        ids = np.array([item['id'] for item in items], dtype='int64')
+        self.index.remove_ids(ids)
+        self.index.add_with_ids(vectors, ids)
+        for item in items:
+            self.entries[str(item['id'])] = {k: item[k] for k in ('kind', 'ref', 'agent_id', 'text')}
+            self._pending[str(item['id'])] = item
+
+    def _remove(self, ids):
+        if ids:
+            self.index.remove_ids(np.array(ids, dtype='int64'))
+            for id_ in ids:
+                self.entries.pop(str(id_), None)
+                self._pending[str(id_)] = None
+
+    # --- Incremental updates --------------------------------------------------
+    def upsert_property(self, prop):
+        """Re-embed one listing; unavailable listings are removed"""
+        if not self.ready:
+            return
+        with self._lock:
+            if prop.get('status') not in (None, 'available'):
+                self._remove([stable_id(f"property:{prop['id']}")])
+            else:
+                self._add([self._property_item(prop)])
+
+    def remove_property(self, property_id):
+        if not self.ready:
+            return
+        with self._lock:
+            self._remove([stable_id(f"property:{property_id}")])
+
+    def upsert_document(self, agent_id, filename, text):
+        """(Re-)index the passages of one uploaded document"""
+        if not self.ready:
+            return
+        with self._lock:
+            self.remove_document(agent_id, filename)
+            self._add(self._document_items(agent_id, filename, text))
+
+    def remove_document(self, agent_id, filename):
+        if not self.ready:
+            return
+        with self._lock:
+            prefix = f"{filename}#"
+            self._remove([int(id_) for id_, e in self.entries.items()
+                          if e['kind'] == 'document' and e['agent_id'] == agent_id and e['ref'].startswith(prefix)])
+
+    # --- Query --------------------------------------------------------------
+    def search(self, query, k=10, kind=None, agent_id=None, min_score=0.05):
+        """Top-k entries for a free-text query, optionally filtered by kind and agent"""
+        if not self.ready or not query.strip():
+            return []
+        with self._lock:
+            total = self.index.ntotal
+            if total == 0:
+                return []
+            vector = self.embed([query])
+            if not vector.any():
+                return []
+            fetch = min(total, k * 4 if kind is None and agent_id is None else max(k * 20, 200))
+            scores, ids = self.index.search(vector, fetch)
+            results = []
+            for score, id_ in zip(scores[0], ids[0]):
+                entry = self.entries.get(str(int(id_)))
+                if entry is None or score < min_score:
+                    continue
+                if kind and entry['kind'] != kind:
+                    continue
+                if agent_id and entry['agent_id'] != agent_id:
+                    continue
+                results.append({**entry, 'score': float(score)})
+                if len(results) >= k:
+                    break
+            return results
+
+    def needs_refit(self):
+        """True once the corpus has grown well past what the SVD was fitted on"""
+        return self.ready and len(self.entries) > max(2 * self.fitted_docs, 100)
+
+    # --- Persistence ----------------------------------------------------------
+    @contextmanager
+    def _file_lock(self, mode):
+        os.makedirs(os.path.dirname(self.base_path) or '.', exist_ok=True)
+        with open(self.base_path + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, mode)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @contextmanager
+    def exclusive_build(self):
+        """Yields True in the one worker that gets to build; others wait for it and get False"""
+        os.makedirs(os.path.dirname(self.base_path) or '.', exist_ok=True)
+        with open(self.base_path + '.build.lock', 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                building = True
+            except BlockingIOError:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                building = False
+            try:
+                yield building
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def disk_generation(self):
+        """Generation of the saved files (0 for files saved before generations existed)"""
+        try:
+            with open(self.base_path + '.generation', encoding='utf-8') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _replace(self, path, write):
+        tmp = f"{path}.{os.getpid()}.tmp{os.path.splitext(path)[1]}"  # np.savez insists on .npz
+        write(tmp)
+        os.replace(tmp, path)
+
+    def save(self):
+        """Write the index, merged with whatever other workers saved since we last loaded"""
+        if not self.ready:
+            return
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            generation = self.disk_generation()
+            if generation != self.generation and not self._rebuilt:
+                pending = self._pending
+                if self._load_files():
+                    self._replay(pending)
+            terms = sorted(self.vocab, key=self.vocab.get)
+            self._replace(self.base_path + '.npz', lambda tmp: np.savez(
+                tmp, terms=np.array(terms), idf=self.idf, components=self.components,
+                fitted_docs=np.array([self.fitted_docs])))
+            if faiss is not None:
+                self._replace(self.base_path + '.faiss', lambda tmp: faiss.write_index(self.index, tmp))
+            self._replace(self.base_path + '.json', lambda tmp: self._write_text(tmp, json.dumps(self.entries)))
+            self.generation = generation + 1
+            self._replace(self.base_path + '.generation', lambda tmp: self._write_text(tmp, str(self.generation)))
+            self._pending = {}
+            self._rebuilt = False
+
+    @staticmethod
+    def _write_text(path, text):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def _load_files(self):
+        try:
+            model = np.load(self.base_path + '.npz')
+            with open(self.base_path + '.json', 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return False
+        self.vocab = {str(t): i for i, t in enumerate(model['terms'])}
+        self.idf = model['idf']
+        self.components = model['components']
+        self.fitted_docs = int(model['fitted_docs'][0])
+        self.entries = entries
+        self.generation = self.disk_generation()
+        if faiss is not None and os.path.exists(self.base_path + '.faiss'):
+            self.index = faiss.read_index(self.base_path + '.faiss')
+        else:
+            # Re-embed from the stored texts
+            self.index = self._new_index()
+            items = [{'id': int(id_), **e} for id_, e in entries.items()]
+            self.entries = {}
+            self._add(items)
+        self._pending = {}
+        return True
+
+    def load(self):
+        """Load a previously saved index, keeping unsaved local changes; returns False if none exists"""
+        with self._lock, self._file_lock(fcntl.LOCK_SH):
+            pending = self._pending
+            if not self._load_files():
+                return False
+            self._replay(pending)
+            self._rebuilt = False
+        return True
+
+    def refresh(self, interval=30):
+        """Reload if another worker saved since we last looked (checked at most every ``interval`` s)"""
+        now = time.monotonic()
+        if now - self._checked_at < interval:
+            return
+        self._checked_at = now
+        if self.ready and not self._rebuilt and self.disk_generation() != self.generation:
+            self.load()
@@ -0,0 +1,141 @@
+# singleflight.py - merge identical concurrent computations onto one in-flight call
+import json
+import time
+import uuid
+import threading
+
+
+class Flight:
+    """One in-flight computation; waiters block on ``done``"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key.
+
+    Within a process the first caller (the leader) runs the computation and
+    every caller arriving meanwhile waits for, and shares, its result or
+    exception. Across workers a Redis ``SET NX`` lock elects one leader per
+    key; the others poll for the JSON result it publishes for
+    ``result_ttl`` seconds, and compute it themselves if the lock goes away
+    without one (leader crashed) or they time out. Without Redis only the
+    in-process half applies.
+    """
+
+    def __init__(self, redis_client=None, namespace='singleflight', lock_ttl=150, result_ttl=30,
+                 poll_interval=0.1):
+        self.redis = redis_client
+        self.namespace = namespace
+        self.lock_ttl = lock_ttl
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.counts = {'leaders': 0, 'shared': 0, 'remote_shared': 0, 'redis_errors': 0}
+
+    def _redis_call(self, method, *args, **kwargs):
+        if self.redis is None:
+            return None
+        try:
+            return getattr(self.redis, method)(*args, **kwargs)
+        except Exception as e:
+            self.counts['redis_errors'] += 1
+            print(f"⚠️ Single-flight Redis error ({method}): {e}")
+            return None
+
+    # ─── In-process ──────────────────────────────────────────────────────────
+    def begin(self, key):
+        """(flight, is_leader); the leader must call ``finish`` exactly once"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.waiters += 1
+                self.counts['shared'] += 1
+                return flight, False
+            flight = self._flights[key] = Flight()
+            self.counts['leaders'] += 1
+            return flight, True
+
+    def finish(self, key, flight, result=None, error=None):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.result, flight.error = result, error
+        flight.done.set()
+
+    def wait(self, flight, timeout=None):
+        """Result of a flight led by someone else (raises its error, or TimeoutError)"""
+        if not flight.done.wait(timeout):
+            raise TimeoutError("timed out waiting for an identical in-flight request")
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def do(self, key, fn, *args, **kwargs):
+        """``fn(*args, **kwargs)``, shared with every concurrent caller using ``key``"""
+        flight, leader = self.begin(key)
+        if not leader:
+            return self.wait(flight, self.lock_ttl)
+        try:
+            result = self._across_workers(key, fn, args, kwargs)
+        except Exception as e:
+            self.finish(key, flight, error=e)
+            raise
+        self.finish(key, flight, result)
+        return result
+
+    # ─── Across workers ──────────────────────────────────────────────────────
+    def _across_workers(self, key, fn, args, kwargs):
+        if self.redis is None:
+            return fn(*args, **kwargs)
+        lock_key, result_key = f"{self.namespace}:lock:{key}", f"{self.namespace}:result:{key}"
+        token = uuid.uuid4().hex
+        try:
+            acquired = self.redis.set(lock_key, token, nx=True, ex=self.lock_ttl)
+        except Exception as e:
+            self.counts['redis_errors'] += 1
+            print(f"⚠️ Single-flight Redis error (set): {e}")
+            return fn(*args, **kwargs)  # Redis unreachable: behave as if alone
+        if not acquired:
+            shared = self._await_remote(lock_key, result_key)
+            if shared is not None:
+                self.counts['remote_shared'] += 1
+                return shared[0]
+            return fn(*args, **kwargs)
+
+        try:
+            result = fn(*args, **kwargs)
+            try:
+                payload = json.dumps({'result': result})
+            except (TypeError, ValueError):
+                payload = None  # not shareable across workers; waiters compute their own
+            if payload is not None:
+                self._redis_call('setex', result_key, self.result_ttl, payload.encode('utf-8'))
+            return result
+        finally:
+            owner = self._redis_call('get', lock_key)
+            if owner in (token, token.encode('utf-8')):
+                self._redis_call('delete', lock_key)
+
+    def _await_remote(self, lock_key, result_key):
+        """(result,) published by the leading worker, or None if it never came"""
+        deadline = time.monotonic() + self.lock_ttl
+        while time.monotonic() < deadline:
+            payload = self._redis_call('get', result_key)
+            if payload is not None:
+                return (json.loads(payload)['result'],)
+            if not self._redis_call('exists', lock_key):
+                payload = self._redis_call('get', result_key)
+                return (json.loads(payload)['result'],) if payload is not None else None
+            time.sleep(self.poll_interval)
+        return None
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._flights)
+        return {**self.counts, 'in_flight': in_flight, 'redis': self.redis is not None}
@@ -0,0 +1,36 @@
+# Tests import the app's flat modules (agent_tools, intent_router, ...) directly
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_openai import FakeOpenAIServer
+
+
+@pytest.fixture(scope='session')
+def openai_server():
+    """One fake OpenAI server for the session; tests set ``reply``/``faults`` as they need"""
+    server = FakeOpenAIServer().start()
+    os.environ['OPENAI_BASE_URL'] = server.base_url
+    os.environ['OPENAI_API_KEY'] = 'test'
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def fake_openai(openai_server):
+    openai_server.reply, openai_server.faults, openai_server.retry_after = None, [], None
+    openai_server.requests.clear()
+    openai_server.first_token_delay = openai_server.chunk_delay = 0.0
+    yield openai_server
+    openai_server.reply, openai_server.faults, openai_server.retry_after = None, [], None
+
+
+@pytest.fixture(scope='session')
+def wpb(openai_server, tmp_path_factory):
+    """The Flask app, imported with its relative SQLite files in a scratch directory"""
+    os.chdir(tmp_path_factory.mktemp('app'))
+    import WPB
+    return WPB
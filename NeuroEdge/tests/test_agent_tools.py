@@ -0,0 +1,42 @@
+from agent_tools import is_listings_export, search_properties, TOOL_RESULT_TOKEN_BUDGET
+from context_packer import estimate_tokens
+
+
+def test_underscore_listings_export():
+    assert is_listings_export("eeacdc24_Sergej_listings.txt")
+
+
+def test_hyphenated_listings_export():
+    assert is_listings_export("1f2e_Christopher-listings.txt")
+    assert is_listings_export("9a0b_Simone-Listings.TXT")
+
+
+def test_other_documents_are_kept():
+    assert not is_listings_export("16a1dd91_Real_Estate_Selling_Process.txt")
+    assert not is_listings_export("listings_overview.pdf")
+
+
+class FakeDB:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def search_properties(self, query, max_results, agent=None):
+        return self.rows[:max_results]
+
+
+def listing(i, description_words=0):
+    return {'id': f'NE-{i:03d}', 'title': f'Family house {i} ' + 'spacious ' * description_words,
+            'price': 1000000 + i, 'bedrooms': 3, 'location': 'Eros', 'agent_id': 'a'}
+
+
+def test_search_results_fit_the_token_budget():
+    rows = [listing(i, description_words=60) for i in range(8)]
+    table = search_properties(FakeDB(rows), 'a', query='family house', max_results=8)
+    assert estimate_tokens(table) <= TOOL_RESULT_TOKEN_BUDGET + 10
+    assert "more not shown" in table
+
+
+def test_small_search_results_are_complete():
+    table = search_properties(FakeDB([listing(i) for i in range(3)]), 'a', query='house')
+    assert all(f'NE-{i:03d}' in table for i in range(3))
+    assert "more not shown" not in table
@@ -0,0 +1,82 @@
+import json
+import re
+
+import pytest
+
+BASE = 'https://localhost'
+AGENT = 'Sergej-AI'
+
+
+def events(body):
+    """[(event, data)] parsed from an SSE body"""
+    return [(m.group(1), json.loads(m.group(2)))
+            for m in re.finditer(r"^event: (.*)\ndata: (.*)\n\n", body, re.M)]
+
+
+@pytest.fixture
+def client(wpb, fake_openai, monkeypatch, tmp_path):
+    # No document retrieval: the prompt is just the agent's instructions and the chat
+    empty_index = wpb.SemanticIndex(str(tmp_path / 'semantic_index'))
+    monkeypatch.setattr(wpb, 'get_semantic_index', lambda: empty_index)
+    wpb.response_cache.clear()
+    return wpb.app.test_client()
+
+
+def stream(client, text):
+    response = client.post(f'{BASE}/chat/{AGENT}/stream', data={'user_input': text})
+    body = response.get_data(as_text=True)
+    response.close()
+    return response, events(body)
+
+
+def stored_history(wpb, client):
+    with client.session_transaction() as sess:
+        conversation_id = sess['conversations'][AGENT]
+    return wpb.conversation_store.load(conversation_id, AGENT)['history']
+
+
+def test_tokens_are_relayed_and_the_reply_stored(wpb, fake_openai, client):
+    fake_openai.reply = "The transfer duty on a N$2m home is about N$60k."
+    response, frames = stream(client, "How much transfer duty would I pay on a N$2m home? (stream-ok)")
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    kinds = [kind for kind, _ in frames]
+    assert kinds[-1] == 'done' and set(kinds[:-1]) == {'token'} and len(kinds) > 3
+    assert "".join(data['delta'] for kind, data in frames if kind == 'token') == fake_openai.reply
+    assert frames[-1][1]['content'] == fake_openai.reply
+    assert fake_openai.requests[-1]['stream'] is True
+
+    history = stored_history(wpb, client)
+    assert [m['role'] for m in history[-2:]] == ['user', 'assistant']
+    assert history[-1]['content'] == fake_openai.reply
+    assert wpb.single_flight.stats()['in_flight'] == 0
+    assert wpb.llm_gate.stats()['in_flight'] == 0
+
+
+def test_mid_stream_fault_is_reported_and_not_cached(wpb, fake_openai, client):
+    fake_openai.reply = "Bond approval usually takes two to three weeks with most banks."
+    fake_openai.faults = ['midstream']
+    question = "How long does bond approval take? (stream-fault)"
+    _, frames = stream(client, question)
+
+    tokens = "".join(data['delta'] for kind, data in frames if kind == 'token')
+    assert tokens and fake_openai.reply.startswith(tokens) and tokens != fake_openai.reply
+    kind, data = frames[-1]
+    assert kind == 'done' and data['content'].startswith(tokens.strip()) and 'API error' in data['content']
+    assert 'API error' in stored_history(wpb, client)[-1]['content']
+    assert wpb.single_flight.stats()['in_flight'] == 0
+    assert wpb.llm_gate.stats()['in_flight'] == 0
+
+    # The broken reply was not cached: asking again goes back to the model
+    calls = len(fake_openai.requests)
+    _, frames = stream(wpb.app.test_client(), question)
+    assert len(fake_openai.requests) == calls + 1
+    assert frames[-1][1]['content'] == fake_openai.reply
+
+
+def test_upstream_failure_before_any_token_is_an_error_event(wpb, fake_openai, client):
+    fake_openai.faults = [400]  # not retryable
+    _, frames = stream(client, "Is the market in Eros cooling down? (stream-error)")
+    assert [kind for kind, _ in frames] == ['error']
+    assert wpb.single_flight.stats()['in_flight'] == 0
+    assert wpb.llm_gate.stats()['in_flight'] == 0
@@ -0,0 +1,114 @@
+import os
+
+import sqlite3
+
+from chunk_store import ChunkStore, chunk_text, fts_query
+from document_store import DocumentStore
+from text_extraction import SUPPORTED_EXTENSIONS, TextExtractor, extension
+
+
+def rows(store, table, agent_id, filename):
+    conn = sqlite3.connect(store.db_path)
+    try:
+        return conn.execute(f'SELECT COUNT(*) FROM {table} WHERE agent_id = ? AND filename = ?',
+                            (agent_id, filename)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def counting(read):
+    calls = []
+
+    def wrapped(path):
+        calls.append(path)
+        return read(path)
+    return wrapped, calls
+
+
+def test_corrupt_pdf_is_recorded_and_not_retried_until_it_changes(tmp_path):
+    folder = tmp_path / 'uploads' / 'NE001'
+    folder.mkdir(parents=True)
+    pdf = folder / 'broken.pdf'
+    pdf.write_bytes(b'%PDF-1.4 this is not really a pdf \x00\xff')
+    store = ChunkStore(str(tmp_path / 'chunks.db'))
+    documents = DocumentStore(str(tmp_path / 'uploads'), revalidate_after=0, reader=TextExtractor().read,
+                              allowed=lambda name: extension(name) in SUPPORTED_EXTENSIONS)
+    read, calls = counting(documents.read)
+
+    assert store.sync(documents.iter_files('NE001'), read, documents.stamp, agent_id='NE001') == 0
+    assert len(calls) == 1
+    assert store.stats()['failed'] == 1 and store.stats()['chunks'] == 0
+
+    store.sync(documents.iter_files('NE001'), read, documents.stamp, agent_id='NE001')
+    assert len(calls) == 1  # same stamp: not read again
+
+    st = os.stat(pdf)
+    os.utime(pdf, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    store.sync(documents.iter_files('NE001'), read, documents.stamp, agent_id='NE001')
+    assert len(calls) == 2
+
+
+def test_ingest_clears_a_recorded_failure(tmp_path):
+    store = ChunkStore(str(tmp_path / 'chunks.db'))
+    store.mark_failed('NE001', 'notes.txt', (1, 2, 3), 'unreadable')
+    store.ingest('NE001', 'notes.txt', 'The villa has a heated pool.', (1, 2, 4))
+    assert store.stats() == {'documents': 1, 'chunks': 1, 'failed': 0, 'fts5': store.fts}
+
+
+def test_chunks_overlap_and_end_on_sentence_boundaries():
+    text = " ".join(f"Sentence number {i} describes the house." for i in range(60))
+    chunks = chunk_text(text, size=200, overlap=50)
+    assert len(chunks) > 1
+    assert chunks[0][0] == 0 and chunks[-1][1] == len(text)
+    for (_, end, chunk), (next_start, _, _) in zip(chunks, chunks[1:]):
+        assert chunk.endswith('.')
+        assert next_start < end  # windows overlap
+    assert all(len(chunk) <= 200 for _, _, chunk in chunks)
+
+
+def test_short_text_is_a_single_chunk():
+    assert chunk_text('A small flat.') == [(0, 13, 'A small flat.')]
+    assert chunk_text('') == []
+
+
+def test_fts_query_quotes_terms():
+    assert fts_query('pool* AND "garden" -x') == '"and" OR "garden" OR "pool"'
+
+
+def test_search_ranks_the_most_relevant_chunk_first(tmp_path):
+    store = ChunkStore(str(tmp_path / 'chunks.db'), chunk_chars=120, overlap=20)
+    store.ingest('NE001', 'villa.txt', 'The villa has a heated pool and a pool house. Pool maintenance is included.')
+    store.ingest('NE001', 'flat.txt', 'The flat is close to the metro. A communal pool is shared with neighbours.')
+    store.ingest('NE001', 'farm.txt', 'The farmhouse comes with olive groves and a barn.')
+    store.ingest('NE002', 'other.txt', 'Another agent\'s pool pool pool listing.')
+
+    results = store.search('NE001', 'pool')
+    assert [r['filename'] for r in results] == ['villa.txt', 'flat.txt']
+    assert results[0]['score'] > results[1]['score']
+    assert store.search('NE001', 'olive barn')[0]['filename'] == 'farm.txt'
+    assert store.search('NE001', '?!') == []
+
+
+def test_reingest_replaces_old_chunks(tmp_path):
+    store = ChunkStore(str(tmp_path / 'chunks.db'), chunk_chars=60, overlap=10)
+    first = store.ingest('NE001', 'notes.txt', 'Old text about a garden. ' * 10)
+    assert rows(store, store.table, 'NE001', 'notes.txt') == first > 1
+    assert store.ingest('NE001', 'notes.txt', 'New text about a terrace.') == 1
+    assert rows(store, store.table, 'NE001', 'notes.txt') == 1
+    assert store.search('NE001', 'garden') == []
+    assert store.search('NE001', 'terrace')[0]['text'] == 'New text about a terrace.'
+
+
+def test_removed_documents_lose_their_rows(tmp_path):
+    store = ChunkStore(str(tmp_path / 'chunks.db'))
+    store.ingest('NE001', 'keep.txt', 'Sea views from the terrace.', (1, 1, 1))
+    store.ingest('NE001', 'drop.txt', 'Sea views from the balcony.', (2, 2, 2))
+    store.remove('NE001', 'drop.txt')
+    assert rows(store, store.table, 'NE001', 'drop.txt') == 0
+    assert rows(store, 'documents', 'NE001', 'drop.txt') == 0
+    assert [r['filename'] for r in store.search('NE001', 'sea views')] == ['keep.txt']
+
+    # sync drops documents that are no longer on disk
+    store.sync([], read_text=None, stamp_of=None, agent_id='NE001')
+    assert store.stats()['documents'] == 0
+    assert rows(store, store.table, 'NE001', 'keep.txt') == 0
@@ -0,0 +1,20 @@
+from context_packer import build_document_context, estimate_tokens
+
+
+def test_document_context_ranks_dedupes_and_keeps_reading_order():
+    snippets = [
+        {'text': 'Transfer duty is payable on homes above N$1.1m.', 'source': 'faq.txt@0', 'boost': 1.0, 'order': 0},
+        {'text': 'Office hours are 8 to 5 on weekdays.', 'source': 'faq.txt@60', 'boost': 0.5, 'order': 1},
+        {'text': 'Bond registration takes about three weeks after transfer duty is paid.',
+         'source': 'faq.txt@120', 'boost': 1.0, 'order': 2},
+        {'text': 'Transfer duty is payable on homes above N$1.1m.', 'source': 'semantic#3', 'boost': 2.0},
+    ]
+    budget = estimate_tokens(snippets[0]['text']) + estimate_tokens(snippets[2]['text'])
+    text, used = build_document_context('how much transfer duty', snippets, budget)
+    assert text == ("[faq.txt@0]\nTransfer duty is payable on homes above N$1.1m.\n\n"
+                    "[faq.txt@120]\nBond registration takes about three weeks after transfer duty is paid.")
+    assert used == budget
+
+
+def test_document_context_without_snippets_is_empty():
+    assert build_document_context('anything', []) == ('', 0)
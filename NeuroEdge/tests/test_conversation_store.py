@@ -0,0 +1,80 @@
+from conversation_store import ConversationStore, merge_state
+
+BASE = 'https://localhost'
+AGENT = 'Sergej-AI'
+
+
+def test_conversation_is_stored_from_its_first_message(tmp_path):
+    store = ConversationStore(str(tmp_path / 'conversations.db'))
+    data = store.create('NE001')
+    data.save()
+    assert store.stats() == {'conversations': 0, 'messages': 0}
+    assert store.load(data.id) is None
+
+    data['history'].append({'role': 'user', 'content': 'Any villas in Swakopmund?'})
+    assert store.stats() == {'conversations': 1, 'messages': 1}
+    loaded = store.load(data.id, 'NE001')
+    assert [m['content'] for m in loaded['history']] == ['Any villas in Swakopmund?']
+    assert store.load(data.id, 'NE002') is None
+
+
+def test_window_and_pages(tmp_path):
+    store = ConversationStore(str(tmp_path / 'conversations.db'), window_limit=3)
+    data = store.create('NE001')
+    for i in range(5):
+        data['history'].append({'role': 'user', 'content': f'message {i}'})
+    del data['history'][:1]
+    data.save()
+
+    loaded = store.load(data.id)
+    assert [m['content'] for m in loaded['history']] == ['message 2', 'message 3', 'message 4']
+    messages, more = store.page(data.id, before_id=loaded['history'][0]['id'], limit=1)
+    assert [m['content'] for m in messages] == ['message 1'] and more
+
+
+def test_concurrent_turns_merge_their_state(tmp_path):
+    store = ConversationStore(str(tmp_path / 'conversations.db'))
+    data = store.create('NE001')
+    data['history'].append({'role': 'user', 'content': 'hello'})
+    data['pending_jobs'] = ['job-0']
+    data.save()
+
+    first, second = store.load(data.id), store.load(data.id)
+    first['pending_jobs'] = ['job-0', 'job-1']
+    first['summary'] = 'Asked about villas.'
+    second['pending_jobs'] = ['job-2']  # finished job-0, started job-2
+    first.save()
+    second.save()
+
+    stored = store.load(data.id)
+    assert stored['pending_jobs'] == ['job-1', 'job-2']
+    assert stored['summary'] == 'Asked about villas.'
+    assert stored.version == second.version == 3
+
+
+def test_stale_state_save_is_refused(tmp_path):
+    store = ConversationStore(str(tmp_path / 'conversations.db'))
+    data = store.create('NE001')
+    assert store.save_state(data.id, {'summary': 'a'}, 0, 'NE001') == 1
+    assert store.save_state(data.id, {'summary': 'b'}, 0, 'NE001') is None
+    assert store.load_state(data.id) == ({'summary': 'a'}, 1)
+
+
+def test_merge_state():
+    base = {'summary': 'old', 'window_start': 5, 'summary_job': {'id': 'j'}}
+    ours = {'summary': 'new', 'window_start': 9}
+    theirs = {'summary': 'old', 'window_start': 12, 'summary_job': {'id': 'j'}, 'pending_jobs': ['x']}
+    assert merge_state(base, ours, theirs) == {'summary': 'new', 'window_start': 12, 'pending_jobs': ['x']}
+
+
+def test_viewing_the_chat_page_stores_no_conversation(wpb):
+    client = wpb.app.test_client()
+    before = wpb.conversation_store.stats()['conversations']
+    for _ in range(3):
+        assert client.get(f'{BASE}/chat/{AGENT}').status_code == 200
+    assert wpb.conversation_store.stats()['conversations'] == before
+    with client.session_transaction() as sess:
+        first_id = sess['conversations'][AGENT]
+    client.get(f'{BASE}/chat/{AGENT}')
+    with client.session_transaction() as sess:
+        assert sess['conversations'][AGENT] == first_id  # the unsaved id is kept, not replaced
@@ -0,0 +1,58 @@
+import os
+
+from document_store import DocumentStore, read_utf8
+
+
+def store_with_file(tmp_path, **kwargs):
+    folder = tmp_path / 'NE001'
+    folder.mkdir()
+    path = folder / 'notes.txt'
+    path.write_text('Heated pool, sea views.', encoding='utf-8')
+    reads = []
+
+    def reader(p):
+        reads.append(p)
+        return read_utf8(p)
+    return DocumentStore(str(tmp_path), reader=reader, **kwargs), str(path), reads
+
+
+def bump_mtime(path):
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def test_unchanged_file_is_not_read_again(tmp_path):
+    store, path, reads = store_with_file(tmp_path, revalidate_after=0)
+    assert store.read(path) == 'Heated pool, sea views.'
+    assert store.read(path) == 'Heated pool, sea views.'
+    assert len(reads) == 1
+    assert store.hits == 1 and store.misses == 1
+
+
+def test_touched_file_is_read_again(tmp_path):
+    store, path, reads = store_with_file(tmp_path, revalidate_after=0)
+    store.read(path)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('Heated pool, sea views, garage.')
+    bump_mtime(path)
+    assert store.read(path) == 'Heated pool, sea views, garage.'
+    assert len(reads) == 2
+
+
+def test_stat_is_skipped_within_the_revalidation_window(tmp_path):
+    store, path, reads = store_with_file(tmp_path, revalidate_after=60)
+    store.read(path)
+    bump_mtime(path)
+    store.read(path)
+    assert len(reads) == 1  # not revalidated yet
+    store.invalidate(path)
+    store.read(path)
+    assert len(reads) == 2
+
+
+def test_deleted_file_drops_out_of_listing(tmp_path):
+    store, path, reads = store_with_file(tmp_path, revalidate_after=0)
+    assert store.documents('NE001') == [('notes.txt', 'Heated pool, sea views.')]
+    os.remove(path)
+    assert store.agent_files('NE001') == []
+    assert store.documents('NE001') == []
@@ -0,0 +1,42 @@
+from flask import Flask, jsonify
+
+from http_cache import conditional, etag_for, init_compression
+
+app = Flask(__name__)
+init_compression(app, min_size=10)
+TAG = etag_for('test', 1)
+
+
+@app.route('/strong')
+def strong():
+    return conditional(TAG, lambda: jsonify(items=list(range(100))))
+
+
+@app.route('/weak')
+def weak():
+    return conditional(TAG, lambda: jsonify(items=list(range(100))), weak=True)
+
+
+def test_304_carries_the_encoded_tag_the_client_holds():
+    client = app.test_client()
+    first = client.get('/strong', headers={'Accept-Encoding': 'gzip'})
+    assert first.headers['ETag'] == f'"{TAG}-gzip"'
+    again = client.get('/strong', headers={'Accept-Encoding': 'gzip', 'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert again.headers['ETag'] == first.headers['ETag']
+
+
+def test_weak_tag_is_shared_by_all_encodings():
+    client = app.test_client()
+    first = client.get('/weak', headers={'Accept-Encoding': 'gzip'})
+    assert first.headers['Content-Encoding'] == 'gzip'
+    assert first.headers['ETag'] == f'W/"{TAG}"'
+    again = client.get('/weak', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert again.headers['ETag'] == f'W/"{TAG}"'
+
+
+def test_changed_entity_is_rebuilt():
+    client = app.test_client()
+    response = client.get('/strong', headers={'If-None-Match': f'"{etag_for("test", 0)}"'})
+    assert response.status_code == 200
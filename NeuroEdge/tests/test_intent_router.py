@@ -0,0 +1,49 @@
+import pytest
+
+from intent_router import IntentRouter, FAQ, GREETING, CONTACT, LISTING, OPEN
+
+AGENT = 'Sergej-AI'
+CONTACT_ANSWER = "You can reach Sergej-AI on +264 85 749 4061 or at sergej@example.com."
+
+
+@pytest.fixture
+def router():
+    router = IntentRouter()
+    router.add_faq(["what is your phone number", "how can I contact you", "what is your email address",
+                    "what is your email", "how do I reach you", "what is your contact number"],
+                   CONTACT_ANSWER, AGENT)
+    router.add_faq(["what do you specialise in", "what is your specialty"], "Smart homes.", AGENT)
+    return router
+
+
+@pytest.mark.parametrize('text', [
+    "What is your phone number?",
+    "how can I contact you",
+    "what's your email",
+    "hi, what is your contact number please",
+])
+def test_contact_questions_get_the_cached_answer(router, text):
+    intent, _, answer = router.classify(AGENT, text)
+    assert intent == FAQ
+    assert answer == CONTACT_ANSWER
+
+
+@pytest.mark.parametrize('text', [
+    "what is the address of the house",
+    "how can I contact the seller directly",
+])
+def test_open_questions_are_not_routed_to_faqs(router, text):
+    intent, _, answer = router.classify(AGENT, text)
+    assert intent != FAQ
+    assert answer is None
+
+
+def test_faqs_of_other_agents_do_not_match(router):
+    assert router.match_faq('Obert Nortje-AI', "what is your phone number") == (None, 0.0)
+
+
+def test_rules_and_listings(router):
+    assert router.classify(AGENT, "Hello there!")[0] == GREETING
+    assert router.classify(AGENT, "I'd like to leave my details")[0] == CONTACT
+    assert router.classify(AGENT, "show me your 3 bedroom houses in Eros")[0] == LISTING
+    assert router.classify(AGENT, "how does the transfer process work")[0] == OPEN
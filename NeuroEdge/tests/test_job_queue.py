@@ -0,0 +1,33 @@
+import time
+
+from job_queue import JobQueue, RUNNING, DONE, FAILED
+
+
+def test_long_job_is_not_reported_interrupted(tmp_path):
+    jobs = JobQueue(str(tmp_path / 'jobs.db'), max_workers=1, stale_after=0.3)
+    job_id = jobs.submit('slow', time.sleep, 1.0)
+    time.sleep(0.7)
+    assert jobs.get(job_id)['status'] == RUNNING
+    jobs.pool.shutdown(wait=True)
+    assert jobs.get(job_id)['status'] == DONE
+
+
+def test_queued_job_waiting_for_a_thread_stays_alive(tmp_path):
+    jobs = JobQueue(str(tmp_path / 'jobs.db'), max_workers=1, stale_after=0.3)
+    jobs.submit('slow', time.sleep, 0.8)
+    waiting = jobs.submit('quick', lambda: 'ok')
+    time.sleep(0.6)
+    assert jobs.get(waiting)['status'] != FAILED
+    jobs.pool.shutdown(wait=True)
+    assert jobs.get(waiting)['result'] == 'ok'
+
+
+def test_job_without_heartbeat_is_interrupted(tmp_path):
+    jobs = JobQueue(str(tmp_path / 'jobs.db'), stale_after=0.3)
+    job_id = jobs.submit('slow', time.sleep, 0)
+    jobs.pool.shutdown(wait=True)
+    conn = jobs._connect()  # as if its worker died mid-call
+    conn.execute('UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?', (RUNNING, time.time() - 1, job_id))
+    conn.commit()
+    conn.close()
+    assert jobs.get(job_id)['error'] == 'Job was interrupted'
@@ -0,0 +1,112 @@
+import time
+
+import openai
+import pytest
+
+from llm_client import ResilientClient, CircuitBreaker, CircuitOpenError, DeadlineExceeded, CLOSED, OPEN, HALF_OPEN
+
+MESSAGES = [{'role': 'user', 'content': 'hello'}]
+
+
+def resilient(server, **options):
+    api = openai.OpenAI(base_url=server.base_url, api_key='test', max_retries=0)
+    return ResilientClient(create=lambda **kwargs: api.chat.completions.create(**kwargs), **options)
+
+
+def ask(client, **kwargs):
+    return client.complete(model='gpt-4o-mini', messages=MESSAGES, timeout=10, **kwargs).choices[0].message.content
+
+
+def test_retries_5xx_until_an_answer(fake_openai):
+    fake_openai.faults = [500, 502, None]
+    client = resilient(fake_openai, max_retries=2, base_delay=0.01)
+    assert ask(client) == "You said: hello"
+    assert len(fake_openai.requests) == 3
+    assert client.counts['retries'] == 2
+
+
+def test_429_waits_as_long_as_retry_after_says(fake_openai):
+    fake_openai.faults, fake_openai.retry_after = [429, None], 0.4
+    client = resilient(fake_openai, base_delay=5.0, max_delay=5.0)  # without the header: up to 5s
+    started = time.monotonic()
+    assert ask(client) == "You said: hello"
+    assert 0.4 <= time.monotonic() - started < 1.5
+
+
+def test_client_errors_are_not_retried(fake_openai):
+    fake_openai.faults = [400]
+    client = resilient(fake_openai, base_delay=0.01)
+    with pytest.raises(openai.BadRequestError):
+        ask(client)
+    assert len(fake_openai.requests) == 1
+    assert client.breaker.state == CLOSED
+
+
+def test_breaker_opens_after_threshold_then_recovers_half_open(fake_openai):
+    breaker = CircuitBreaker(failure_threshold=2, reset_after=0.3)
+    client = resilient(fake_openai, max_retries=0, breaker=breaker)
+    fake_openai.faults = [500, 500]
+    for _ in range(2):
+        with pytest.raises(openai.InternalServerError):
+            ask(client)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        ask(client)
+    assert len(fake_openai.requests) == 2  # failed fast, nothing sent
+
+    time.sleep(0.35)
+    assert breaker.state == HALF_OPEN
+    assert ask(client) == "You said: hello"
+    assert breaker.state == CLOSED and breaker.trips == 1
+
+
+def test_failed_probe_reopens_the_circuit(fake_openai):
+    breaker = CircuitBreaker(failure_threshold=1, reset_after=0.2)
+    client = resilient(fake_openai, max_retries=0, breaker=breaker)
+    fake_openai.faults = [503, 503]
+    with pytest.raises(openai.InternalServerError):
+        ask(client)
+    time.sleep(0.25)
+    with pytest.raises(openai.InternalServerError):
+        ask(client)  # the half-open probe
+    assert breaker.state == OPEN and breaker.trips == 2
+
+
+def test_hedged_request_wins_against_a_slow_primary(fake_openai):
+    client = resilient(fake_openai, hedge_percentile=50, hedge_min_samples=3)
+    for _ in range(3):
+        client.latency.record(0.05)
+    fake_openai.faults = [2.0, None]  # the first request stalls for 2s
+    started = time.monotonic()
+    assert ask(client) == "You said: hello"
+    assert time.monotonic() - started < 1.0
+    assert client.counts['hedges'] == 1 and client.counts['hedge_wins'] == 1
+
+
+def test_deadline_bounds_a_slow_answer(fake_openai):
+    fake_openai.faults = [3.0, 3.0, 3.0]
+    client = resilient(fake_openai, max_retries=2, base_delay=0.01)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        ask(client, deadline=0.5)
+    assert time.monotonic() - started < 1.0
+
+
+def test_deadline_skips_a_retry_that_would_not_fit(fake_openai):
+    fake_openai.faults, fake_openai.retry_after = [503, None], 2
+    client = resilient(fake_openai, max_retries=2)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        ask(client, deadline=1.0)
+    assert time.monotonic() - started < 0.5
+    assert len(fake_openai.requests) == 1
+
+
+def test_deadline_bounds_hedged_requests(fake_openai):
+    client = resilient(fake_openai, hedge_percentile=50, hedge_min_samples=1)
+    client.latency.record(0.05)
+    fake_openai.faults = [3.0, 3.0]
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        ask(client, deadline=0.5)
+    assert time.monotonic() - started < 1.0
@@ -0,0 +1,128 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from metrics import Metrics, percentile
+
+
+class FakeRedis:
+    """Sets and hashes behind a pipeline; ``down`` makes every command fail"""
+
+    def __init__(self):
+        self.sets, self.hashes = {}, {}
+        self.down = False
+        self.pipelines = 0
+
+    def _check(self):
+        if self.down:
+            raise ConnectionError('redis is down')
+
+    def pipeline(self, transaction=False):
+        self.pipelines += 1
+        ops, redis = [], self
+
+        class Pipe:
+            def __getattr__(self, name):
+                return lambda *args: ops.append((name, args))
+
+            def execute(self):
+                redis._check()
+                for name, args in ops:
+                    getattr(redis, name)(*args)
+        return Pipe()
+
+    def sadd(self, key, member):
+        self.sets.setdefault(key, set()).add(member)
+
+    def hincrby(self, key, field, amount):
+        values = self.hashes.setdefault(key, {})
+        values[field] = values.get(field, 0) + amount
+
+    hincrbyfloat = hincrby
+
+    def smembers(self, key):
+        self._check()
+        return self.sets.get(key, set())
+
+    def hgetall(self, key):
+        self._check()
+        return dict(self.hashes.get(key, {}))
+
+
+def test_percentile_interpolates_within_a_bucket():
+    assert percentile((1, 2, 4), [2, 2, 0, 0], 50) == 1.0
+    assert percentile((1, 2, 4), [2, 2, 0, 0], 75) == 1.5
+    assert percentile((1, 2, 4), [0, 0, 0, 3], 99) == 4  # +Inf bucket: highest finite bound
+    assert percentile((1, 2, 4), [0, 0, 0, 0], 50) is None
+
+
+def test_summary_per_agent():
+    metrics = Metrics(buckets=(0.1, 1, 10))
+    for seconds in (0.05, 0.5, 0.5, 5):
+        metrics.observe('llm_seconds', 'NE001', seconds)
+    metrics.inc('llm_cache_hits', 'NE001', 3)
+    metrics.inc('llm_cache_misses', 'NE001')
+    metrics.record_usage('NE001', 'gpt-4o', SimpleNamespace(prompt_tokens=1000, completion_tokens=500))
+    metrics.inc('db_search_errors', None)
+
+    rows = {row['agent']: row for row in metrics.summary()}
+    assert set(rows) == {'NE001', 'none'}
+    row = rows['NE001']
+    assert row['llm']['count'] == 4 and row['llm']['mean'] == pytest.approx(1.5125)
+    assert row['llm']['p50'] == pytest.approx(0.55)
+    assert row['first_token'] == {'count': 0, 'mean': None, 'p50': None, 'p95': None, 'p99': None}
+    assert (row['prompt_tokens'], row['completion_tokens']) == (1000, 500)
+    assert row['cost_usd'] == pytest.approx(0.0075)
+    assert row['cache_hit_rate'] == 75.0
+    assert rows['none']['db_search_errors'] == 1 and rows['none']['cache_hit_rate'] is None
+
+
+def test_prometheus_histogram_and_counters():
+    metrics = Metrics(buckets=(0.1, 1))
+    agent = 'Ag "x"\\y\nz'
+    for seconds in (0.05, 0.5, 0.7, 3):
+        metrics.observe('llm_seconds', agent, seconds)
+    metrics.inc('llm_errors', agent, 2)
+    lines = metrics.prometheus().splitlines()
+
+    label = 'agent="Ag \\"x\\"\\\\y\\nz"'
+    assert '# TYPE neuroedge_llm_seconds histogram' in lines
+    assert f'neuroedge_llm_seconds_bucket{{{label},le="0.1"}} 1' in lines
+    assert f'neuroedge_llm_seconds_bucket{{{label},le="1.0"}} 3' in lines
+    assert f'neuroedge_llm_seconds_bucket{{{label},le="+Inf"}} 4' in lines
+    assert f'neuroedge_llm_seconds_count{{{label}}} 4' in lines
+    assert f'neuroedge_llm_seconds_sum{{{label}}} 4.25' in lines
+    assert '# TYPE neuroedge_llm_errors_total counter' in lines
+    assert f'neuroedge_llm_errors_total{{{label}}} 2' in lines
+
+
+def test_snapshot_reads_every_worker_from_redis():
+    redis = FakeRedis()
+    first, second = Metrics(redis, buckets=(1,)), Metrics(redis, buckets=(1,))
+    first.observe('llm_seconds', 'a', 0.5)
+    second.observe('llm_seconds', 'a', 2)
+    second.inc('llm_errors', 'a')
+    snapshot = first.snapshot()
+    assert snapshot['source'] == 'redis'
+    assert snapshot['histograms']['llm_seconds']['a'] == {'counts': [1, 1], 'sum': 2.5}
+    assert snapshot['counters'] == {'llm_errors': {'a': 1.0}}
+
+
+def test_redis_outage_warns_once_and_backs_off(capsys):
+    redis = FakeRedis()
+    redis.down = True
+    metrics = Metrics(redis, buckets=(1,), redis_retry_after=0.1)
+    for _ in range(20):
+        metrics.observe('llm_seconds', 'a', 0.5)
+    assert metrics.snapshot()['source'] == 'local'
+    assert metrics.snapshot()['histograms']['llm_seconds']['a']['counts'] == [20, 0]
+    assert redis.pipelines == 1 and metrics.redis_errors == 1
+    assert capsys.readouterr().out.count('Metrics Redis error') == 1
+
+    time.sleep(0.15)
+    redis.down = False
+    metrics.observe('llm_seconds', 'a', 0.5)
+    assert redis.pipelines == 2
+    assert 'reachable again' in capsys.readouterr().out
+    assert metrics.snapshot()['source'] == 'redis'
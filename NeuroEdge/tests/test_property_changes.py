@@ -0,0 +1,44 @@
+import pytest
+
+BASE = 'https://localhost'
+
+
+@pytest.fixture
+def admin(wpb):
+    client = wpb.app.test_client()
+    with client.session_transaction() as sess:
+        sess['admin_logged_in'] = True
+        sess['admin_agency'] = 'NeuroEdge Properties'
+    return client
+
+
+def add_listing(wpb, property_id):
+    wpb.db.add_property({
+        'id': property_id, 'title': 'Garden cottage in Eros', 'description': 'Cosy cottage', 'price': 950000.0,
+        'property_type': 'house', 'bedrooms': 2, 'bathrooms': 1, 'size_sqft': 800, 'location': 'Eros, Windhoek',
+        'features': ['Garden'], 'agent_id': 'NE001'})
+    wpb.property_changed(property_id)
+
+
+def cached_reply_key(wpb):
+    key = wpb.response_cache.key('Sergej-AI', [{'role': 'user', 'content': 'Anything in Eros?'}])
+    wpb.response_cache.set(key, "Yes: the garden cottage in Eros.")
+    return key
+
+
+def test_permanent_delete_drops_cached_replies_of_the_agent(wpb, admin):
+    add_listing(wpb, 'TEST-DEL-1')
+    key = cached_reply_key(wpb)
+    response = admin.post(f'{BASE}/admin/properties', data={'action': 'delete_property', 'delete_id': 'TEST-DEL-1'})
+    assert response.status_code == 302
+    assert wpb.db.get_property_by_id('TEST-DEL-1') is None
+    assert wpb.response_cache.get(key) is None
+
+
+def test_deleting_from_the_trash_drops_cached_replies_of_the_agent(wpb, admin):
+    add_listing(wpb, 'TEST-DEL-2')
+    wpb.db.soft_delete_property('TEST-DEL-2')
+    key = cached_reply_key(wpb)
+    admin.post(f'{BASE}/admin/trash', data={'action': 'permanently_delete_property', 'property_id': 'TEST-DEL-2'})
+    assert wpb.db.get_property_by_id('TEST-DEL-2') is None
+    assert wpb.response_cache.get(key) is None
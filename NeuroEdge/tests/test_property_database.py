@@ -0,0 +1,50 @@
+import pytest
+
+from property_database import PropertyDatabase
+
+LOCATIONS = ['Klein Windhoek', 'Olympia', 'Eros', 'Swakopmund']
+TYPES = ['house', 'apartment', 'townhouse']
+FEATURES = ['Pool', 'Garden', 'Solar Panels', 'Double Garage']
+
+QUERIES = [('pool', 5), ('POOL', 3), ('Garden  House', 10), ('garden house', 4), ('Olympia', 10),
+           ('eros apartment', 10), ('Solar', 2), ('villa', 5), ('a', 10)]
+
+
+@pytest.fixture(scope='module')
+def db(tmp_path_factory):
+    db = PropertyDatabase(str(tmp_path_factory.mktemp('db') / 'properties.db'), 'Test Agency')
+    for i in range(30):
+        db.add_property({
+            'id': f'T-{i:03d}', 'title': f'{TYPES[i % 3].title()} in {LOCATIONS[i % 4]}',
+            'description': 'Near schools' + (' with a large garden' if i % 5 == 0 else ''),
+            'price': 900_000 + i * 37_000, 'property_type': TYPES[i % 3], 'bedrooms': 1 + i % 4,
+            'bathrooms': 1 + i % 2, 'size_sqft': 800 + i * 10, 'location': f'{LOCATIONS[i % 4]}, Namibia',
+            'features': [FEATURES[i % 4], FEATURES[(i + 1) % 4]], 'agent_id': 'NE001'})
+    return db
+
+
+def ids(rows):
+    return [row['id'] for row in rows]
+
+
+@pytest.mark.parametrize('share_scan', [False, True])
+def test_batch_agrees_with_one_by_one_search(db, share_scan):
+    answers = db.search_properties_batch(QUERIES, share_scan=share_scan)
+    for (query, max_results), answer in zip(QUERIES, answers):
+        expected = db.search_properties(query, max_results)
+        assert ids(answer['results']) == ids(expected), query
+        assert [r['relevance_score'] for r in answer['results']] == [r['relevance_score'] for r in expected]
+    assert any(ids(answer['results']) for answer in answers)
+
+
+def test_queries_differing_in_case_share_one_execution(db):
+    pool, upper = db.search_properties_batch([('pool', 5), ('POOL', 3)], share_scan=True)
+    assert not pool['deduplicated'] and upper['deduplicated']
+    assert ids(upper['results']) == ids(pool['results'])[:3]
+
+
+def test_share_scan_falls_back_to_sql_above_the_row_cap(db, monkeypatch):
+    monkeypatch.setattr(db, '_score_in_memory', lambda *args: pytest.fail('inventory should not be scanned'))
+    capped = db.search_properties_batch(QUERIES, share_scan=True, share_scan_max_rows=10)
+    plain = db.search_properties_batch(QUERIES)
+    assert [ids(a['results']) for a in capped] == [ids(a['results']) for a in plain]
@@ -0,0 +1,47 @@
+import pytest
+
+from rate_limit import RateLimiter, ConcurrencyGate, parse_limit
+
+
+def test_parse_limit():
+    assert parse_limit('20/60') == (20 / 60, 20)
+    assert parse_limit('5') == (5.0, 5)
+
+
+def test_bucket_refuses_past_burst_and_says_how_long_to_wait():
+    limiter = RateLimiter()
+    assert [limiter.allow('k', 1.0, 2)[0] for _ in range(3)] == [True, True, False]
+    assert 0 < limiter.allow('k', 1.0, 2)[1] <= 1.0
+
+
+def test_concurrency_gate_releases_once():
+    gate = ConcurrencyGate(1)
+    slot = gate.try_acquire()
+    assert gate.try_acquire() is None
+    slot.release()
+    slot.release()
+    assert gate.stats()['in_flight'] == 0
+
+
+@pytest.fixture
+def tight_search_limit(wpb, monkeypatch):
+    monkeypatch.setattr(wpb, 'rate_limiter', RateLimiter())
+    monkeypatch.setitem(wpb.RATE_LIMITS, 'search', (0.001, 2))
+    monkeypatch.setattr(wpb, 'RATE_LIMIT_IP_FACTOR', 1)
+
+
+def search(wpb, forwarded_for):
+    # No cookies: every request is a new session, as a script ignoring Set-Cookie would be
+    client = wpb.app.test_client(use_cookies=False)
+    return client.get('https://localhost/api/search', headers={'X-Forwarded-For': forwarded_for}).status_code
+
+
+def test_spoofed_forwarded_for_does_not_reset_the_bucket(wpb, tight_search_limit):
+    # The client controls the left-most hop; the proxy appends the real address
+    statuses = [search(wpb, f"203.0.113.{i}, 198.51.100.7") for i in range(4)]
+    assert statuses == [200, 200, 429, 429]
+
+
+def test_other_addresses_have_their_own_bucket(wpb, tight_search_limit):
+    assert [search(wpb, "198.51.100.8") for _ in range(3)] == [200, 200, 429]
+    assert search(wpb, "198.51.100.9") == 200
@@ -0,0 +1,77 @@
+from saved_searches import Percolator, SavedSearchStore, terms_of
+
+VILLA = {'id': 'p1', 'title': 'Sea-facing villa', 'description': 'Three bedrooms and a pool',
+         'location': 'Swakopmund', 'property_type': 'House', 'price': 2_400_000, 'bedrooms': 3,
+         'bathrooms': 2, 'features': '["Pool", "Double garage"]', 'status': 'available'}
+FLAT = {'id': 'p2', 'title': 'Compact flat', 'description': 'Close to the CBD',
+        'location': 'Windhoek', 'property_type': 'Apartment', 'price': 850_000, 'bedrooms': 1,
+        'bathrooms': 1, 'features': [], 'status': 'available'}
+
+
+def percolator(*searches):
+    index = Percolator()
+    for search_id, (query, filters) in enumerate(searches, 1):
+        index.add(search_id, query, filters)
+    return index
+
+
+def test_terms_are_lowercased_and_lightly_stemmed():
+    assert terms_of('Villas with Pools in WINDHOEK, 3 bedrooms') == {
+        'villa', 'with', 'pool', 'windhoek', 'bedroom'}
+    assert terms_of('glass') == {'glass'}
+
+
+def test_price_ranges():
+    index = percolator(('', {'min_price': 2_000_000, 'max_price': 3_000_000}),
+                       ('', {'max_price': 1_000_000}),
+                       ('', {'min_price': 5_000_000}))
+    assert index.match(VILLA) == [1]
+    assert index.match(FLAT) == [2]
+    assert index.match({**VILLA, 'price': 6_000_000}) == [3]
+    assert index.match({**VILLA, 'price': None}) == []
+
+
+def test_bedroom_ranges():
+    index = percolator(('pool', {'min_bedrooms': 3}),
+                       ('pool', {'min_bedrooms': 4}),
+                       ('', {'property_type': 'apartment', 'max_bedrooms': 2}))
+    assert index.match(VILLA) == [1]
+    assert index.match({**VILLA, 'bedrooms': None}) == []
+    assert index.match(FLAT) == [3]
+    assert index.match({**FLAT, 'bedrooms': 3}) == []
+
+
+def test_location_and_query_terms_must_all_appear():
+    index = percolator(('villa', {'location': 'Swakopmund'}),
+                       ('villa', {'location': 'Windhoek'}),
+                       ('double garage pools', {}))
+    assert sorted(index.match(VILLA)) == [1, 3]
+    assert index.match(FLAT) == []
+
+
+def test_listing_matching_no_search():
+    index = percolator(('farm', {}), ('', {'property_type': 'Plot'}), ('', {'min_price': 10_000_000}))
+    assert index.match(VILLA) == [] and index.match(FLAT) == []
+    assert Percolator().match(VILLA) == []
+
+
+def test_removed_search_no_longer_matches():
+    index = percolator(('villa', {}), ('', {'property_type': 'House'}), ('', {'max_price': 3_000_000}))
+    assert sorted(index.match(VILLA)) == [1, 2, 3]
+    for search_id in (1, 2, 3):
+        index.remove(search_id)
+    assert index.match(VILLA) == []
+
+
+def test_store_records_alerts_for_matching_searches(tmp_path):
+    store = SavedSearchStore(str(tmp_path / 'searches.db'))
+    wanted = store.save_search('visitor-a', 'villa', {'location': 'Swakopmund', 'max_price': 3_000_000})
+    store.save_search('visitor-b', 'flat', {'location': ''})
+    assert store.percolate(VILLA) == [wanted]
+    assert store.percolate({**VILLA, 'id': 'p3', 'status': 'sold'}) == []
+    store.percolate(VILLA)  # an update of the same listing: no second alert
+
+    alerts = store.alerts('visitor-a', mark_seen=True)
+    assert [(a['search_id'], a['property_id']) for a in alerts] == [(wanted, 'p1')]
+    assert store.alerts('visitor-a') == [] and store.alerts('visitor-b') == []
+    assert store.list_searches('visitor-b')[0]['filters'] == {}  # blank filters are dropped
@@ -0,0 +1,53 @@
+import os
+
+from semantic_index import SemanticIndex
+
+PROPERTIES = [
+    {'id': 1, 'title': 'Seaside villa with pool', 'location': 'Marbella', 'agent_id': 'a'},
+    {'id': 2, 'title': 'City centre apartment', 'location': 'Madrid', 'agent_id': 'a'},
+    {'id': 3, 'title': 'Mountain cabin near ski slopes', 'location': 'Andorra', 'agent_id': 'b'},
+]
+
+
+def refs(index):
+    return sorted(e['ref'] for e in index.entries.values() if e['kind'] == 'property')
+
+
+def built(tmp_path):
+    index = SemanticIndex(str(tmp_path / 'semantic_index'), dim=4)
+    index.build(PROPERTIES, [])
+    index.save()
+    return index
+
+
+def test_saves_from_two_workers_are_merged(tmp_path):
+    built(tmp_path)
+    first, second = (SemanticIndex(str(tmp_path / 'semantic_index'), dim=4) for _ in range(2))
+    assert first.load() and second.load()
+
+    first.upsert_property({'id': 4, 'title': 'Farmhouse with vineyard', 'agent_id': 'a'})
+    first.save()
+    second.upsert_property({'id': 5, 'title': 'Beach bungalow', 'agent_id': 'b'})
+    second.remove_property(2)
+    second.save()
+
+    assert refs(second) == [1, 3, 4, 5]
+    reader = SemanticIndex(str(tmp_path / 'semantic_index'), dim=4)
+    assert reader.load() and refs(reader) == [1, 3, 4, 5]
+
+
+def test_refresh_picks_up_another_workers_save(tmp_path):
+    built(tmp_path)
+    first, second = (SemanticIndex(str(tmp_path / 'semantic_index'), dim=4) for _ in range(2))
+    first.load(), second.load()
+    second.upsert_property({'id': 6, 'title': 'Loft', 'agent_id': 'a'})
+    first.upsert_property({'id': 7, 'title': 'Townhouse', 'agent_id': 'b'})
+    second.save()
+
+    first.refresh(interval=0)
+    assert refs(first) == [1, 2, 3, 6, 7]  # unsaved local change kept
+
+
+def test_save_leaves_no_temporary_files(tmp_path):
+    built(tmp_path)
+    assert not [name for name in os.listdir(tmp_path) if '.tmp' in name]
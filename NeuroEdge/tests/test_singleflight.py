@@ -0,0 +1,149 @@
+import threading
+import time
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+class FakeRedis:
+    """The few Redis commands SingleFlight uses, with expiring keys"""
+
+    def __init__(self):
+        self.data = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        value, expires = self.data.get(key, (None, None))
+        if expires is not None and time.monotonic() >= expires:
+            self.data.pop(key, None)
+            return None
+        return value
+
+    def set(self, key, value, nx=False, ex=None):
+        with self._lock:
+            if nx and self._live(key) is not None:
+                return None
+            self.data[key] = (value, time.monotonic() + ex if ex else None)
+            return True
+
+    def setex(self, key, ttl, value):
+        return self.set(key, value, ex=ttl)
+
+    def get(self, key):
+        with self._lock:
+            return self._live(key)
+
+    def exists(self, key):
+        with self._lock:
+            return int(self._live(key) is not None)
+
+    def delete(self, key):
+        with self._lock:
+            return int(self.data.pop(key, None) is not None)
+
+
+def run_concurrently(flights, key, fn, callers):
+    """Start one leader, then ``callers - 1`` followers once it is running; returns their outcomes"""
+    started, release = threading.Event(), threading.Event()
+    outcomes = [None] * callers
+
+    def blocking():
+        started.set()
+        release.wait(5)
+        return fn()
+
+    def call(i):
+        try:
+            outcomes[i] = ('ok', flights.do(key, blocking))
+        except Exception as e:
+            outcomes[i] = ('error', e)
+
+    threads = [threading.Thread(target=call, args=(0,))]
+    threads[0].start()
+    assert started.wait(5)
+    threads += [threading.Thread(target=call, args=(i,)) for i in range(1, callers)]
+    for t in threads[1:]:
+        t.start()
+    deadline = time.monotonic() + 5
+    while flights._flights[key].waiters < callers - 1 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    release.set()
+    for t in threads:
+        t.join(5)
+    return outcomes
+
+
+def test_concurrent_callers_share_one_call():
+    flights, calls = SingleFlight(), []
+
+    def compute():
+        calls.append(1)
+        return {'answer': 42}
+
+    outcomes = run_concurrently(flights, 'k', compute, callers=5)
+    assert len(calls) == 1
+    assert outcomes == [('ok', {'answer': 42})] * 5
+    assert flights.stats()['leaders'] == 1 and flights.stats()['shared'] == 4
+    assert flights.stats()['in_flight'] == 0
+
+
+def test_leader_error_wakes_followers():
+    flights = SingleFlight()
+
+    def fail():
+        raise ValueError('upstream broke')
+
+    outcomes = run_concurrently(flights, 'k', fail, callers=4)
+    assert [kind for kind, _ in outcomes] == ['error'] * 4
+    assert all(str(e) == 'upstream broke' for _, e in outcomes)
+    assert flights.stats()['in_flight'] == 0
+    assert flights.do('k', lambda: 'fresh') == 'fresh'  # the failure is not cached
+
+
+def test_result_is_shared_across_workers():
+    redis = FakeRedis()
+    leader = SingleFlight(redis, poll_interval=0.01)
+    follower = SingleFlight(redis, poll_interval=0.01)
+    release = threading.Event()
+    results = {}
+
+    def lead():
+        results['leader'] = leader.do('k', lambda: release.wait(5) and 'from leader')
+
+    thread = threading.Thread(target=lead)
+    thread.start()
+    while redis.get('singleflight:lock:k') is None:
+        time.sleep(0.005)
+    timer = threading.Timer(0.05, release.set)
+    timer.start()
+    assert follower.do('k', lambda: pytest.fail('follower should not compute')) == 'from leader'
+    thread.join(5)
+    assert results['leader'] == 'from leader'
+    assert follower.stats()['remote_shared'] == 1
+    assert redis.get('singleflight:lock:k') is None  # released by its owner
+
+
+def test_lock_of_a_crashed_leader_expires():
+    redis = FakeRedis()
+    # Another worker took the lock and died without publishing a result
+    redis.set('singleflight:lock:k', 'dead-worker', nx=True, ex=0.2)
+    flights, calls = SingleFlight(redis, lock_ttl=30, poll_interval=0.01), []
+
+    started = time.monotonic()
+    assert flights.do('k', lambda: calls.append(1) or 'recomputed') == 'recomputed'
+    assert len(calls) == 1
+    assert 0.15 < time.monotonic() - started < 5  # waited for the expiry, not lock_ttl
+    assert flights.stats()['remote_shared'] == 0
+
+
+def test_unreachable_redis_falls_back_to_computing():
+    class DownRedis:
+        def __getattr__(self, name):
+            def fail(*args, **kwargs):
+                raise ConnectionError('redis is down')
+            return fail
+
+    flights = SingleFlight(DownRedis())
+    assert flights.do('k', lambda: 'local') == 'local'
+    assert flights.stats()['redis_errors'] == 1
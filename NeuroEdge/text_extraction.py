@@ -0,0 +1,169 @@
+# text_extraction.py - plaintext sidecars for uploaded PDF, DOCX and text documents
+import os
+import re
+import json
+import time
+import unicodedata
+
+try:
+    import PyPDF2
+except ImportError:  # optional: PDFs are rejected at read time with a clear error
+    PyPDF2 = None
+
+try:
+    import docx2txt
+except ImportError:  # optional, like PyPDF2
+    docx2txt = None
+
+TEXT_EXTENSIONS = {'txt', 'md', 'csv'}
+SUPPORTED_EXTENSIONS = TEXT_EXTENSIONS | {'pdf', 'docx'}
+SIDECAR_DIR = '.extracted'  # inside each agent folder; not a document itself
+
+CONTROL_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+SPACES_RE = re.compile(r"[ \t\u00a0]+")
+BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+
+class ExtractionPending(OSError):
+    """Text is still being extracted in the background"""
+
+
+class ExtractionFailed(OSError):
+    """The document could not be turned into text (recorded, not retried until it changes)"""
+
+
+def extension(path):
+    return path.rsplit('.', 1)[-1].lower() if '.' in os.path.basename(path) else ''
+
+
+def normalise_text(text):
+    """NFC, no control characters, single spaces, at most one blank line in a row"""
+    text = unicodedata.normalize('NFC', text).replace('\r\n', '\n').replace('\r', '\n')
+    text = CONTROL_RE.sub('', text)
+    lines = [SPACES_RE.sub(' ', line).strip() for line in text.split('\n')]
+    return BLANK_LINES_RE.sub('\n\n', '\n'.join(lines)).strip()
+
+
+def extract_pdf(path):
+    if PyPDF2 is None:
+        raise ExtractionFailed("PyPDF2 is not installed")
+    reader = PyPDF2.PdfReader(path)
+    pages = [page.extract_text() or '' for page in reader.pages]
+    return "\n\n".join(pages), {'pages': len(pages)}
+
+
+def extract_docx(path):
+    if docx2txt is None:
+        raise ExtractionFailed("docx2txt is not installed")
+    return docx2txt.process(path) or '', {}
+
+
+def extract_plain(path):
+    with open(path, 'rb') as f:
+        raw = f.read()
+    try:
+        return raw.decode('utf-8-sig'), {'encoding': 'utf-8'}
+    except UnicodeDecodeError:
+        return raw.decode('cp1252', errors='replace'), {'encoding': 'cp1252'}
+
+
+EXTRACTORS = {'pdf': extract_pdf, 'docx': extract_docx, **{ext: extract_plain for ext in TEXT_EXTENSIONS}}
+
+
+class TextExtractor:
+    """Extract a document's text once and keep it in a sidecar next to it.
+
+    ``<agent dir>/.extracted/<filename>.txt`` holds the normalised text and
+    ``<filename>.json`` its metadata: the source file's (inode, mtime,
+    size) stamp, extractor, character count, page count, and the error if
+    extraction failed. ``read`` serves the sidecar while the stamp matches
+    and only extracts again when the source changed. A failure is recorded
+    too, so a broken PDF costs one parse rather than one per chat turn.
+    Documents queued for background extraction are marked pending and
+    skipped by readers until their sidecar is written (or ``pending_ttl``
+    passes, e.g. the worker died, after which the reader extracts inline).
+    """
+
+    def __init__(self, pending_ttl=900):
+        self.pending_ttl = pending_ttl
+        self.counts = {'extracted': 0, 'failed': 0, 'sidecar_reads': 0}
+
+    @staticmethod
+    def sidecar_paths(path):
+        folder = os.path.join(os.path.dirname(path), SIDECAR_DIR)
+        name = os.path.basename(path)
+        return os.path.join(folder, f"{name}.txt"), os.path.join(folder, f"{name}.json")
+
+    @staticmethod
+    def stamp(path):
+        st = os.stat(path)
+        return [st.st_ino, st.st_mtime_ns, st.st_size]
+
+    @staticmethod
+    def _write(path, content):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp, path)  # readers never see a half-written sidecar
+
+    def metadata(self, path):
+        """Sidecar metadata of a document, or None if it has none"""
+        try:
+            with open(self.sidecar_paths(path)[1], encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def mark_pending(self, path):
+        """Record that ``path`` is queued for background extraction"""
+        self._write(self.sidecar_paths(path)[1], json.dumps({
+            'source': os.path.basename(path), 'stamp': self.stamp(path),
+            'status': 'pending', 'queued_at': time.time()}))
+
+    def extract(self, path):
+        """Extract ``path`` now and write its sidecar; returns the metadata (status 'ok' or 'failed')"""
+        text_path, meta_path = self.sidecar_paths(path)
+        ext = extension(path)
+        meta = {'source': os.path.basename(path), 'stamp': self.stamp(path), 'extractor': ext,
+                'extracted_at': time.time()}
+        started = time.monotonic()
+        try:
+            extractor = EXTRACTORS.get(ext)
+            if extractor is None:
+                raise ExtractionFailed(f"no extractor for .{ext} files")
+            raw, details = extractor(path)
+            text = normalise_text(raw)
+            if not text:
+                raise ExtractionFailed("no text found (scanned or empty document?)")
+        except Exception as e:
+            meta.update(status='failed', error=str(e) or e.__class__.__name__)
+            self.counts['failed'] += 1
+            print(f"⚠️ Text extraction failed for {path}: {meta['error']}")
+        else:
+            meta.update(details, status='ok', chars=len(text))
+            self._write(text_path, text)
+            self.counts['extracted'] += 1
+        meta['seconds'] = round(time.monotonic() - started, 3)
+        self._write(meta_path, json.dumps(meta))
+        return meta
+
+    def read(self, path):
+        """Normalised text of a document; raises ExtractionPending/ExtractionFailed (both OSError)"""
+        meta = self.metadata(path)
+        if meta is None or meta.get('stamp') != self.stamp(path):
+            meta = self.extract(path)  # new, changed, or never registered (e.g. copied in by hand)
+        elif meta.get('status') == 'pending':
+            if time.time() - meta.get('queued_at', 0) < self.pending_ttl:
+                raise ExtractionPending("text is still being extracted")
+            meta = self.extract(path)
+        if meta.get('status') == 'ok' and not os.path.exists(self.sidecar_paths(path)[0]):
+            meta = self.extract(path)  # sidecar text deleted by hand
+        if meta.get('status') != 'ok':
+            raise ExtractionFailed(meta.get('error'))
+        with open(self.sidecar_paths(path)[0], encoding='utf-8') as f:
+            self.counts['sidecar_reads'] += 1
+            return f.read()
+
+    def stats(self):
+        return dict(self.counts)
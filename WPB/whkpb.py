@@ -1,9 +1,12 @@
 import os
 import re
 import json
+import time
 import uuid
 import redis
 import openai
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime
 from flask import Flask, render_template, request, session, redirect, url_for, flash, jsonify, abort
@@ -256,17 +259,14 @@ def user_agent_data(agent_id):
 
     return session['agent_data'][agent_id]
 
-def agent_ask(agent_id, user_text, data):
-    ts = datetime.now()
-    data['history'].append({'role': 'user', 'content': user_text, 'timestamp': ts})
-
+def build_agent_messages(agent_id, history, rag_files):
+    """System prompt, recent history and uploaded context for one agent (no session access)"""
     messages = [
         {'role': 'system', 'content': AGENT_CONFIG[agent_id]['system_prompt']},
-        *data['history'][-6:]
+        *history[-6:]
     ]
 
     # Inject RAG context only if file(s) exist
-    rag_files = data.get('rag_file')
     if rag_files:
         if isinstance(rag_files, str):
             rag_files = [rag_files]
@@ -283,14 +283,43 @@ def agent_ask(agent_id, user_text, data):
             context_text = "\n\n".join(context_parts)[:3000]
             messages.insert(1, {'role': 'system', 'content': f"You may use this uploaded context:\n\n{context_text}"})
 
+    return [{'role': m['role'], 'content': m['content']} for m in messages]
+
+@lru_cache(maxsize=1)
+def no_retry_client():
+    """OpenAI client that makes exactly one attempt (the SDK's default is two retries)"""
+    return OpenAI(api_key=openai.api_key, max_retries=0)
+
+def complete_chat(messages, timeout=120, retries=True):
+    """Session-free GPT call, safe to run on a worker thread; raises on API errors.
+
+    ``timeout`` bounds each attempt; with ``retries`` off there is only one.
+    """
+    client = openai if retries else no_retry_client()
+    response = client.chat.completions.create(
+        model='gpt-4-turbo',
+        messages=messages,
+        temperature=0.7,
+        timeout=timeout
+    )
+    return response.choices[0].message.content.strip()
+
+def complete_chat_before(messages, ends):
+    """One GPT attempt that must finish by ``ends`` (time.monotonic()); raises TimeoutError past it"""
+    remaining = ends - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError("the deadline passed before the call could start")
+    return complete_chat(messages, timeout=remaining, retries=False)
+
+def agent_ask(agent_id, user_text, data):
+    ts = datetime.now()
+    data['history'].append({'role': 'user', 'content': user_text, 'timestamp': ts})
+
+    rag_files = data.get('rag_file')
+    if isinstance(rag_files, str):
+        rag_files = [rag_files]
     try:
-        response = openai.chat.completions.create(
-            model='gpt-4-turbo',
-            messages=[{'role': m['role'], 'content': m['content']} for m in messages],
-            temperature=0.7,
-            timeout=120
-        )
-        answer = response.choices[0].message.content.strip()
+        answer = complete_chat(build_agent_messages(agent_id, data['history'], rag_files))
     except Exception as e:
         answer = f"⚠️ GPT API error: {e}"
 
@@ -298,6 +327,57 @@ def agent_ask(agent_id, user_text, data):
     session.modified = True
     return answer
 
+# ─── Search-AI Fan-out ───────────────────────────────────────────────────────
+AGENT_DEADLINE = float(os.getenv('AGENT_DEADLINE_SECONDS', '25'))  # per internal agent
+FANOUT_POOL = ThreadPoolExecutor(max_workers=int(os.getenv('FANOUT_WORKERS', '16')), thread_name_prefix='fanout')
+
+def ask_agents_concurrently(agent_ids, user_text, deadline=AGENT_DEADLINE):
+    """Ask every agent at once and wait at most ``deadline`` seconds.
+
+    Returns (replies, late, failed): replies maps agent -> answer for those
+    that answered in time. Every call is a single attempt whose timeout is
+    the time left until the shared deadline when it starts, so a late call
+    ends at the deadline too instead of holding a pool thread; one still
+    queued at the deadline fails as soon as it starts. Histories are only
+    updated for agents that replied.
+    """
+    ts = datetime.now()
+    user_msg = {'role': 'user', 'content': user_text, 'timestamp': ts}
+    started = time.monotonic()
+    ends = started + deadline
+    futures = {}
+    for agent_id in agent_ids:
+        data = user_agent_data(agent_id)
+        rag_files = data.get('rag_file')
+        if isinstance(rag_files, str):
+            rag_files = [rag_files]
+        messages = build_agent_messages(agent_id, data['history'] + [user_msg], rag_files)
+        futures[FANOUT_POOL.submit(complete_chat_before, messages, ends)] = agent_id
+
+    done, not_done = wait(futures, timeout=max(0.0, ends - time.monotonic()))
+
+    replies, failed = {}, {}
+    for future in done:
+        agent_id = futures[future]
+        try:
+            replies[agent_id] = future.result()
+        except Exception as e:
+            print(f"⚠️ {agent_id} failed: {e}")
+            failed[agent_id] = str(e)
+    late = [futures[future] for future in not_done]
+    print(f"Search-AI fan-out: {len(replies)} replied, {len(late)} late, {len(failed)} failed "
+          f"in {time.monotonic() - started:.1f}s")
+
+    for agent_id, answer in replies.items():
+        history = user_agent_data(agent_id)['history']
+        history.append(dict(user_msg))
+        history.append({'role': 'assistant', 'content': answer, 'timestamp': ts})
+    session.modified = True
+
+    # Keep the configured agent order for the summary
+    ordered = {a: replies[a] for a in agent_ids if a in replies}
+    return ordered, [a for a in agent_ids if a in late], {a: failed[a] for a in agent_ids if a in failed}
+
 def format_listing(agent_name, listing_text):
     link = chat_url_for(agent_name)
     safe_agent = escape(agent_name)
@@ -376,15 +456,10 @@ def chat(agent_id):
             if agent_id == 'Search-AI':
                 data['history'].append({'role': 'user', 'content': text, 'timestamp': ts})
 
-                # Query internal agents
+                # Query internal agents concurrently; summarise whatever arrives in time
                 internal_agents = [a for a in AGENT_CONFIG.keys() if a not in ['Search-AI', 'Head of property-AI']]
-                internal_responses = {}
-
-                for ia in internal_agents:
-                    ia_data = user_agent_data(ia)
-                    agent_reply = agent_ask(ia, text, ia_data)
-                    formatted = format_listing(ia, agent_reply)  # Add links here
-                    internal_responses[ia] = formatted
+                replies, late, failed = ask_agents_concurrently(internal_agents, text)
+                internal_responses = {ia: format_listing(ia, reply) for ia, reply in replies.items()}  # Add links here
 
                 # Summarize for Head of Property-AI
                 summary_prompt = [
@@ -396,6 +471,8 @@ def chat(agent_id):
                     summary_prompt.append(f"--- Agent: {ag} ---")
                     summary_prompt.append(resp)
                     summary_prompt.append("")
+                if late or failed:
+                    summary_prompt.append(f"No answer was received from: {', '.join(late + list(failed))}.")
 
                 head_data = user_agent_data('Head of property-AI')
                 final_answer = agent_ask('Head of property-AI', "\n".join(summary_prompt), head_data)
@@ -409,6 +486,12 @@ def chat(agent_id):
                     final_answer = f"{final_answer}\n\n<hr><b>Contact the listing agents directly:</b><br>{sources_html}"
                 except Exception:
                     pass
+                if late or failed:
+                    missing = "<br>".join(
+                        [f"• {escape(a)} (no reply within {AGENT_DEADLINE:.0f}s)" for a in late] +
+                        [f"• {escape(a)} (unavailable)" for a in failed]
+                    )
+                    final_answer = f"{final_answer}<br><br><b>Not included in this summary:</b><br>{missing}"
 
                 data['history'].append({'role': 'assistant', 'content': final_answer, 'timestamp': ts})
                 session.modified = True